@@ -0,0 +1,188 @@
+"""
+# Cache
+
+In-process caches, kept in memory for the lifetime of the process.
+
+`LRUCache` is a bounded least-recently-used mapping which counts its hits and misses, so the effectiveness of every
+cache can be inspected through `stats()`.
+
+`const_call` and `cache_call` are drop-in replacements of the karpatkit ones, adding an in-memory LRU layer (L1) in
+front of their disk-backed cache (L2), so values read again and again, like decimals and symbols, don't need a SQLite
+read and an unpickle on every hit. `cache_stats()` reports every L1 and `warm_up()` loads the constant token data of
+some chains from disk at startup. Like the karpatkit cache, the L1 layers are bypassed when the `KKIT_CACHE_DISABLE`
+environment variable is defined.
+"""
+
+import functools
+import os
+import threading
+from collections import OrderedDict
+from contextlib import suppress
+from typing import Any, Callable, Hashable
+
+from defabipedia import Blockchain
+from karpatkit import cache as disk_cache
+from karpatkit.constants import ABI_TOKEN_SIMPLIFIED
+from karpatkit.node import get_node
+from web3 import Web3
+from web3.exceptions import BadFunctionCallOutput, ContractLogicError
+
+# Default max number of constant contract call results kept in memory.
+CONST_CALL_CACHE_SIZE = 100_000
+
+# Default max number of results kept in memory per cache_call decorated function.
+CACHE_CALL_SIZE = 1024
+
+# Token methods loaded by warm_up().
+WARM_UP_METHODS = ("decimals", "symbol")
+
+# Environment variable disabling the karpatkit cache, and so the in-memory layers in front of it.
+CACHE_DISABLE_ENV = "KKIT_CACHE_DISABLE"
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache bounded to `maxsize` entries, with hit/miss counters.
+
+    Args:
+        maxsize (int): Max number of entries. The least recently used entry is evicted when it's exceeded.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Return the size, hits, misses and hit rate of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+const_call_cache = LRUCache(CONST_CALL_CACHE_SIZE)
+
+# Every in-memory cache in front of the disk, by name.
+caches: dict[str, LRUCache] = {"const_call": const_call_cache}
+
+
+def cache_enabled() -> bool:
+    """Whether the cache is enabled, that is, the `KKIT_CACHE_DISABLE` environment variable isn't defined."""
+    return CACHE_DISABLE_ENV not in os.environ
+
+
+def const_call_key(contract_function) -> tuple:
+    """Return the L1 key of a contract function call: the node, contract address and call data (selector and args)."""
+    return (contract_function.w3, contract_function.address, contract_function._encode_transaction_data())
+
+
+def const_call(contract_function) -> Any:
+    """
+    Call a contract function whose result never changes, caching it in memory and on disk (karpatkit `const_call`).
+    """
+    if not cache_enabled():
+        return disk_cache.const_call(contract_function)
+    key = const_call_key(contract_function)
+    value = const_call_cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = disk_cache.const_call(contract_function)
+        const_call_cache.put(key, value)
+    return value
+
+
+def cache_call(*args, maxsize: int = CACHE_CALL_SIZE, **kwargs) -> Callable:
+    """
+    Decorator caching the results of a function in memory and on disk. Takes the arguments of karpatkit `cache_call`
+    plus the max number of results kept in memory. Calls with unhashable arguments just use the disk cache.
+    """
+
+    def decorator(func):
+        cached_func = disk_cache.cache_call(*args, **kwargs)(func)
+        l1 = caches[f"{func.__module__}.{func.__qualname__}"] = LRUCache(maxsize)
+
+        @functools.wraps(func)
+        def wrapper(*func_args, **func_kwargs):
+            if not cache_enabled():
+                return cached_func(*func_args, **func_kwargs)
+            key = (func_args, tuple(sorted(func_kwargs.items())))
+            try:
+                value = l1.get(key, _MISSING)
+            except TypeError:
+                return cached_func(*func_args, **func_kwargs)
+            if value is _MISSING:
+                value = cached_func(*func_args, **func_kwargs)
+                l1.put(key, value)
+            return value
+
+        wrapper.cache = l1
+        return wrapper
+
+    return decorator
+
+
+def cache_stats() -> dict[str, dict]:
+    """Return the stats of every in-memory cache, by name."""
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+def warm_up(tokens: dict[Blockchain, list[str]], methods: tuple[str] = WARM_UP_METHODS) -> int:
+    """
+    Load the constant data (decimals and symbol by default) of the tokens of every blockchain into memory. The values
+    come from the disk cache, or from the node the first time.
+
+    Args:
+        tokens (dict[Blockchain, list[str]]): The token addresses by blockchain.
+        methods (tuple[str], optional): The constant token methods to load. Defaults to WARM_UP_METHODS.
+
+    Returns:
+        int: The number of values loaded.
+    """
+    loaded = 0
+    for blockchain, addresses in tokens.items():
+        web3 = get_node(blockchain)
+        for address in addresses:
+            contract = web3.eth.contract(address=Web3.to_checksum_address(address), abi=ABI_TOKEN_SIMPLIFIED)
+            for method in methods:
+                with suppress(ContractLogicError, BadFunctionCallOutput, OverflowError):
+                    const_call(getattr(contract.functions, method)())
+                    loaded += 1
+    return loaded
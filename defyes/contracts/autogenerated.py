@@ -11,11 +11,11 @@ class Erc20(Erc20):
     ...
 """
 
-from karpatkit.cache import const_call
-from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.generator import load_abi
+from defyes.cache import const_call
+from defyes.functions import get_contract
+from defyes.generator import DirectCall, load_abi_json
 
 
 class Erc20:
@@ -35,8 +35,7 @@ class Erc20:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "erc20.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "erc20.json"))
 
     @property
     def name(self) -> str:
@@ -50,9 +49,13 @@ class Erc20:
     def decimals(self) -> int:
         return const_call(self.contract.functions.decimals())
 
+    _balance_of_call = DirectCall("balanceOf", ["address"], ["uint256"])
+
     def balance_of(self, arg0: str) -> int:
-        return self.contract.functions.balanceOf(arg0).call(block_identifier=self.block)
+        return self._balance_of_call.call(self, arg0)
+
+    _total_supply_call = DirectCall("totalSupply", [], ["uint256"])
 
     @property
     def total_supply(self) -> int:
-        return self.contract.functions.totalSupply().call(block_identifier=self.block)
+        return self._total_supply_call.call(self)
@@ -0,0 +1,225 @@
+"""
+# Export
+
+Columnar export of the valuations to Parquet or Arrow IPC files, for the warehouse.
+
+Every priced balance is a row with the columns of SCHEMA_FIELDS. The rows are buffered column by column (never as
+nested dicts) and written as a record batch every `batch_size` rows, so millions of rows are exported with the memory
+of a single batch:
+
+    with ColumnarWriter("nav.parquet") as writer:
+        for valuation in value_positions(Chain.ETHEREUM, block_range(start, end, step=7200), sources):
+            writer.write_valuation(valuation)
+
+pyarrow is an optional dependency (`pip install defyes[export]`), only imported when an export is made.
+"""
+
+import itertools
+import logging
+from decimal import ROUND_DOWN, Context, Decimal, InvalidOperation
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from defyes.valuation import BlockValuation, iter_balances
+
+logger = logging.getLogger(__name__)
+
+# Default number of rows of every record batch.
+BATCH_SIZE = 100_000
+
+# Scale of the balance column, decimal256(76, 18): up to 58 integer digits and 18 decimals, enough for the raw amounts
+# of tokens without decimals. The balances with more decimals are rounded down and the ones too large are left null.
+BALANCE_PRECISION = 76
+BALANCE_SCALE = 18
+BALANCE_QUANTUM = Decimal(1).scaleb(-BALANCE_SCALE)
+BALANCE_CONTEXT = Context(prec=BALANCE_PRECISION, rounding=ROUND_DOWN)
+
+FORMATS = ("parquet", "arrow")
+
+# Name and arrow type of every column. The types are resolved when pyarrow is imported.
+SCHEMA_FIELDS = (
+    ("chain", "string"),
+    ("block", "int64"),
+    ("protocol", "string"),
+    ("wallet", "string"),
+    ("position_key", "string"),
+    ("position_type", "string"),
+    ("field", "string"),
+    ("token", "string"),
+    ("balance", "balance"),
+    ("price", "float64"),
+)
+COLUMNS = tuple(name for name, _ in SCHEMA_FIELDS)
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+    except ModuleNotFoundError as error:
+        raise ModuleNotFoundError("The columnar export needs pyarrow: pip install defyes[export]") from error
+    return pyarrow
+
+
+def get_schema():
+    pa = import_pyarrow()
+    types = {
+        "string": pa.string(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "balance": pa.decimal256(BALANCE_PRECISION, BALANCE_SCALE),
+    }
+    return pa.schema([(name, types[type_name]) for name, type_name in SCHEMA_FIELDS])
+
+
+def quantize_balance(balance) -> Decimal | None:
+    try:
+        return BALANCE_CONTEXT.quantize(balance, BALANCE_QUANTUM)
+    except InvalidOperation:
+        logger.warning("Balance %s doesn't fit in the balance column, exported as null.", balance)
+        return None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Rows
+# ----------------------------------------------------------------------------------------------------------------------
+def valuation_rows(valuation: BlockValuation) -> Iterator[tuple]:
+    """Yield a row (with the columns of COLUMNS) for every priced balance of the valuation."""
+    chain = str(valuation.blockchain)
+    for balance in valuation.balances:
+        yield (
+            chain,
+            valuation.block,
+            balance.protocol,
+            balance.wallet,
+            balance.position_key,
+            balance.position_type,
+            balance.field,
+            balance.token,
+            balance.balance,
+            None if balance.price is None else float(balance.price),
+        )
+
+
+def protocol_rows(
+    data, blockchain: str, block: int, protocol: str, wallet: str, prices: dict | None = None
+) -> Iterator[tuple]:
+    """
+    Yield a row for every balance of a protocol output, straight from its nested layout.
+
+    Args:
+        prices (dict, optional): Price of every token, as float or as the (price, source, blockchain) answers of
+            get_prices. The tokens without price get a null price.
+    """
+    chain = str(blockchain)
+    prices = prices or {}
+    for balance in iter_balances(data):
+        price = prices.get(balance.token)
+        if isinstance(price, tuple):
+            price = price[0]
+        yield (
+            chain,
+            block,
+            protocol,
+            wallet,
+            balance.position_key,
+            balance.position_type,
+            balance.field,
+            balance.token,
+            balance.balance,
+            None if price is None else float(price),
+        )
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Writer
+# ----------------------------------------------------------------------------------------------------------------------
+class ColumnarWriter:
+    """
+    Writes rows to a Parquet or Arrow IPC file, a record batch every batch_size rows.
+
+    Args:
+        path (str | Path): The output file.
+        format (str, optional): "parquet" or "arrow". Defaults to the file extension, or "parquet".
+        batch_size (int, optional): Rows per record batch. Defaults to BATCH_SIZE.
+        compression (str, optional): Parquet compression codec. Defaults to "zstd".
+    """
+
+    def __init__(
+        self, path: str | Path, format: str | None = None, batch_size: int = BATCH_SIZE, compression: str = "zstd"
+    ):
+        self.path = Path(path)
+        if format is None:
+            format = "arrow" if self.path.suffix in (".arrow", ".feather", ".ipc") else "parquet"
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format {format!r}, it should be one of {FORMATS}.")
+        self.format = format
+        self.batch_size = batch_size
+        self.compression = compression
+        self.schema = get_schema()
+        self.columns = [[] for _ in COLUMNS]
+        self.rows = 0
+        self.closed = False
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open(self):
+        pa = import_pyarrow()
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+
+            return pq.ParquetWriter(self.path, self.schema, compression=self.compression)
+        return pa.ipc.new_file(self.path, self.schema)
+
+    def write_rows(self, rows: Iterable[tuple]) -> None:
+        rows = iter(rows)
+        # The rows are transposed in chunks that fill up the current batch.
+        while chunk := list(itertools.islice(rows, self.batch_size - len(self.columns[0]))):
+            for name, column, values in zip(COLUMNS, self.columns, zip(*chunk)):
+                column.extend(map(quantize_balance, values) if name == "balance" else values)
+            if len(self.columns[0]) >= self.batch_size:
+                self.flush()
+
+    def write_valuation(self, valuation: BlockValuation) -> None:
+        self.write_rows(valuation_rows(valuation))
+
+    def flush(self) -> None:
+        """Write the buffered rows as a record batch."""
+        if not self.columns[0]:
+            return
+        pa = import_pyarrow()
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(self.columns, self.schema)],
+            schema=self.schema,
+        )
+        if self._writer is None:
+            self._writer = self._open()
+        self._writer.write_batch(batch)
+        self.rows += batch.num_rows
+        for column in self.columns:
+            column.clear()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.flush()
+        if self._writer is None:
+            # Nothing written: leave an empty file with the schema.
+            self._writer = self._open()
+        self._writer.close()
+        self.closed = True
+        logger.debug(f"{self.rows} rows exported to {self.path}.")
+
+
+def export_valuations(
+    valuations: Iterable[BlockValuation], path: str | Path, format: str | None = None, batch_size: int = BATCH_SIZE
+) -> int:
+    """Write the valuations (e.g. the generator of value_positions) to a columnar file and return the rows written."""
+    with ColumnarWriter(path, format=format, batch_size=batch_size) as writer:
+        for valuation in valuations:
+            writer.write_valuation(valuation)
+    return writer.rows
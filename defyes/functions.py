@@ -1,7 +1,6 @@
 import json
 import logging
 import math
-import re
 from contextlib import suppress
 from datetime import datetime
 from decimal import Decimal
@@ -11,7 +10,6 @@ import requests
 from defabipedia import Blockchain, Chain
 from hexbytes import HexBytes
 from karpatkit.api_services import APIKey
-from karpatkit.cache import cache_call, const_call
 from karpatkit.constants import ABI_TOKEN_SIMPLIFIED, Address
 from karpatkit.explorer import ChainExplorer
 from karpatkit.helpers import suppress_error_codes
@@ -20,7 +18,11 @@ from web3 import Web3
 from web3.exceptions import ABIFunctionNotFound, BadFunctionCallOutput, ContractLogicError
 from web3.types import LogReceipt
 
+from defyes.cache import LRUCache, cache_call, const_call
 from defyes.lazytime import Time
+from defyes.logs import LogFetcher, is_block_range_limit, suggested_block_interval
+from defyes.rpcbatch import RPCBatch
+from defyes.snapshot import get_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -68,6 +70,8 @@ def last_block(blockchain, web3=None):
 def ensure_a_block_number(block: int | str, blockchain: Blockchain):
     """Ensures that the provided block number is valid.
 
+    Inside an active Snapshot of the blockchain, 'latest' is resolved to the snapshot block.
+
     Args:
         block (int | str): The block number or the string 'latest'.
         blockchain (Blockchain): The blockchain object.
@@ -81,7 +85,8 @@ def ensure_a_block_number(block: int | str, blockchain: Blockchain):
     if isinstance(block, int):
         return block
     elif block == "latest":
-        return last_block(blockchain)
+        snapshot = get_snapshot(blockchain)
+        return snapshot.block if snapshot is not None else last_block(blockchain)
     else:
         raise ValueError("block should be an integer or just the string 'latest'")
 
@@ -166,7 +171,7 @@ def balance_of(
     if contract_address == Address.ZERO:
         balance = web3.eth.get_balance(address, block)
     else:
-        token_contract = web3.eth.contract(address=contract_address, abi=json.loads(ABI_TOKEN_SIMPLIFIED))
+        token_contract = get_contract(contract_address, blockchain, web3=web3, abi=ABI_TOKEN_SIMPLIFIED)
         try:
             balance = token_contract.functions.balanceOf(address).call(block_identifier=block)
         except ContractLogicError:
@@ -175,6 +180,32 @@ def balance_of(
     return to_token_amount(contract_address, balance, blockchain, web3, decimals)
 
 
+def native_balances(
+    addresses: list[str], block: int | str, blockchain: str, web3: Web3 = None, decimals: bool = True
+) -> list[Decimal]:
+    """
+    Get the native token balance of many addresses at a block, sending all the eth_getBalance requests in a single
+    JSON-RPC batch.
+
+    Args:
+        addresses (list[str]): The addresses (wallets) for which to retrieve the balances.
+        block (int | str): The block number or block identifier.
+        blockchain (str): The name of the blockchain.
+        web3 (Web3, optional): The Web3 instance to use. If not provided, a default instance will be used.
+        decimals (bool, optional): Whether to convert the balances to token decimals. Defaults to True.
+
+    Returns:
+        list[Decimal]: The balances, in the same order as the addresses.
+    """
+    if web3 is None:
+        web3 = get_node(blockchain)
+
+    with RPCBatch(blockchain, web3=web3, flush_interval=None) as batch:
+        balances = [batch.get_balance(address, block) for address in addresses]
+
+    return [to_token_amount(Address.ZERO, balance.result(), blockchain, web3, decimals) for balance in balances]
+
+
 def total_supply(
     token_address: str, block: int | str, blockchain: str, web3: Web3 = None, decimals: bool = True
 ) -> Decimal:
@@ -184,7 +215,7 @@ def total_supply(
 
     token_address = Web3.to_checksum_address(token_address)
 
-    token_contract = web3.eth.contract(address=token_address, abi=json.loads(ABI_TOKEN_SIMPLIFIED))
+    token_contract = get_contract(token_address, blockchain, web3=web3, abi=ABI_TOKEN_SIMPLIFIED)
     total_supply_v = token_contract.functions.totalSupply().call(block_identifier=block)
 
     return to_token_amount(token_address, total_supply_v, blockchain, web3, decimals)
@@ -200,7 +231,7 @@ def get_decimals(token_address: str, blockchain: str | Blockchain, web3=None) ->
     if token_address == Address.ZERO or token_address == Address.E:
         decimals = 18
     else:
-        token_contract = web3.eth.contract(address=token_address, abi=json.loads(ABI_TOKEN_SIMPLIFIED))
+        token_contract = get_contract(token_address, blockchain, web3=web3, abi=ABI_TOKEN_SIMPLIFIED)
         decimals = const_call(token_contract.functions.decimals())
 
     return decimals
@@ -235,13 +266,12 @@ def get_symbol(token_address: str, blockchain: str | Blockchain, web3=None) -> s
 
 
 def infer_symbol(web3, blockchain, token_address):
-    contract = web3.eth.contract(address=token_address, abi=ABI_TOKEN_SIMPLIFIED)
+    contract = get_contract(token_address, blockchain, web3=web3, abi=ABI_TOKEN_SIMPLIFIED)
     for method_name in ("symbol", "SYMBOL"):
         with suppress(ContractLogicError, BadFunctionCallOutput, OverflowError), suppress_error_codes():
             return const_call(getattr(contract.functions, method_name)())
 
-    abi = ChainExplorer(blockchain).abi_from_address(token_address)
-    contract = web3.eth.contract(address=token_address, abi=abi)
+    contract = get_contract(token_address, blockchain, web3=web3)
     with suppress(ContractLogicError, BadFunctionCallOutput), suppress_error_codes():
         return const_call(contract.functions.symbol())
 
@@ -249,9 +279,35 @@ def infer_symbol(web3, blockchain, token_address):
 
 
 # CONTRACTS AND ABIS
+# Contract factories by (web3, ABI fingerprint) and contracts by (blockchain, web3, address, ABI fingerprint)
+CONTRACT_CACHE_SIZE = 4096
+contract_factory_cache = LRUCache(maxsize=256)
+contract_cache = LRUCache(maxsize=CONTRACT_CACHE_SIZE)
+
+
+def abi_fingerprint(abi: str | list | None) -> str | None:
+    """Return a hashable fingerprint of an ABI, either a JSON string or an already parsed one."""
+    if abi is None or isinstance(abi, str):
+        return abi
+    return json.dumps(abi)
+
+
+def get_contract_factory(web3: Web3, abi: str | list, fingerprint: str | None = None):
+    """Return the (cached) web3 contract factory for the ABI."""
+    fingerprint = abi_fingerprint(abi) if fingerprint is None else fingerprint
+    key = (web3, fingerprint)
+    factory = contract_factory_cache.get(key)
+    if factory is None:
+        factory = web3.eth.contract(abi=json.loads(abi) if isinstance(abi, str) else abi)
+        contract_factory_cache.put(key, factory)
+    return factory
+
+
 def get_contract(contract_address, blockchain, web3=None, abi=None):
     """
     Retrieves a contract instance from the specified blockchain using the contract address and ABI.
+    Contract instances are kept in a LRU cache (see `contract_cache.stats()`), so subsequent calls don't rebuild them
+    nor fetch the ABI from the blockchain explorer again.
 
     Args:
         contract_address (str): The address of the contract on the blockchain.
@@ -269,11 +325,16 @@ def get_contract(contract_address, blockchain, web3=None, abi=None):
 
     contract_address = Web3.to_checksum_address(contract_address)
 
-    if abi is None:
-        abi = ChainExplorer(blockchain).abi_from_address(contract_address)
-        return web3.eth.contract(address=contract_address, abi=abi)
-    else:
-        return web3.eth.contract(address=contract_address, abi=abi)
+    fingerprint = abi_fingerprint(abi)
+    key = (blockchain, web3, contract_address, fingerprint)
+    contract = contract_cache.get(key)
+    if contract is None:
+        if abi is None:
+            abi = ChainExplorer(blockchain).abi_from_address(contract_address)
+            fingerprint = abi_fingerprint(abi)
+        contract = get_contract_factory(web3, abi, fingerprint)(address=contract_address)
+        contract_cache.put(key, contract)
+    return contract
 
 
 def get_contract_proxy_abi(contract_address: str, abi_contract_address: str, blockchain: str | Blockchain, web3=None):
@@ -293,8 +354,8 @@ def get_contract_proxy_abi(contract_address: str, abi_contract_address: str, blo
 
     address = Web3.to_checksum_address(contract_address)
 
-    abi = ChainExplorer(blockchain).abi_from_address(abi_contract_address)
-    return web3.eth.contract(address=address, abi=abi)
+    abi = get_contract(abi_contract_address, blockchain, web3=web3).abi
+    return get_contract(address, blockchain, web3=web3, abi=abi)
 
 
 def format_address(address: str | bytes) -> str:
@@ -322,36 +383,46 @@ def get_impl_latest(web3, contract_address, block):
     return Address.ZERO
 
 
+IMPLEMENTATION_SLOT_1967 = "0x360894a13ba1a3210667c828492db98dca3e2076cc3735a920a3ca505d382bbc"
+IMPLEMENTATION_SLOT_UNSTRUCTURED = "0x7050c9e0f4ca769c69bd3a8ef740bc37934f8e2c036e5a723fd8ee048ed3f8c3"
+
+
 def get_impl_1967(web3, contract_address, block):
     impl_address = Address.ZERO
-    IMPLEMENTATION_SLOT = "0x360894a13ba1a3210667c828492db98dca3e2076cc3735a920a3ca505d382bbc"
-    impl_address = web3.eth.get_storage_at(contract_address, IMPLEMENTATION_SLOT, block_identifier=block)
+    impl_address = web3.eth.get_storage_at(contract_address, IMPLEMENTATION_SLOT_1967, block_identifier=block)
     return format_address(impl_address)
 
 
-def get_impl_1167_0(web3, contract_address, block):
+def impl_from_1167_0_bytecode(bytecode: HexBytes) -> str:
     # OpenZeppelins' EIP-1167 - Example in GC: 0x793fAF861a78B07c0C8c0ed1450D3919F3473226)
     impl_address = Address.ZERO
-    bytecode = web3.eth.get_code(contract_address, block_identifier=block).hex()
+    bytecode = bytecode.hex()
     if bytecode[2:22] == "363d3d373d3d3d363d73" and bytecode[62:] == "5af43d82803e903d91602b57fd5bf3":
         impl_address = Web3.to_checksum_address("0x" + bytecode[22:62])
     return impl_address
 
 
-def get_impl_1167_1(web3, contract_address, block):
+def get_impl_1167_0(web3, contract_address, block):
+    return impl_from_1167_0_bytecode(web3.eth.get_code(contract_address, block_identifier=block))
+
+
+def impl_from_1167_1_bytecode(bytecode: HexBytes) -> str:
     # Custom proxy implementation (similar to EIP-1167) -
     # Examples: mainnet: 0x09cabEC1eAd1c0Ba254B09efb3EE13841712bE14 / GC: 0x7B7DA887E0c18e631e175532C06221761Db30A24
     impl_address = Address.ZERO
-    bytecode = web3.eth.get_code(contract_address, block_identifier=block).hex()
+    bytecode = bytecode.hex()
     if bytecode[2:32] == "366000600037611000600036600073" and bytecode[72:] == "5af41558576110006000f3":
         impl_address = Web3.to_checksum_address("0x" + bytecode[32:72])
     return impl_address
 
 
+def get_impl_1167_1(web3, contract_address, block):
+    return impl_from_1167_1_bytecode(web3.eth.get_code(contract_address, block_identifier=block))
+
+
 def get_impl_storage_proxy(web3, contract_address, block):
     # OpenZeppelins' Unstructured Storage proxy pattern - Example: USDC in mainnet (0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48)
     impl_address = Address.ZERO
-    IMPLEMENTATION_SLOT_UNSTRUCTURED = "0x7050c9e0f4ca769c69bd3a8ef740bc37934f8e2c036e5a723fd8ee048ed3f8c3"
     impl_address = web3.eth.get_storage_at(contract_address, IMPLEMENTATION_SLOT_UNSTRUCTURED, block_identifier=block)
     return format_address(impl_address)
 
@@ -401,17 +472,23 @@ def search_proxy_impl_address(contract_address, blockchain, web3=None, block="la
 
     contract_address = Web3.to_checksum_address(contract_address)
 
-    proxy_impl_funcs = [
-        get_impl_latest,
-        get_impl_1967,
-        get_impl_1167_0,
-        get_impl_1167_1,
-        get_impl_storage_proxy,
-        get_impl_897,
-        get_impl_custom_proxy,
+    # The storage and bytecode lookups are sent together in a single JSON-RPC batch.
+    with RPCBatch(blockchain, web3=web3, flush_interval=None) as batch:
+        storage_1967 = batch.get_storage_at(contract_address, IMPLEMENTATION_SLOT_1967, block)
+        bytecode = batch.get_code(contract_address, block)
+        storage_unstructured = batch.get_storage_at(contract_address, IMPLEMENTATION_SLOT_UNSTRUCTURED, block)
+
+    proxy_impl_getters = [
+        lambda: get_impl_latest(web3, contract_address, block),
+        lambda: format_address(storage_1967.result()),
+        lambda: impl_from_1167_0_bytecode(bytecode.result()),
+        lambda: impl_from_1167_1_bytecode(bytecode.result()),
+        lambda: format_address(storage_unstructured.result()),
+        lambda: get_impl_897(web3, contract_address, block),
+        lambda: get_impl_custom_proxy(web3, contract_address, block),
     ]
-    for func in proxy_impl_funcs:
-        proxy_impl_address = func(web3, contract_address, block)
+    for getter in proxy_impl_getters:
+        proxy_impl_address = getter()
         if proxy_impl_address != Address.ZERO:
             return proxy_impl_address
 
@@ -630,31 +707,21 @@ def get_logs_web3(
                         logs = logs[:n]
                         break
         except ValueError as error:
-            # Handle ValueError by adjusting the block range and retrying
+            # Handle ValueError by fetching the range in adaptive chunks, starting from the interval the provider
+            # suggested (if any)
             error_info = error.args[0]
-            if error_info["code"] == -32005:  # error code in infura
-                block_interval = int(error_info["data"]["to"], 16) - int(error_info["data"]["from"], 16)
-            elif "max_block_range" in error_info:  # error code in Quicknode, see ProviderManager class
-                block_interval = error_info["max_block_range"]
-            elif error_info["code"] == -32602:  # error code in alchemy
-                blocks = [int(block, 16) for block in re.findall(r"0x[0-9a-fA-F]+", error_info["message"])]
-                block_interval = blocks[1] - blocks[0]
-            elif error_info["code"] == -32600:  # error code in anker: "block range is too wide"
-                block_interval = 3000
-            else:
+            block_interval = suggested_block_interval(error_info)
+            if block_interval is None:
                 raise ValueError(error_info)
+            if block_hash is not None:
+                raise
             # Log the error and the new block range
             logger.debug(
                 f"Web3.eth.get_logs: query returned more than 10000 results. Trying with a {block_interval} block range."
             )
-            # Retry fetching the logs with the new block range
-            logs = []
-            params = {"address": address, "topics": topics}
-            if block_hash is not None:
-                params.update({"blockHash": block_hash})
-            for from_block, to_block in get_block_intervals(blockchain, block_start, block_end, block_interval):
-                params.update({"fromBlock": from_block, "toBlock": to_block})
-                logs += web3.eth.get_logs(params)
+            max_chunk_size = block_interval if is_block_range_limit(error_info) else None
+            fetcher = LogFetcher(blockchain, web3=web3, chunk_size=block_interval, max_chunk_size=max_chunk_size)
+            logs = fetcher.fetch(address, topics, block_start, block_end)
     return logs
 
 
@@ -2,10 +2,22 @@ import importlib.resources as pkg_resources
 import itertools
 import json
 import keyword
+import marshal
 import re
 import textwrap
+from functools import cache
 from pathlib import Path
 
+from eth_abi.decoding import ContextFramesBytesIO
+from eth_abi.exceptions import DecodingError
+from eth_abi.registry import registry
+from eth_utils import function_signature_to_4byte_selector
+from eth_utils.abi import collapse_if_tuple
+from web3._utils.abi import map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS, abi_bytes_to_bytes, abi_string_to_text
+from web3.contract import Contract
+from web3.exceptions import BadFunctionCallOutput
+
 
 def get_module_path(module_file):
     return Path(module_file).resolve().parent
@@ -13,6 +25,9 @@ def get_module_path(module_file):
 
 current_module_path = get_module_path(__file__)
 
+# Optional bundle with every parsed ABI used by the autogenerated modules, created by `python -m defyes.generator`.
+ABI_BUNDLE_PATH = current_module_path / "abi_bundle.marshal"
+
 
 def get_defabipedia_path(protocol):
     try:
@@ -24,18 +39,103 @@ def get_defabipedia_path(protocol):
     return None
 
 
-def load_abi(module_file_path, abi_filename):
-    protocol_path = get_module_path(module_file_path)
-    defabipedia_path = get_defabipedia_path(protocol_path.name)
-
+def find_abi_path(protocol_path, abi_filename):
     path = protocol_path / "abis" / abi_filename
     if not path.exists():
+        defabipedia_path = get_defabipedia_path(protocol_path.name)
         path = defabipedia_path / abi_filename if defabipedia_path else None
+    return path
+
+
+@cache
+def load_abi_bundle() -> dict:
+    """Return the ABI bundle, keyed by (protocol, abi_filename), or an empty dict if it doesn't exist."""
+    try:
+        with open(ABI_BUNDLE_PATH, "rb") as f:
+            return marshal.load(f)
+    except (FileNotFoundError, EOFError, ValueError, TypeError):
+        return {}
+
+
+@cache
+def load_abi_json(module_file_path, abi_filename) -> str:
+    """
+    Return the ABI for the module's protocol as a JSON string, which is immutable and cheap to hash, so it can be
+    shared by every contract built from it (see `defyes.functions.get_contract`). Every ABI is loaded just once per
+    process, from the ABI bundle unless the protocol `abis` file (or the defabipedia one) was modified after it.
+    """
+    protocol_path = get_module_path(module_file_path)
+    path = find_abi_path(protocol_path, abi_filename)
+    bundled_abi = load_abi_bundle().get((protocol_path.name, abi_filename))
+    if bundled_abi is not None:
+        if path is None or not path.exists() or path.stat().st_mtime <= ABI_BUNDLE_PATH.stat().st_mtime:
+            return json.dumps(bundled_abi)
+
     if path is None:
         raise FileNotFoundError
 
     with open(path) as f:
-        return f.read()
+        return json.dumps(json.load(f))
+
+
+def load_abi(module_file_path, abi_filename) -> list:
+    """Return a new parsed copy of the ABI for the module's protocol, so callers can't alter the shared one."""
+    return json.loads(load_abi_json(module_file_path, abi_filename))
+
+
+class DirectCall:
+    """
+    Contract function called through a raw `eth_call`, skipping the web3 ContractFunction machinery. The 4-byte
+    selector and the eth_abi encoder and decoder are built just once, when the autogenerated class is defined.
+
+    The returned values are the same as `contract.functions.<fn_name>(*args).call(block_identifier=block)`.
+
+    Args:
+        fn_name (str): The name of the contract function.
+        input_types (list[str]): The canonical ABI types of its inputs.
+        output_types (list[str]): The canonical ABI types of its outputs.
+    """
+
+    def __init__(self, fn_name: str, input_types: list[str], output_types: list[str]):
+        self.fn_name = fn_name
+        self.input_types = input_types
+        self.output_types = output_types
+        self.selector = function_signature_to_4byte_selector(f"{fn_name}({','.join(input_types)})")
+        self.encoder = registry.get_tuple_encoder(*input_types)
+        self.decoder = registry.get_tuple_decoder(*output_types)
+        # Just bytes and strings may need a conversion before being encoded (e.g. hex strings into bytes).
+        self.normalize_inputs = any("bytes" in t or "string" in t for t in input_types)
+        # Addresses are checksummed and arrays are returned as lists, as web3 does.
+        self.normalize_outputs = any("address" in t or "[" in t or "(" in t for t in output_types)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.fn_name}({','.join(self.input_types)})>"
+
+    def encode(self, *args) -> bytes:
+        if self.normalize_inputs:
+            args = map_abi_data([abi_bytes_to_bytes, abi_string_to_text], self.input_types, args)
+        return self.selector + self.encoder(args)
+
+    def decode(self, return_data: bytes):
+        try:
+            output_data = self.decoder(ContextFramesBytesIO(return_data))
+        except DecodingError as e:
+            raise BadFunctionCallOutput(
+                f"Could not decode contract function call to {self.fn_name} "
+                f"with return data: {return_data!r}, output_types: {self.output_types}"
+            ) from e
+        if self.normalize_outputs:
+            output_data = map_abi_data(BASE_RETURN_NORMALIZERS, self.output_types, output_data)
+        return output_data[0] if len(output_data) == 1 else list(output_data)
+
+    def call(self, instance, *args):
+        """Call the function of the autogenerated class `instance` contract at its block."""
+        contract = instance.contract
+        if not isinstance(contract, Contract):
+            # A wrapped contract (e.g. bound to a Multicall) keeps its own call semantics.
+            return getattr(contract.functions, self.fn_name)(*args).call(block_identifier=instance.block)
+        transaction = {"to": contract.address, "data": "0x" + self.encode(*args).hex()}
+        return self.decode(contract.w3.eth.call(transaction, block_identifier=instance.block))
 
 
 def snake_to_camel(snake_case):
@@ -114,22 +214,40 @@ def process_return_types(outputs, type_conversion):
     return return_str, return_docstring
 
 
+def construct_direct_call_string(item, method_name):
+    """Return the DirectCall class constant used by the method, and its name."""
+    input_types = [collapse_if_tuple(arg) for arg in item["inputs"]]
+    output_types = [collapse_if_tuple(output) for output in item.get("outputs", [])]
+    attr_name = f"_{method_name}_call"
+    return f"    {attr_name} = DirectCall({item['name']!r}, {input_types!r}, {output_types!r})\n\n", attr_name
+
+
 def construct_method_string(
-    original_method_name, method_name, args, args_names, return_str, return_docstring, is_const_call
+    original_method_name,
+    method_name,
+    args,
+    args_names,
+    return_str,
+    return_docstring,
+    is_const_call,
+    direct_call_attr=None,
 ):
     args_str = ", " + ", ".join(args) if args else ""
+    call_args_str = ", " + ", ".join(args_names) if args_names else ""
     args_names = ", ".join(args_names) if args_names else ""
     method_str = "    @property\n" if not args else ""
     method_str += f"    def {method_name}(self{args_str}){return_str}:\n"
     method_str += f'        """\n            {return_docstring}\n        """\n' if return_docstring else ""
     if is_const_call:
         method_str += f"        return const_call(self.contract.functions.{original_method_name}({args_names}))\n"
+    elif direct_call_attr:
+        method_str += f"        return self.{direct_call_attr}.call(self{call_args_str})\n"
     else:
         method_str += f"        return self.contract.functions.{original_method_name}({args_names}).call(block_identifier=self.block)\n"
     return method_str
 
 
-def generate_methods_from_abi(abi_path, const_call_methods=[], always_include_methods=[]):
+def generate_methods_from_abi(abi_path, const_call_methods=[], always_include_methods=[], direct_call=False):
     """
     Generates Python methods from a given ABI (Application Binary Interface) file.
 
@@ -142,6 +260,9 @@ def generate_methods_from_abi(abi_path, const_call_methods=[], always_include_me
             These methods will be generated with a decorator that makes them read-only. Defaults to an empty list.
         always_include_methods (list, optional): A list of method names that should always be included in the generated
             methods, even if they are not present in the ABI file. Defaults to an empty list.
+        direct_call (bool, optional): Whether the block-pinned methods are called through a `DirectCall` (raw eth_call
+            with a precomputed selector and eth_abi encoder/decoder) instead of the web3 contract functions.
+            The const call methods keep using `const_call`. Defaults to False.
 
     Returns:
         str: A string containing the generated Python methods, each separated by a newline.
@@ -200,14 +321,19 @@ def generate_methods_from_abi(abi_path, const_call_methods=[], always_include_me
         method_names.append(method_name_snake)
         args, args_names = process_arguments(item["inputs"], TYPE_CONVERSION)
         return_str, return_docstring = process_return_types(item.get("outputs", []), TYPE_CONVERSION)
-        method_str = construct_method_string(
+        is_const_call = item["name"] in const_call_methods
+        direct_call_str, direct_call_attr = "", None
+        if direct_call and not is_const_call:
+            direct_call_str, direct_call_attr = construct_direct_call_string(item, method_name_snake)
+        method_str = direct_call_str + construct_method_string(
             item["name"],
             method_name_snake,
             args,
             args_names,
             return_str,
             return_docstring,
-            item["name"] in const_call_methods,
+            is_const_call,
+            direct_call_attr,
         )
         methods.append(method_str)
 
@@ -229,8 +355,8 @@ class %(first_class)s(%(first_class)s):
 '''
 from web3 import Web3
 
-from defyes.generator import load_abi
-from karpatkit.node import get_node
+from defyes.functions import get_contract
+from defyes.generator import load_abi_json
 """
 
 contract_class_template = """
@@ -254,31 +380,31 @@ class %(name)s:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, %(abi)r))\n
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, %(abi)r))\n
 """
 
 
-def generate_contract_class(class_name, abi_path, const_call_methods=[], always_include_methods=[]):
+def generate_contract_class(class_name, abi_path, const_call_methods=[], always_include_methods=[], direct_call=False):
     abi_filename = abi_path.name
     result = contract_class_template % dict(name=class_name, abi=abi_filename)
-    result += generate_methods_from_abi(abi_path, const_call_methods, always_include_methods)
+    result += generate_methods_from_abi(abi_path, const_call_methods, always_include_methods, direct_call)
     return result
 
 
-def generate_classes():
+def generate_classes(setup_paths=None):
     import black  # Because it's used just during development
     import isort  # Because it's used just during development
 
-    setup_paths = current_module_path.glob("**/autogen_config.json")
+    if setup_paths is None:
+        setup_paths = current_module_path.glob("**/autogen_config.json")
     black_config = get_black_config()
 
     for setup_path in setup_paths:
         is_const_call_used = False
+        is_direct_call_used = False
 
         protocol_path = setup_path.parent
         autogenerated_module_path = protocol_path / "autogenerated.py"
-        defabipedia_path = get_defabipedia_path(protocol_path.name)
 
         with open(setup_path) as f:
             abis_to_process = json.load(f)
@@ -286,23 +412,28 @@ def generate_classes():
         content = ""
         classes_name = []
         for abi_name, config in abis_to_process.items():
-            abi_path = protocol_path / "abis" / f"{abi_name}.json"
-            if not abi_path.exists():
-                abi_path = defabipedia_path / f"{abi_name}.json" if defabipedia_path else None
+            abi_path = find_abi_path(protocol_path, f"{abi_name}.json")
             class_name = snake_to_camel(abi_name)
             classes_name.append(class_name)
             const_call_methods = config.get("const_call", [])
             always_include_methods = config.get("always_include", [])
+            direct_call = config.get("direct_call", False)
             if const_call_methods:
                 is_const_call_used = True
-            content += generate_contract_class(class_name, abi_path, const_call_methods, always_include_methods)
+            if direct_call:
+                is_direct_call_used = True
+            content += generate_contract_class(
+                class_name, abi_path, const_call_methods, always_include_methods, direct_call
+            )
 
         if not content:
             continue
 
         final_header_template = header_template
         if is_const_call_used:
-            final_header_template += "from karpatkit.cache import const_call\n"
+            final_header_template += "from defyes.cache import const_call\n"
+        if is_direct_call_used:
+            final_header_template += "from defyes.generator import DirectCall\n"
 
         content = final_header_template % dict(classes=", ".join(classes_name), first_class=classes_name[0]) + content
         content = isort.code(content)
@@ -313,6 +444,24 @@ def generate_classes():
         print(f"{relative_module_path} was created/updated.")
 
 
+def generate_abi_bundle():
+    """Write the ABI bundle with every ABI listed in the autogen_config.json files, already parsed."""
+    bundle = {}
+    for setup_path in current_module_path.glob("**/autogen_config.json"):
+        protocol_path = setup_path.parent
+        with open(setup_path) as f:
+            abi_names = json.load(f)
+        for abi_name in abi_names:
+            abi_filename = f"{abi_name}.json"
+            with open(find_abi_path(protocol_path, abi_filename)) as f:
+                bundle[protocol_path.name, abi_filename] = json.load(f)
+
+    with open(ABI_BUNDLE_PATH, "wb") as f:
+        marshal.dump(bundle, f)
+    relative_bundle_path = ABI_BUNDLE_PATH.relative_to(Path().resolve())
+    print(f"{relative_bundle_path} was created/updated with {len(bundle)} ABIs.")
+
+
 def get_black_config():
     import black  # Because it's used just during development
 
@@ -328,3 +477,4 @@ def get_black_config():
 
 if __name__ == "__main__":
     generate_classes()
+    generate_abi_bundle()
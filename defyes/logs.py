@@ -0,0 +1,351 @@
+"""
+# Logs
+
+Adaptive, parallel and resumable `eth_getLogs` fetcher for long block ranges.
+
+`LogFetcher.fetch()` splits the range into chunks which are requested concurrently over a bounded pool of workers.
+The chunk size adapts to the provider answers:
+
+- A chunk rejected because of "too many results" (or a too wide range) is halved and retried. If the provider
+  suggests a block range, it's used as the new max chunk size.
+- A sparse chunk (fewer logs than `sparse_results`) doubles the size of the following chunks.
+- A chunk rejected because of a rate limit (or timed out) keeps its size: every worker pauses for an exponential
+  backoff (or the one asked by the provider) and the chunk is retried.
+
+The logs are always returned in block order. If a chunk keeps failing, `LogFetchError` is raised with the
+`LogFetchProgress` of the completed chunks, which can be passed back to `fetch()` to resume from where it failed.
+
+    fetcher = LogFetcher(Chain.ETHEREUM)
+    try:
+        logs = fetcher.fetch(address, topics, block_start, block_end)
+    except LogFetchError as e:
+        logs = fetcher.fetch(address, topics, block_start, block_end, progress=e.progress)
+"""
+
+import logging
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import suppress
+from dataclasses import dataclass, field
+
+from karpatkit.node import get_node
+from requests.exceptions import HTTPError, Timeout
+from web3 import Web3
+from web3.types import LogReceipt
+
+logger = logging.getLogger(__name__)
+
+# Default number of blocks requested in every chunk before adapting it.
+CHUNK_SIZE = 100_000
+
+# Default number of concurrent eth_getLogs requests.
+MAX_WORKERS = 4
+
+# Chunks with fewer logs than this are considered sparse, so the next chunks double their size.
+SPARSE_RESULTS = 1_000
+
+# Times a chunk is retried when it fails for a reason other than its size.
+MAX_RETRIES = 3
+
+# Times a chunk is retried when it's rejected by a rate limit or it times out, and seconds of the first backoff, which
+# doubles on every retry up to MAX_BACKOFF.
+MAX_BACKOFF_RETRIES = 6
+BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+# Messages of the providers rejecting an eth_getLogs request because of its number of results or its block range
+TOO_MANY_RESULTS_MESSAGES = (
+    "query returned more than",  # infura
+    "response size exceeded",  # alchemy
+    "too many results",
+    "too many logs",
+    "block range",  # "block range is too wide", "exceed maximum block range", "block range limit exceeded"
+    "range is too large",
+    "is limited to a",  # quicknode: "eth_getLogs is limited to a 10,000 range"
+)
+
+# Messages of the providers rejecting a request because of the rate or quota of the account
+RATE_LIMIT_MESSAGES = (
+    "rate limit",
+    "too many requests",
+    "request count exceeded",
+    "exceeded its compute units",
+    "capacity exceeded",
+    "quota",
+)
+
+
+def suggested_block_interval(error_info: dict) -> int | None:
+    """
+    Return the block interval suggested by the provider error of a rejected eth_getLogs request, if any.
+    """
+    if not isinstance(error_info, dict):
+        return None
+    data = error_info.get("data")
+    if error_info.get("code") == -32005 and isinstance(data, dict) and "from" in data and "to" in data:  # infura
+        return int(error_info["data"]["to"], 16) - int(error_info["data"]["from"], 16)
+    elif "max_block_range" in error_info:  # error code in Quicknode, see ProviderManager class
+        return error_info["max_block_range"]
+    elif error_info.get("code") == -32602:  # error code in alchemy
+        blocks = [int(block, 16) for block in re.findall(r"0x[0-9a-fA-F]+", error_info.get("message", ""))]
+        if len(blocks) >= 2:
+            return blocks[1] - blocks[0]
+    elif error_info.get("code") == -32600:  # error code in anker: "block range is too wide"
+        return 3000
+    return None
+
+
+def is_block_range_limit(error_info: dict) -> bool:
+    """
+    Whether the suggested block interval is a hard limit of the provider. Infura's suggestion just depends on the
+    number of results, so sparser ranges could still be fetched in wider chunks.
+    """
+    return suggested_block_interval(error_info) is not None and error_info.get("code") != -32005
+
+
+def error_message(error: Exception) -> str:
+    error_info = error.args[0] if error.args else ""
+    message = error_info.get("message", "") if isinstance(error_info, dict) else str(error_info)
+    return message.lower()
+
+
+def is_rate_limit(error: Exception) -> bool:
+    """Whether the request was rejected because of the rate or quota limits of the provider."""
+    if isinstance(error, HTTPError):
+        return error.response is not None and error.response.status_code == 429
+    if not isinstance(error, ValueError):
+        return False
+    error_info = error.args[0] if error.args else None
+    if isinstance(error_info, dict) and error_info.get("code") == 429:
+        return True
+    return any(text in error_message(error) for text in RATE_LIMIT_MESSAGES)
+
+
+def is_too_many_results(error: Exception) -> bool:
+    """Whether the error means that the requested block range has to be narrowed."""
+    if not isinstance(error, ValueError) or not error.args or is_rate_limit(error):
+        return False
+    if suggested_block_interval(error.args[0]) is not None:
+        return True
+    return any(text in error_message(error) for text in TOO_MANY_RESULTS_MESSAGES)
+
+
+def backoff_seconds(error: Exception, attempt: int) -> float:
+    """Seconds to wait before the given retry of a rate limited (or timed out) request."""
+    error_info = error.args[0] if isinstance(error, ValueError) and error.args else None
+    data = error_info.get("data") if isinstance(error_info, dict) else None
+    if isinstance(data, dict):
+        # infura tells how long to back off, in data.backoff_seconds or data.rate.backoff_seconds
+        rate = data.get("rate")
+        seconds = data.get("backoff_seconds", rate.get("backoff_seconds") if isinstance(rate, dict) else None)
+        with suppress(TypeError, ValueError):
+            return min(float(seconds), MAX_BACKOFF)
+    return min(BACKOFF * 2 ** (attempt - 1), MAX_BACKOFF)
+
+
+def uncovered_ranges(intervals, block_start: int, block_end: int) -> list[tuple[int, int]]:
+    """Return the ranges of [block_start, block_end] (both ends included) not covered by the given intervals."""
+    ranges = []
+    next_block = block_start
+    for from_block, to_block in sorted(intervals):
+        if from_block > next_block:
+            ranges.append((next_block, min(from_block - 1, block_end)))
+        next_block = max(next_block, to_block + 1)
+        if next_block > block_end:
+            break
+    if next_block <= block_end:
+        ranges.append((next_block, block_end))
+    return ranges
+
+
+@dataclass
+class LogFetchProgress:
+    """Completed chunks of a log fetch, used to resume it after a failure."""
+
+    block_start: int
+    block_end: int
+    chunks: dict[tuple[int, int], list[LogReceipt]] = field(default_factory=dict)
+
+    def pending_ranges(self) -> list[tuple[int, int]]:
+        """Return the ranges (both ends included) not covered yet by the completed chunks."""
+        return uncovered_ranges(self.chunks, self.block_start, self.block_end)
+
+    def logs(self) -> list[LogReceipt]:
+        """Return the logs of the completed chunks in block order."""
+        return [log for chunk in sorted(self.chunks) for log in self.chunks[chunk]]
+
+
+class LogFetchError(Exception):
+    def __init__(self, message: str, progress: LogFetchProgress):
+        super().__init__(message)
+        self.progress = progress
+
+
+class LogFetcher:
+    """
+    Fetch the logs of a block range in concurrent chunks whose size adapts to the provider answers.
+
+    Args:
+        blockchain (str): The blockchain from which to fetch logs.
+        web3 (Web3, optional): The Web3 instance to use. If not provided, a default instance will be used.
+        chunk_size (int, optional): Initial number of blocks per chunk. Defaults to CHUNK_SIZE.
+        max_workers (int, optional): Max number of concurrent eth_getLogs requests. Defaults to MAX_WORKERS.
+        min_chunk_size (int, optional): Chunks aren't halved below this size. Defaults to 1.
+        max_chunk_size (int | None, optional): Chunks don't grow beyond this size. Defaults to None (no limit).
+        sparse_results (int, optional): Chunks with fewer logs make the next chunks grow. Defaults to SPARSE_RESULTS.
+    """
+
+    def __init__(
+        self,
+        blockchain: str,
+        web3: Web3 = None,
+        chunk_size: int = CHUNK_SIZE,
+        max_workers: int = MAX_WORKERS,
+        min_chunk_size: int = 1,
+        max_chunk_size: int | None = None,
+        sparse_results: int = SPARSE_RESULTS,
+    ):
+        if web3 is None:
+            web3 = get_node(blockchain)
+        self.blockchain = blockchain
+        self.web3 = web3
+        self.chunk_size = max(chunk_size, min_chunk_size)
+        self.max_workers = max_workers
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.sparse_results = sparse_results
+        # Monotonic time until which no request is sent, after a rate limit
+        self.paused_until = 0.0
+
+    def fetch(
+        self,
+        address: str | list[str] | None,
+        topics: list | None,
+        block_start: int,
+        block_end: int | str = "latest",
+        progress: LogFetchProgress | None = None,
+    ) -> list[LogReceipt]:
+        """
+        Fetch the logs between block_start and block_end (both included).
+
+        Args:
+            address (str | list[str] | None): The contract address(es) emitting the logs.
+            topics (list | None): The topics filter.
+            block_start (int): The first block of the range.
+            block_end (int | str, optional): The last block of the range or 'latest'. Defaults to 'latest'.
+            progress (LogFetchProgress, optional): The progress of a previous failed fetch of the same query.
+
+        Returns:
+            list[LogReceipt]: The fetched logs in block order.
+
+        Raises:
+            LogFetchError: If a chunk couldn't be fetched. Its `progress` allows resuming the fetch.
+        """
+        if block_end == "latest":
+            block_end = self.web3.eth.block_number
+        if progress is None:
+            progress = LogFetchProgress(block_start, block_end)
+
+        params = {}
+        if address:
+            params["address"] = (
+                [Web3.to_checksum_address(addr) for addr in address]
+                if isinstance(address, list)
+                else Web3.to_checksum_address(address)
+            )
+        if topics:
+            params["topics"] = topics
+
+        # Ranges still to be split into chunks (the next one at the end) and failed attempts per chunk.
+        pending = progress.pending_ranges()
+        pending.reverse()
+        retries = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = {}
+            while pending or running:
+                while pending and len(running) < self.max_workers:
+                    from_block, to_block = pending.pop()
+                    chunk_end = min(to_block, from_block + self.chunk_size - 1)
+                    if chunk_end < to_block:
+                        pending.append((chunk_end + 1, to_block))
+                    chunk = (from_block, chunk_end)
+                    future = executor.submit(self._get_logs, params, *chunk)
+                    running[future] = chunk
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk = running.pop(future)
+                    try:
+                        progress.chunks[chunk] = future.result()
+                    except Exception as error:
+                        try:
+                            retried = self._retry(error, chunk, pending, retries)
+                        except Exception as retry_error:
+                            logger.warning(f"Couldn't retry the logs of blocks {chunk[0]}-{chunk[1]}: {retry_error}")
+                            retried = False
+                        if not retried:
+                            self._collect(running, progress)
+                            raise LogFetchError(
+                                f"Couldn't fetch the logs of blocks {chunk[0]}-{chunk[1]}: {error}", progress
+                            ) from error
+                    else:
+                        self._adapt_to_results(len(progress.chunks[chunk]), chunk)
+
+        return progress.logs()
+
+    def _get_logs(self, params: dict, from_block: int, to_block: int) -> list[LogReceipt]:
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return self.web3.eth.get_logs({**params, "fromBlock": from_block, "toBlock": to_block})
+
+    def _adapt_to_results(self, n_logs: int, chunk: tuple[int, int]) -> None:
+        from_block, to_block = chunk
+        if n_logs < self.sparse_results and to_block - from_block + 1 >= self.chunk_size:
+            chunk_size = self.chunk_size * 2
+            if self.max_chunk_size is not None:
+                chunk_size = min(chunk_size, self.max_chunk_size)
+            self.chunk_size = chunk_size
+
+    def _retry(self, error: Exception, chunk: tuple[int, int], pending: list, retries: dict) -> bool:
+        """Queue the failed chunk again, narrower if needed. Return False when it ran out of retries."""
+        from_block, to_block = chunk
+        size = to_block - from_block + 1
+        if is_rate_limit(error) or isinstance(error, Timeout):
+            attempt = retries[chunk, "backoff"] = retries.get((chunk, "backoff"), 0) + 1
+            if attempt > MAX_BACKOFF_RETRIES:
+                return False
+            delay = backoff_seconds(error, attempt)
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            logger.debug(f"eth_getLogs of blocks {from_block}-{to_block} failed ({error}). Retrying in {delay}s.")
+            pending.append(chunk)
+            return True
+
+        if is_too_many_results(error) and size > self.min_chunk_size:
+            error_info = error.args[0] if isinstance(error, ValueError) else None
+            suggested = suggested_block_interval(error_info)
+            if suggested and is_block_range_limit(error_info):
+                self.max_chunk_size = max(suggested, self.min_chunk_size)
+            self.chunk_size = max(min(size // 2, suggested or size), self.min_chunk_size)
+            logger.debug(f"eth_getLogs rejected blocks {from_block}-{to_block}. Using {self.chunk_size} block chunks.")
+            pending.append(chunk)
+            return True
+
+        retries[chunk] = retries.get(chunk, 0) + 1
+        if retries[chunk] <= MAX_RETRIES:
+            logger.debug(f"eth_getLogs failed for blocks {from_block}-{to_block} ({error}). Retrying.")
+            pending.append(chunk)
+            return True
+        return False
+
+    @staticmethod
+    def _collect(running: dict, progress: LogFetchProgress) -> None:
+        """Wait for the running chunks, keeping the successful ones in the progress."""
+        for future in running:
+            future.cancel()
+        for future, chunk in running.items():
+            if not future.cancelled() and future.exception() is None:
+                progress.chunks[chunk] = future.result()
+        running.clear()
@@ -0,0 +1,141 @@
+"""
+# Log Store
+
+Persistent store of `eth_getLogs` results which remembers, for every (blockchain, address, topics filter), the block
+intervals already fetched. Overlapping queries are served from disk and just the missing gaps are fetched (through
+`LogFetcher`), so a daily run scanning a contract history only requests the blocks of the last day.
+
+Logs newer than `confirmations` blocks behind the chain head are fetched but never persisted, to keep the store safe
+from reorgs. Every interval fetched is merged with the stored intervals it overlaps or touches (and so are their
+segments of logs), so the coverage of an index refreshed block after block stays a single interval.
+
+    store = LogStore(Chain.ETHEREUM)
+    logs = store.get_logs(factory_address, [gauge_created_topic], block_start=15399251, block_end=block)
+"""
+
+import logging
+
+from karpatkit.node import get_node
+from web3 import Web3
+from web3.types import LogReceipt
+
+from defyes.logs import LogFetcher, uncovered_ranges
+from defyes.store import get_store
+
+logger = logging.getLogger(__name__)
+
+# Default number of blocks behind the chain head considered safe from reorgs.
+CONFIRMATIONS = 64
+
+
+def normalize_topics(topics: list | None) -> tuple:
+    """Return a hashable and canonical version of an eth_getLogs topics filter."""
+    normalized = []
+    for topic in topics or []:
+        if topic is None:
+            normalized.append(None)
+        elif isinstance(topic, (list, tuple)):
+            normalized.append(
+                tuple(sorted(Web3.to_hex(hexstr=t) if isinstance(t, str) else Web3.to_hex(t) for t in topic))
+            )
+        else:
+            normalized.append(Web3.to_hex(hexstr=topic) if isinstance(topic, str) else Web3.to_hex(topic))
+    while normalized and normalized[-1] is None:
+        normalized.pop()
+    return tuple(normalized)
+
+
+def merge_interval(intervals: list[tuple[int, int]], interval: tuple[int, int]) -> tuple[tuple[int, int], list]:
+    """
+    Return the interval extended over the intervals it overlaps or is adjacent to (both ends included), and those
+    intervals.
+    """
+    from_block, to_block = interval
+    absorbed = []
+    remaining = list(intervals)
+    while True:
+        touching = [(a, b) for a, b in remaining if a <= to_block + 1 and b >= from_block - 1]
+        if not touching:
+            return (from_block, to_block), absorbed
+        for a, b in touching:
+            from_block, to_block = min(from_block, a), max(to_block, b)
+            remaining.remove((a, b))
+        absorbed.extend(touching)
+
+
+class LogStore:
+    """
+    Persistent eth_getLogs store with per-(address, topics) coverage intervals.
+
+    Args:
+        blockchain (str): The blockchain from which to fetch logs.
+        web3 (Web3, optional): The Web3 instance to use. If not provided, a default instance will be used.
+        confirmations (int, optional): Logs within this number of blocks from the head aren't persisted.
+            Defaults to CONFIRMATIONS.
+        fetcher (LogFetcher, optional): The fetcher used for the missing ranges.
+    """
+
+    def __init__(
+        self, blockchain: str, web3: Web3 = None, confirmations: int = CONFIRMATIONS, fetcher: LogFetcher = None
+    ):
+        if web3 is None:
+            web3 = get_node(blockchain)
+        self.blockchain = blockchain
+        self.web3 = web3
+        self.confirmations = confirmations
+        self.fetcher = fetcher if fetcher is not None else LogFetcher(blockchain, web3=web3)
+        self.store = get_store("logs")
+
+    def key(self, address: str | None, topics: list | None) -> tuple:
+        address = Web3.to_checksum_address(address) if address else None
+        return (str(self.blockchain), address, normalize_topics(topics))
+
+    def coverage(self, address: str | None, topics: list | None) -> list[tuple[int, int]]:
+        """Return the block intervals (both ends included) already stored for the query."""
+        return self.store.get(("coverage", *self.key(address, topics)), [])
+
+    def get_logs(
+        self, address: str | None, topics: list | None, block_start: int, block_end: int | str = "latest"
+    ) -> list[LogReceipt]:
+        """
+        Return the logs between block_start and block_end (both included), fetching just the ranges not stored yet.
+
+        Returns:
+            list[LogReceipt]: The logs in block order.
+        """
+        head = self.web3.eth.block_number
+        if block_end == "latest":
+            block_end = head
+        safe_end = min(block_end, head - self.confirmations)
+
+        key = self.key(address, topics)
+        coverage = self.store.get(("coverage", *key), [])
+
+        for from_block, to_block in uncovered_ranges(coverage, block_start, safe_end):
+            logger.debug(f"LogStore: fetching blocks {from_block}-{to_block} for {key}.")
+            logs = self.fetcher.fetch(address, topics, from_block, to_block)
+            with self.store.transact():
+                coverage = self.store.get(("coverage", *key), [])
+                merged, absorbed = merge_interval(coverage, (from_block, to_block))
+                segment = {(log["blockNumber"], log["logIndex"]): log for log in logs}
+                for interval in absorbed:
+                    for log in self.store.pop(("segment", *key, *interval), None) or []:
+                        segment.setdefault((log["blockNumber"], log["logIndex"]), log)
+                self.store[("segment", *key, *merged)] = [segment[position] for position in sorted(segment)]
+                coverage = sorted([interval for interval in coverage if interval not in absorbed] + [merged])
+                self.store[("coverage", *key)] = coverage
+
+        logs = {}
+        for from_block, to_block in coverage:
+            if to_block < block_start or from_block > safe_end:
+                continue
+            for log in self.store.get(("segment", *key, from_block, to_block), []):
+                if block_start <= log["blockNumber"] <= block_end:
+                    logs[log["blockNumber"], log["logIndex"]] = log
+
+        # The unconfirmed tail is always fetched and never persisted.
+        if block_end > safe_end:
+            for log in self.fetcher.fetch(address, topics, max(block_start, safe_end + 1), block_end):
+                logs[log["blockNumber"], log["logIndex"]] = log
+
+        return [logs[position] for position in sorted(logs)]
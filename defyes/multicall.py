@@ -0,0 +1,230 @@
+"""
+# Multicall
+
+Batch many block-pinned view calls into a single Multicall3 `aggregate3` eth_call.
+
+A `Multicall` collects pending calls, either raw web3 `ContractFunction` objects through `Multicall.add()` or the
+methods of any autogenerated contract class through `Multicall.bind()`, and sends all of them in one round trip when
+it's executed. Each call gets a `PendingCall` whose `result()` returns the decoded value or raises
+`ContractLogicError` when that single call reverted, so the usual `suppress(ContractLogicError)` patterns keep
+working.
+
+    with Multicall(Chain.ETHEREUM, block) as multicall:
+        vault = multicall.bind(Vault(Chain.ETHEREUM, block))
+        lp = multicall.bind(LiquidityPool(Chain.ETHEREUM, block, lp_address))
+        pool_tokens = vault.get_pool_tokens(pool_id)
+        supply = lp.total_supply
+    pool_tokens.result(), supply.result()
+
+Calling `result()` before the batch was executed flushes it right away.
+"""
+
+import copy
+import json
+import logging
+from typing import Any
+
+from eth_abi import decode
+from eth_abi.exceptions import DecodingError
+from karpatkit.node import get_node
+from web3 import Web3
+from web3._utils.abi import get_abi_output_types, map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+from web3.exceptions import BadFunctionCallOutput, ContractLogicError
+
+from defyes.functions import ensure_a_block_number
+
+logger = logging.getLogger(__name__)
+
+# Multicall3 is deployed at the same address in every supported blockchain.
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+# Multicall3 ABI - aggregate3
+ABI_MULTICALL3 = '[{"inputs":[{"components":[{"internalType":"address","name":"target","type":"address"},{"internalType":"bool","name":"allowFailure","type":"bool"},{"internalType":"bytes","name":"callData","type":"bytes"}],"internalType":"struct Multicall3.Call3[]","name":"calls","type":"tuple[]"}],"name":"aggregate3","outputs":[{"components":[{"internalType":"bool","name":"success","type":"bool"},{"internalType":"bytes","name":"returnData","type":"bytes"}],"internalType":"struct Multicall3.Result[]","name":"returnData","type":"tuple[]"}],"stateMutability":"payable","type":"function"}]'
+
+# Selector of the standard Error(string) revert payload.
+ERROR_STRING_SELECTOR = bytes.fromhex("08c379a0")
+
+# Max number of calls sent inside a single aggregate3 eth_call.
+MAX_CALLS_PER_BATCH = 500
+
+
+def revert_message(return_data: bytes) -> str:
+    """Build a web3-like revert message from the raw revert data of a call."""
+    if return_data[:4] == ERROR_STRING_SELECTOR:
+        try:
+            (reason,) = decode(["string"], return_data[4:])
+            return f"execution reverted: {reason}"
+        except DecodingError:
+            pass
+    return "execution reverted"
+
+
+def decode_output(contract_function, return_data: bytes) -> Any:
+    """Decode the return data of a contract function just like `ContractFunction.call()` does."""
+    output_types = get_abi_output_types(contract_function.abi)
+    try:
+        output_data = contract_function.w3.codec.decode(output_types, return_data)
+    except DecodingError as e:
+        raise BadFunctionCallOutput(
+            f"Could not decode contract function call to {contract_function.fn_name} "
+            f"with return data: {return_data!r}, output_types: {output_types}"
+        ) from e
+    normalizers = [*BASE_RETURN_NORMALIZERS, *contract_function._return_data_normalizers]
+    normalized_data = map_abi_data(normalizers, output_types, output_data)
+    return normalized_data[0] if len(normalized_data) == 1 else normalized_data
+
+
+class PendingCall:
+    """A call queued in a Multicall. Its value is available once the Multicall was executed."""
+
+    def __init__(self, multicall: "Multicall", contract_function):
+        self.multicall = multicall
+        self.contract_function = contract_function
+        self.executed = False
+        self.success = None
+        self.return_data = None
+
+    def __repr__(self):
+        status = "pending" if not self.executed else ("success" if self.success else "reverted")
+        return f"<{self.__class__.__name__} {self.contract_function.fn_name} {status}>"
+
+    def set_result(self, success: bool, return_data: bytes):
+        self.executed = True
+        self.success = success
+        self.return_data = return_data
+
+    def result(self) -> Any:
+        """
+        Return the decoded value of the call, executing the Multicall first if needed.
+
+        Raises:
+            ContractLogicError: If the call reverted.
+            BadFunctionCallOutput: If the returned data couldn't be decoded.
+        """
+        if not self.executed:
+            self.multicall.execute()
+        if not self.success:
+            raise ContractLogicError(revert_message(self.return_data), data="0x" + self.return_data.hex())
+        return decode_output(self.contract_function, self.return_data)
+
+
+class DeferredFunction:
+    """Wrap a ContractFunction so `.call(block_identifier=...)` queues it in a Multicall instead of calling it."""
+
+    def __init__(self, multicall: "Multicall", contract_function):
+        self._multicall = multicall
+        self._contract_function = contract_function
+
+    def __getattr__(self, name):
+        return getattr(self._contract_function, name)
+
+    def call(self, *args, block_identifier=None, **kwargs):
+        # Calls without an explicit block (e.g. made through const_call) aren't block-pinned, so they aren't deferred.
+        if block_identifier is None or args or kwargs:
+            return self._contract_function.call(*args, block_identifier=block_identifier, **kwargs)
+        if block_identifier != self._multicall.block:
+            raise ValueError(
+                f"Trying to defer a call at block {block_identifier!r} into a Multicall pinned at {self._multicall.block}."
+            )
+        return self._multicall.add(self._contract_function)
+
+
+class DeferredFunctions:
+    def __init__(self, multicall: "Multicall", functions):
+        self._multicall = multicall
+        self._functions = functions
+
+    def __getattr__(self, name):
+        function = getattr(self._functions, name)
+
+        def deferred(*args, **kwargs):
+            return DeferredFunction(self._multicall, function(*args, **kwargs))
+
+        return deferred
+
+
+class DeferredContract:
+    """A web3 Contract look-alike whose functions are queued in a Multicall."""
+
+    def __init__(self, multicall: "Multicall", contract):
+        self._contract = contract
+        self.functions = DeferredFunctions(multicall, contract.functions)
+
+    def __getattr__(self, name):
+        return getattr(self._contract, name)
+
+
+class Multicall:
+    """
+    Block-pinned batch of view calls sent as Multicall3 `aggregate3` eth_calls.
+
+    Args:
+        blockchain (str): The blockchain where the calls are made.
+        block (int | str): The block number (or 'latest', resolved once when the Multicall is created).
+        web3 (Web3, optional): The Web3 instance to use. If not provided, a default instance will be used.
+        max_calls (int, optional): Max number of calls per aggregate3 eth_call. Defaults to MAX_CALLS_PER_BATCH.
+    """
+
+    def __init__(self, blockchain: str, block: int | str, web3: Web3 = None, max_calls: int = MAX_CALLS_PER_BATCH):
+        if web3 is None:
+            web3 = get_node(blockchain)
+        self.blockchain = blockchain
+        self.block = ensure_a_block_number(block, blockchain)
+        self.web3 = web3
+        self.max_calls = max_calls
+        self.pending: list[PendingCall] = []
+        self.contract = web3.eth.contract(address=MULTICALL3_ADDRESS, abi=json.loads(ABI_MULTICALL3))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+
+    def add(self, contract_function) -> PendingCall:
+        """Queue a web3 ContractFunction (already bound to its arguments) and return its PendingCall."""
+        pending_call = PendingCall(self, contract_function)
+        self.pending.append(pending_call)
+        return pending_call
+
+    def bind(self, instance):
+        """
+        Return a copy of an autogenerated contract class instance whose block-pinned methods are queued in this
+        Multicall and return PendingCall objects instead of values.
+        """
+        bound = copy.copy(instance)
+        bound.block = self.block
+        bound.contract = DeferredContract(self, instance.contract)
+        return bound
+
+    def execute(self) -> None:
+        """Send every pending call, in chunks of at most `max_calls` calls per aggregate3."""
+        pending, self.pending = self.pending, []
+        for start in range(0, len(pending), self.max_calls):
+            self._execute_chunk(pending[start : start + self.max_calls])
+
+    def _execute_chunk(self, chunk: list[PendingCall]) -> None:
+        calls = [
+            (pending_call.contract_function.address, True, pending_call.contract_function._encode_transaction_data())
+            for pending_call in chunk
+        ]
+        try:
+            results = self.contract.functions.aggregate3(calls).call(block_identifier=self.block)
+        except (BadFunctionCallOutput, ContractLogicError):
+            # Multicall3 wasn't deployed at this block (or it ran out of gas): fall back to one eth_call per call.
+            logger.debug("Multicall3 aggregate3 failed at block %s. Falling back to single calls.", self.block)
+            results = [self._single_call(pending_call) for pending_call in chunk]
+
+        for pending_call, (success, return_data) in zip(chunk, results):
+            pending_call.set_result(success, bytes(return_data))
+
+    def _single_call(self, pending_call: PendingCall) -> tuple[bool, bytes]:
+        contract_function = pending_call.contract_function
+        transaction = {"to": contract_function.address, "data": contract_function._encode_transaction_data()}
+        try:
+            return True, self.web3.eth.call(transaction, block_identifier=self.block)
+        except ContractLogicError as e:
+            data = e.data if isinstance(e.data, str) and e.data.startswith("0x") else "0x"
+            return False, bytes.fromhex(data[2:])
@@ -1,11 +1,22 @@
+import logging
+import threading
+import time
+from bisect import bisect_right
 from decimal import Decimal
+from functools import cache
 
 from defabipedia import Chain
-from karpatkit.cache import const_call
+from karpatkit.constants import Address
 from karpatkit.node import get_node
 from web3 import Web3
+from web3.exceptions import ContractLogicError
 
+from defyes.cache import const_call
 from defyes.functions import get_contract
+from defyes.logstore import LogStore
+from defyes.multicall import Multicall
+
+logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 # CHAINLINK PRICE FEEDS
@@ -13,6 +24,16 @@ from defyes.functions import get_contract
 # ETHEREUM
 # Feed Registry
 CHAINLINK_FEED_REGISTRY = "0x47Fb2585D2C56Fe188D0E6ec628a38b74fCeeeDf"
+# First block to look for Feed Registry events (it was deployed some blocks later)
+CHAINLINK_FEED_REGISTRY_START_BLOCK = 12_800_000
+# FeedConfirmed(address indexed asset, address indexed denomination, address indexed latestAggregator, address previousAggregator, uint16 nextPhaseId, address sender)
+CHAINLINK_FEED_CONFIRMED_TOPIC = "0x27a180c70f2642f63d1694eb252b7df52e7ab2565e3f67adf7748acb7d82b9bc"
+# AnswerUpdated(int256 indexed current, uint256 indexed roundId, uint256 updatedAt), emitted by the aggregators on every round
+CHAINLINK_ANSWER_UPDATED_TOPIC = "0x0559884fd3a460db3073b7fc896cc77986f16e378210ded43186175bf646fc5f"
+# Min seconds between two lookups of the chain head to extend the feed index
+FEED_INDEX_REFRESH_INTERVAL = 60
+# Blocks scanned before the first block of a series looking for the round in force (the heartbeat of most feeds is 24 hours at most)
+ROUND_LOOKBACK_BLOCKS = 7_200
 # Quotes - USD and ETH
 CHAINLINK_ETH_QUOTES = ["0x0000000000000000000000000000000000000348", "0xEeeeeEeeeEeEeeEeEeEeeEEEeeeeEeeeeeeeEEeE"]
 # ETH/USD Price Feed
@@ -35,6 +56,115 @@ ABI_CHAINLINK_FEED_REGISTRY = '[{"inputs":[{"internalType":"address","name":"bas
 ABI_CHAINLINK_PRICE_FEED = '[{"inputs":[],"name":"latestAnswer","outputs":[{"internalType":"int256","name":"","type":"int256"}],"stateMutability":"view","type":"function"}, {"inputs":[],"name":"decimals","outputs":[{"internalType":"uint8","name":"","type":"uint8"}],"stateMutability":"view","type":"function"}]'
 
 
+# ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+# FeedIndex
+# (token, quote) -> aggregator index with the block ranges in which every assignment is valid, built from the Feed Registry FeedConfirmed events
+# ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+class FeedIndex:
+    """
+    Index of the Feed Registry assignments, so the feed of a token at a block is resolved without calling `getFeed`.
+
+    The FeedConfirmed logs are kept in the persistent LogStore, so just the new blocks are scanned by every process.
+    A token without any assignment up to a block (or whose feed was removed) has no feed at that block, which answers
+    the "Feed not found" cases without a round trip either.
+
+    The index is extended with the new logs up to the confirmed head (the head minus the LogStore confirmations),
+    looking up the head at most once every `refresh_interval` seconds. The blocks not indexed yet ('latest' and the
+    unconfirmed tail) are answered by the Feed Registry `getFeed`.
+    """
+
+    def __init__(self, web3=None, log_store: LogStore = None, refresh_interval: float = FEED_INDEX_REFRESH_INTERVAL):
+        if web3 is None:
+            web3 = get_node(Chain.ETHEREUM)
+        self.web3 = web3
+        self.log_store = log_store if log_store is not None else LogStore(Chain.ETHEREUM, web3=web3)
+        self.refresh_interval = refresh_interval
+        self.indexed_block = CHAINLINK_FEED_REGISTRY_START_BLOCK - 1
+        self.refreshed_at: float | None = None
+        self._lock = threading.Lock()
+        # (token, quote) -> sorted block numbers of the confirmations and the aggregator confirmed at each of them
+        self.confirmations: dict[tuple[str, str], tuple[list[int], list[str | None]]] = {}
+
+    def refresh(self, block: int) -> None:
+        """Index the FeedConfirmed events after the indexed block up to the block."""
+        with self._lock:
+            if block <= self.indexed_block:
+                return
+            logs = self.log_store.get_logs(
+                CHAINLINK_FEED_REGISTRY, [CHAINLINK_FEED_CONFIRMED_TOPIC], self.indexed_block + 1, block
+            )
+            for log in logs:
+                token, quote, aggregator = (Web3.to_checksum_address(topic[-20:]) for topic in log["topics"][1:4])
+                blocks, aggregators = self.confirmations.setdefault((token, quote), ([], []))
+                blocks.append(log["blockNumber"])
+                aggregators.append(None if aggregator == Address.ZERO else aggregator)
+            self.indexed_block = block
+        logger.debug(f"Chainlink feed index refreshed up to block {block}: {len(logs)} new confirmations.")
+
+    def refresh_to_head(self) -> None:
+        """Index up to the confirmed head, unless the head was already looked up in the last refresh_interval."""
+        now = time.monotonic()
+        if self.refreshed_at is not None and now - self.refreshed_at < self.refresh_interval:
+            return
+        self.refreshed_at = now
+        self.refresh(self.web3.eth.block_number - self.log_store.confirmations)
+
+    def covers(self, block: int | str) -> bool:
+        """Whether the block is indexed, extending the index to the confirmed head if it isn't yet."""
+        if block == "latest":
+            return False
+        if block > self.indexed_block:
+            self.refresh_to_head()
+        return block <= self.indexed_block
+
+    def get_feed(self, token_address: str, quote: str, block: int | str) -> str | None:
+        """Return the aggregator assigned to (token, quote) at the block, or None if there isn't any."""
+        if not self.covers(block):
+            return get_registry_feed(token_address, quote, block, self.web3)
+        try:
+            blocks, aggregators = self.confirmations[
+                Web3.to_checksum_address(token_address), Web3.to_checksum_address(quote)
+            ]
+        except KeyError:
+            return None
+        position = bisect_right(blocks, block)
+        return aggregators[position - 1] if position else None
+
+
+@cache
+def get_feed_index(web3) -> FeedIndex:
+    return FeedIndex(web3)
+
+
+def get_feed(token_address, quote, block, web3=None):
+    """
+    Return the aggregator of the (token, quote) feed at the block or None if there is no feed. The feed index is used,
+    and the Feed Registry `getFeed` just if the index couldn't be built.
+    """
+    if web3 is None:
+        web3 = get_node(Chain.ETHEREUM)
+
+    try:
+        return get_feed_index(web3).get_feed(token_address, quote, block)
+    except Exception as e:
+        logger.debug(f"Chainlink feed index unavailable ({e}). Calling the Feed Registry.")
+
+    return get_registry_feed(token_address, quote, block, web3)
+
+
+def get_registry_feed(token_address, quote, block, web3) -> str | None:
+    """Return the aggregator of the (token, quote) feed at the block, read from the Feed Registry `getFeed`."""
+    feed_registry_contract = get_contract(
+        CHAINLINK_FEED_REGISTRY, Chain.ETHEREUM, web3=web3, abi=ABI_CHAINLINK_FEED_REGISTRY
+    )
+    try:
+        return feed_registry_contract.functions.getFeed(token_address, quote).call(block_identifier=block)
+    except ContractLogicError as e:
+        if "Feed not found" in str(e):
+            return None
+        raise
+
+
 # ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 # get_native_token_price
 # ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
@@ -85,15 +215,11 @@ def get_mainnet_price(token_address, block, web3=None, index=0):
 
     token_address = Web3.to_checksum_address(token_address)
 
-    feed_registry_contract = get_contract(
-        CHAINLINK_FEED_REGISTRY, Chain.ETHEREUM, web3=web3, abi=ABI_CHAINLINK_FEED_REGISTRY
-    )
-
     for quote in CHAINLINK_ETH_QUOTES:
         try:
-            price_feed_address = feed_registry_contract.functions.getFeed(token_address, quote).call(
-                block_identifier=block
-            )
+            price_feed_address = get_feed(token_address, quote, block, web3=web3)
+            if price_feed_address is None:
+                continue
             price_feed_contract = get_contract(
                 price_feed_address, Chain.ETHEREUM, web3=web3, abi=ABI_CHAINLINK_PRICE_FEED
             )
@@ -117,3 +243,252 @@ def get_mainnet_price(token_address, block, web3=None, index=0):
                 raise Exception
 
     return None
+
+
+def get_registry_feeds(token_addresses, block, web3) -> dict:
+    """Return the (quote, aggregator) of every token with a feed, resolved through the Feed Registry in a single Multicall."""
+    feed_registry_contract = get_contract(
+        CHAINLINK_FEED_REGISTRY, Chain.ETHEREUM, web3=web3, abi=ABI_CHAINLINK_FEED_REGISTRY
+    )
+
+    with Multicall(Chain.ETHEREUM, block, web3=web3) as multicall:
+        feeds = {
+            (token_address, quote): multicall.add(feed_registry_contract.functions.getFeed(token_address, quote))
+            for token_address in token_addresses
+            for quote in CHAINLINK_ETH_QUOTES
+        }
+
+    # "Feed not found" reverts are skipped
+    price_feeds = {}
+    for token_address in token_addresses:
+        for quote in CHAINLINK_ETH_QUOTES:
+            if feeds[token_address, quote].success:
+                price_feeds[token_address] = quote, feeds[token_address, quote].result()
+                break
+    return price_feeds
+
+
+# ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+# get_mainnet_prices
+# Batch version of get_mainnet_price: the feeds of every token are resolved in a single Multicall and their answers are read in another one
+# ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+def get_mainnet_prices(token_addresses, block, web3=None) -> dict:
+    """
+    :param token_addresses:
+    :param block:
+    :param web3:
+    :return: the USD price of every token (None if there is no feed for it), by checksum address
+    """
+    if web3 is None:
+        web3 = get_node(Chain.ETHEREUM)
+
+    token_addresses = [Web3.to_checksum_address(token_address) for token_address in token_addresses]
+
+    # The USD quote is preferred, the ETH quote is the fallback
+    try:
+        feed_index = get_feed_index(web3)
+        indexed = feed_index.covers(block)
+    except Exception as e:
+        logger.debug(f"Chainlink feed index unavailable ({e}). Calling the Feed Registry.")
+        indexed = False
+
+    if indexed:
+        price_feeds = {}
+        for token_address in token_addresses:
+            for quote in CHAINLINK_ETH_QUOTES:
+                price_feed_address = feed_index.get_feed(token_address, quote, block)
+                if price_feed_address is not None:
+                    price_feeds[token_address] = quote, price_feed_address
+                    break
+    else:
+        # 'latest' and the unconfirmed blocks aren't indexed
+        price_feeds = get_registry_feeds(token_addresses, block, web3)
+
+    price_feed_contracts = {
+        price_feed_address: get_contract(price_feed_address, Chain.ETHEREUM, web3=web3, abi=ABI_CHAINLINK_PRICE_FEED)
+        for _, price_feed_address in price_feeds.values()
+    }
+    if any(quote != CHAINLINK_ETH_QUOTES[0] for quote, _ in price_feeds.values()):
+        price_feed_contracts[CHAINLINK_ETH_USD] = get_contract(
+            CHAINLINK_ETH_USD, Chain.ETHEREUM, web3=web3, abi=ABI_CHAINLINK_PRICE_FEED
+        )
+
+    with Multicall(Chain.ETHEREUM, block, web3=web3) as multicall:
+        answers = {
+            price_feed_address: multicall.add(contract.functions.latestAnswer())
+            for price_feed_address, contract in price_feed_contracts.items()
+        }
+
+    def feed_price(price_feed_address):
+        if not answers[price_feed_address].success:
+            return None
+        price_feed_decimals = const_call(price_feed_contracts[price_feed_address].functions.decimals())
+        return answers[price_feed_address].result() / 10**price_feed_decimals
+
+    prices = {}
+    for token_address in token_addresses:
+        price = None
+        if token_address in price_feeds:
+            quote, price_feed_address = price_feeds[token_address]
+            price = feed_price(price_feed_address)
+            if price is not None and quote != CHAINLINK_ETH_QUOTES[0]:
+                eth_price = feed_price(CHAINLINK_ETH_USD)
+                price = price * eth_price if eth_price is not None else None
+        prices[token_address] = price
+
+    return prices
+
+
+# ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+# RoundSeries
+# Time series of the rounds of an aggregator, built from its AnswerUpdated events, to answer many blocks or timestamps without a latestAnswer call for each of them
+# ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+class RoundSeries:
+    """
+    Rounds of a Chainlink aggregator, read once from its AnswerUpdated logs and answered by binary search.
+
+    The answer of the aggregator at a block is the one of its last round up to that block, which is what `latestAnswer`
+    returns at that block, so a history of thousands of blocks costs the logs of a few rounds per day instead of one
+    call per block. The logs are kept in the persistent LogStore, so every feed is scanned just once.
+
+    The series is shared by every caller (see `get_round_series`): the loads are serialized, extending the loaded
+    range fetches just the blocks out of it, and the positions, timestamps and answers are replaced together in a
+    single tuple, so readers on other threads never see them out of step.
+    """
+
+    def __init__(self, aggregator: str, web3=None, log_store: LogStore = None):
+        if web3 is None:
+            web3 = get_node(Chain.ETHEREUM)
+        self.aggregator = Web3.to_checksum_address(aggregator)
+        self.web3 = web3
+        self.log_store = log_store if log_store is not None else LogStore(Chain.ETHEREUM, web3=web3)
+        # Block range whose rounds are loaded (both ends included)
+        self.loaded: tuple[int, int] | None = None
+        # Sorted by block, the rounds as (block, log index) positions, their updatedAt timestamps and answers
+        self.rounds: tuple[list[tuple[int, int]], list[int], list[int]] = ([], [], [])
+        self._lock = threading.Lock()
+
+    def fetch_rounds(self, block_start: int, block_end: int) -> list[tuple]:
+        """Return the rounds of the block range as (position, timestamp, answer) tuples."""
+        logs = self.log_store.get_logs(self.aggregator, [CHAINLINK_ANSWER_UPDATED_TOPIC], block_start, block_end)
+        return [
+            (
+                (log["blockNumber"], log["logIndex"]),
+                int.from_bytes(log["data"][-32:], "big"),
+                int.from_bytes(log["topics"][1], "big", signed=True),
+            )
+            for log in logs
+        ]
+
+    def load(self, block_start: int, block_end: int) -> None:
+        """Load the rounds of the block range, extending the range already loaded."""
+        with self._lock:
+            if self.loaded is None:
+                missing_ranges = [(block_start, block_end)]
+            else:
+                if self.loaded[0] <= block_start and block_end <= self.loaded[1]:
+                    return
+                missing_ranges = []
+                if block_start < self.loaded[0]:
+                    missing_ranges.append((block_start, self.loaded[0] - 1))
+                if block_end > self.loaded[1]:
+                    missing_ranges.append((self.loaded[1] + 1, block_end))
+                block_start, block_end = min(block_start, self.loaded[0]), max(block_end, self.loaded[1])
+
+            rounds = [item for start, end in missing_ranges for item in self.fetch_rounds(start, end)]
+            rounds = sorted(rounds + list(zip(*self.rounds)))
+            self.rounds = (
+                [position for position, _, _ in rounds],
+                [timestamp for _, timestamp, _ in rounds],
+                [answer for _, _, answer in rounds],
+            )
+            self.loaded = block_start, block_end
+        logger.debug(f"{len(rounds)} rounds of the aggregator {self.aggregator} loaded ({block_start}-{block_end}).")
+
+    def answer_at_block(self, block: int) -> int | None:
+        """Return the answer of the last loaded round up to the block, or None if there isn't any."""
+        positions, _, answers = self.rounds
+        position = bisect_right(positions, (block, float("inf")))
+        return answers[position - 1] if position else None
+
+    def answer_at_timestamp(self, timestamp: int) -> int | None:
+        """Return the answer of the last loaded round updated up to the timestamp, or None if there isn't any."""
+        _, timestamps, answers = self.rounds
+        position = bisect_right(timestamps, timestamp)
+        return answers[position - 1] if position else None
+
+
+@cache
+def get_round_series(aggregator, web3) -> RoundSeries:
+    return RoundSeries(aggregator, web3)
+
+
+def get_aggregator_answers(aggregator, blocks, web3) -> dict:
+    """
+    Return the answer of the aggregator at every block (sorted), from its rounds. The blocks before the first loaded
+    round (the aggregator didn't update within ROUND_LOOKBACK_BLOCKS before them) share the round in force before the
+    loaded range, which is read with a single `latestAnswer` call.
+    """
+    series = get_round_series(aggregator, web3)
+    series.load(max(blocks[0] - ROUND_LOOKBACK_BLOCKS, 0), blocks[-1])
+
+    answers = {block: series.answer_at_block(block) for block in blocks}
+    missing = [block for block, answer in answers.items() if answer is None]
+    if missing:
+        contract = get_contract(aggregator, Chain.ETHEREUM, web3=web3, abi=ABI_CHAINLINK_PRICE_FEED)
+        try:
+            answer = contract.functions.latestAnswer().call(block_identifier=missing[-1])
+        except ContractLogicError:
+            answer = None
+        answers.update(dict.fromkeys(missing, answer))
+    return answers
+
+
+# ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+# get_mainnet_price_series
+# Time series version of get_mainnet_price: every round of the feeds involved is read once, whatever the number of blocks
+# ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+def get_mainnet_price_series(token_address, blocks, web3=None) -> dict:
+    """
+    :param token_address:
+    :param blocks: the block numbers to price the token at
+    :param web3:
+    :return: the USD price of the token at every block (None if there is no feed for it at that block), by block
+    """
+    if web3 is None:
+        web3 = get_node(Chain.ETHEREUM)
+
+    token_address = Web3.to_checksum_address(token_address)
+    blocks = sorted(set(blocks))
+    feed_index = get_feed_index(web3)
+
+    # The USD quote is preferred, the ETH quote is the fallback. Blocks are grouped by feed, since an aggregator
+    # replacement (a new phase) splits the series.
+    block_feeds = {}
+    for block in blocks:
+        for quote in CHAINLINK_ETH_QUOTES:
+            aggregator = feed_index.get_feed(token_address, quote, block)
+            if aggregator is not None:
+                block_feeds.setdefault((quote, aggregator), []).append(block)
+                break
+
+    prices = dict.fromkeys(blocks)
+    for (quote, aggregator), feed_blocks in block_feeds.items():
+        decimals = const_call(
+            get_contract(aggregator, Chain.ETHEREUM, web3=web3, abi=ABI_CHAINLINK_PRICE_FEED).functions.decimals()
+        )
+        answers = get_aggregator_answers(aggregator, feed_blocks, web3)
+        eth_prices = (
+            get_mainnet_price_series(CHAINLINK_ETH_QUOTES[1], feed_blocks, web3=web3)
+            if quote != CHAINLINK_ETH_QUOTES[0]
+            else {}
+        )
+        for block in feed_blocks:
+            if answers[block] is None:
+                continue
+            price = answers[block] / 10**decimals
+            if quote != CHAINLINK_ETH_QUOTES[0]:
+                price = price * eth_prices[block] if eth_prices[block] is not None else None
+            prices[block] = price
+
+    return prices
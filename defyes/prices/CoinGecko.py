@@ -1,85 +1,195 @@
+import logging
 import math
+import threading
+import time
+from bisect import bisect_left
+from functools import cache
 
 import requests
 from defabipedia import Chain
 from karpatkit.constants import Address
 
+from defyes.ratelimit import TokenBucket
+from defyes.store import get_store
+
+logger = logging.getLogger(__name__)
+
 URL_COINID_PRICE_RANGE = "https://api.coingecko.com/api/v3/coins/%s/market_chart/range?vs_currency=usd&from=%d&to=%d"
 URL_BLOCKCHAINID_TOKENADDRESS_PRICE_RANGE = (
     "https://api.coingecko.com/api/v3/coins/%s/contract/%s/market_chart/range?vs_currency=usd&from=%d&to=%d"
 )
 URL_BLOCKCHAINID_TOKENADDRESS_PRICE = "https://api.coingecko.com/api/v3/coins/%s/contract/%s"
 
+# Seconds of the windows fetched by PriceHistory. Up to 90 days the API returns hourly points.
+RANGE_WINDOW = 90 * 24 * 3600
+# Seconds the window of the present is kept before fetching it again
+RECENT_WINDOW_TTL = 3600
+# Max seconds between a timestamp out of the range of the points and the nearest one to price it with: the hourly
+# granularity of the windows plus the time the window of the present is kept
+MAX_NEAREST_POINT_DISTANCE = 3600 + RECENT_WINDOW_TTL
+# Requests per minute allowed by the public API
+RATE_LIMIT = 10
+# Attempts of a request answered with a 429
+MAX_RETRIES = 5
+
+rate_limiter = TokenBucket(rate=RATE_LIMIT / 60, capacity=RATE_LIMIT)
+
 
 # ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-# get_price
+# Requests
+# Every request to the API goes through a shared token bucket, and is retried when it's answered with a 429 (too many requests)
 # ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-def get_price(token_address, timestamp, blockchain):
+def price_range_url(token_address, start_timestamp, end_timestamp, blockchain):
     """
-
     :param token_address:
-    :param timestamp:
+    :param start_timestamp:
+    :param end_timestamp:
     :param blockchain:
-    :return:
+    :return: the market_chart/range url of the token
     """
-    HOURS = [(23, 1), (24 * 40, 24 * 40), (24 * 180, 24 * 180)]
-    if blockchain not in [Chain.ETHEREUM, Chain.GNOSIS, Chain.POLYGON, Chain.AVALANCHE, Chain.OPTIMISM, Chain.ARBITRUM]:
-        return [timestamp, None]
-
     if token_address == Address.ZERO:
         coin_id = "matic-network" if blockchain == Chain.POLYGON else blockchain
+        return URL_COINID_PRICE_RANGE % (coin_id, start_timestamp, end_timestamp)
 
-        for hours in HOURS:
-            data = requests.get(
-                URL_COINID_PRICE_RANGE % (coin_id, timestamp - 3600 * hours[0], timestamp + 3600 * hours[1])
-            )
-            if data.status_code == 200 and data.json()["prices"]:
-                data = data.json()["prices"]
-                break
-        if not isinstance(data, list):
-            return [data.status_code, [timestamp, None]]
+    blockchain_id = {
+        Chain.POLYGON: "polygon-pos",
+        Chain.OPTIMISM: "optimistic-ethereum",
+        Chain.ARBITRUM: "arbitrum-one",
+    }.get(blockchain, blockchain)
+    return URL_BLOCKCHAINID_TOKENADDRESS_PRICE_RANGE % (blockchain_id, token_address, start_timestamp, end_timestamp)
 
-    else:
-        blockchain_id = {
-            Chain.POLYGON: "polygon-pos",
-            Chain.OPTIMISM: "optimistic-ethereum",
-            Chain.ARBITRUM: "arbitrum-one",
-        }.get(blockchain, blockchain)
-
-        for hours in HOURS:
-            data = requests.get(
-                URL_BLOCKCHAINID_TOKENADDRESS_PRICE_RANGE
-                % (blockchain_id, token_address, timestamp - 3600 * hours[0], timestamp + 3600 * hours[1])
-            )
-            if data.status_code == 200 and data.json()["prices"]:
-                data = data.json()["prices"]
-                break
-        if not isinstance(data, list):
-            return [data.status_code, [timestamp, None]]
 
-    if data == [] or data is None:
-        return [200, [timestamp, None]]
+def fetch(url):
+    """
+    :param url:
+    :return: the response of the GET request, sent when the rate limiter allows it and retried up to MAX_RETRIES times
+        on 429 responses
+    """
+    for _ in range(MAX_RETRIES):
+        rate_limiter.acquire()
+        response = requests.get(url)
+        if response.status_code != 429:
+            break
+        retry_after = response.headers.get("Retry-After")
+        rate_limiter.pause(float(retry_after) if retry_after else 60 / RATE_LIMIT)
+        logger.debug(f"CoinGecko rate limit exceeded. Retrying {url}")
+    return response
 
-    if len(data) == 1:
-        return [200, [math.floor(data[0][0] / 1000), data[0][1]]]
 
-    i = 0
-    while int(data[i][0]) < timestamp * 1000:
-        i += 1
-        if i == len(data):
-            break
+# ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+# PriceHistory
+# Price points of a token, fetched by RANGE_WINDOW aligned windows and persisted, so every window is requested just once
+# ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+class PriceHistory:
+    """
+    Price points of a token, interpolated locally by binary search.
+
+    Time is split in RANGE_WINDOW windows aligned to the epoch, and each one is fetched with a single market_chart/range
+    request the first time a timestamp within it is priced. The windows already finished are kept in the "coingecko"
+    store, so pricing a token every day of a year takes a handful of requests the first time and none afterwards. The
+    window of the present is kept in memory for RECENT_WINDOW_TTL seconds.
+
+    The timestamps and prices of the points are replaced together in a single tuple, so readers on other threads never
+    see them out of step.
+    """
+
+    def __init__(self, token_address, blockchain):
+        self.token_address = token_address
+        self.blockchain = blockchain
+        self.store = get_store("coingecko")
+        self.windows: dict[int, list] = {}
+        self.expires: dict[int, float] = {}
+        # Sorted timestamps (in milliseconds) and prices of the points
+        self.points: tuple[list[int], list[float]] = ([], [])
+        self._lock = threading.Lock()
+
+    def load_window(self, window: int) -> int:
+        """
+        :param window: the index of the window, that is, its start timestamp divided by RANGE_WINDOW
+        :return: the status code of the request (200 if the window was already loaded)
+        """
+        if window in self.windows and time.time() < self.expires.get(window, float("inf")):
+            return 200
+
+        key = (str(self.blockchain), self.token_address.lower(), RANGE_WINDOW, window)
+        points = self.store.get(key)
+        if points is None:
+            start, end = window * RANGE_WINDOW, (window + 1) * RANGE_WINDOW
+            response = fetch(price_range_url(self.token_address, start, end, self.blockchain))
+            if response.status_code != 200:
+                return response.status_code
+            points = response.json()["prices"] or []
+            if end < time.time() - RECENT_WINDOW_TTL:
+                self.store.set(key, points)
+            else:
+                self.expires[window] = time.time() + RECENT_WINDOW_TTL
+
+        with self._lock:
+            self.windows[window] = points
+            merged = sorted(point for points in self.windows.values() for point in points)
+            self.points = [point[0] for point in merged], [point[1] for point in merged]
+        return 200
+
+    def get_price(self, timestamp):
+        """
+        :param timestamp:
+        :return: [status code, [timestamp, price]], the price being interpolated between the surrounding points. Out of
+            the range of the points, the nearest one (and its timestamp) is returned, or None if it's further than
+            MAX_NEAREST_POINT_DISTANCE.
+        """
+        window = timestamp // RANGE_WINDOW
+        status_code = self.load_window(window)
+        if status_code != 200:
+            return [status_code, [timestamp, None]]
+
+        # The surrounding points may lie in the neighbouring windows (or the token wasn't listed yet in this one)
+        timestamps, _ = self.points
+        position = bisect_left(timestamps, timestamp * 1000)
+        if position == 0:
+            self.load_window(window - 1)
+        if position == len(timestamps) and (window + 1) * RANGE_WINDOW < time.time():
+            self.load_window(window + 1)
+        timestamps, prices = self.points
+        position = bisect_left(timestamps, timestamp * 1000)
+
+        if position in (0, len(timestamps)):
+            nearest = min(position, len(timestamps) - 1)
+            if nearest < 0 or abs(timestamps[nearest] / 1000 - timestamp) > MAX_NEAREST_POINT_DISTANCE:
+                return [200, [timestamp, None]]
+            return [200, [math.floor(timestamps[nearest] / 1000), prices[nearest]]]
+        if timestamps[position] == timestamp * 1000:
+            return [200, [timestamp, prices[position]]]
+
+        t0, t1 = timestamps[position - 1], timestamps[position]
+        p0, p1 = prices[position - 1], prices[position]
+        return [200, [timestamp, ((timestamp * 1000 - t0) * p1 + (t1 - timestamp * 1000) * p0) / (t1 - t0)]]
+
+
+def get_price_history(token_address, blockchain) -> PriceHistory:
+    """Return the PriceHistory of the token, shared by every spelling of its address."""
+    return _get_price_history(token_address.lower(), blockchain)
+
+
+@cache
+def _get_price_history(token_address, blockchain) -> PriceHistory:
+    return PriceHistory(token_address, blockchain)
+
+
+# ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+# get_price
+# ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+def get_price(token_address, timestamp, blockchain):
+    """
 
-    if i == len(data):
-        return [200, [math.floor(data[i - 1][0] / 1000), data[i - 1][1]]]
+    :param token_address:
+    :param timestamp:
+    :param blockchain:
+    :return:
+    """
+    if blockchain not in [Chain.ETHEREUM, Chain.GNOSIS, Chain.POLYGON, Chain.AVALANCHE, Chain.OPTIMISM, Chain.ARBITRUM]:
+        return [timestamp, None]
 
-    return [
-        200,
-        [
-            timestamp,
-            ((timestamp * 1000 - data[i - 1][0]) * data[i][1] + (data[i][0] - timestamp * 1000) * data[i - 1][1])
-            / (data[i][0] - data[i - 1][0]),
-        ],
-    ]
+    return get_price_history(token_address, blockchain).get_price(timestamp)
 
 
 # ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
@@ -105,7 +215,7 @@ def get_price_range(token_address, start_timestamp, end_timestamp, blockchain):
         else:
             coin_id = blockchain
 
-        data = requests.get(URL_COINID_PRICE_RANGE % (coin_id, start_timestamp, end_timestamp))
+        data = fetch(URL_COINID_PRICE_RANGE % (coin_id, start_timestamp, end_timestamp))
         if data.status_code != 200:
             return [data.status_code, None]
         else:
@@ -117,7 +227,7 @@ def get_price_range(token_address, start_timestamp, end_timestamp, blockchain):
         else:
             blockchain_id = blockchain
 
-        data = requests.get(
+        data = fetch(
             URL_BLOCKCHAINID_TOKENADDRESS_PRICE_RANGE % (blockchain_id, token_address, start_timestamp, end_timestamp)
         )
         if data.status_code != 200:
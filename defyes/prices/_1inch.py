@@ -3,8 +3,11 @@ from karpatkit.constants import Address
 from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.functions import get_contract, get_decimals
+from defyes.cache import LRUCache, caches
+from defyes.functions import ensure_a_block_number, get_contract, get_decimals
+from defyes.multicall import Multicall
 from defyes.prices import Chainlink
+from defyes.snapshot import get_snapshot
 
 # ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 # ORACLES
@@ -33,6 +36,9 @@ ORACLE_ARBITRUM = "0x735247fb0a604c0adC6cab38ACE16D0DbA31295F"
 # Avax Oracle Address
 ORACLE_AVAX = "0xBd0c7AaF0bF082712EbE919a9dD94b2d978f79A9"
 
+# Max number of per-block PricingGraphs kept in memory
+PRICING_GRAPHS_CACHE_SIZE = 64
+
 # ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 # ABIs
 # ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
@@ -119,6 +125,123 @@ def get_rate(token_src, block, blockchain, web3=None, use_wrappers=False, token_
     return rate
 
 
+# ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+# PricingGraph
+# 1inch prices at a block: every token is priced through the native token or its connector, and every connector is resolved once for all its dependent tokens
+# ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+class PricingGraph:
+    """
+    1inch prices of the tokens at a block, memoizing the native token price and every rate read from the OffchainOracle.
+
+    The rates a request needs and aren't known yet (`getRateToEth` of the tokens and connectors, `getRate` of the tokens
+    to their connectors) are read in a single Multicall, so many tokens sharing a connector at a block cost one
+    connector lookup.
+    """
+
+    def __init__(self, blockchain, block, web3=None, use_wrappers=False):
+        if web3 is None:
+            web3 = get_node(blockchain)
+        self.blockchain = blockchain
+        self.block = block
+        self.web3 = web3
+        self.use_wrappers = use_wrappers
+        self.oracle_contract = get_contract(get_oracle_address(blockchain), blockchain, web3=web3, abi=ABI_ORACLE)
+        self.native_token_price = None
+        # Raw rates (None if the call reverted), by token and by (token, connector)
+        self.rates_to_eth: dict[str, int | None] = {}
+        self.rates: dict[tuple[str, str], int | None] = {}
+
+    def fetch(self, tokens_src, connectors) -> None:
+        """Read the native token price and the missing rates needed to price the tokens."""
+        if self.native_token_price is None:
+            self.native_token_price = Chainlink.get_native_token_price(self.web3, self.block, self.blockchain)
+
+        to_eth = {connectors.get(token_src, token_src) for token_src in tokens_src} - {Address.ZERO}
+        to_eth = [token for token in to_eth if token not in self.rates_to_eth]
+        to_connector = [
+            (token_src, connectors[token_src])
+            for token_src in tokens_src
+            if token_src in connectors
+            and token_src != Address.ZERO
+            and (token_src, connectors[token_src]) not in self.rates
+        ]
+        if not to_eth and not to_connector:
+            return
+
+        functions = self.oracle_contract.functions
+        with Multicall(self.blockchain, self.block, web3=self.web3) as multicall:
+            pending_to_eth = {
+                token: multicall.add(functions.getRateToEth(token, self.use_wrappers)) for token in to_eth
+            }
+            pending = {pair: multicall.add(functions.getRate(*pair, self.use_wrappers)) for pair in to_connector}
+
+        for token, call in pending_to_eth.items():
+            self.rates_to_eth[token] = call.result() if call.success else None
+        for pair, call in pending.items():
+            self.rates[pair] = call.result() if call.success else None
+
+    def price_through_native_token(self, token):
+        if token == Address.ZERO:
+            return self.native_token_price
+        rate = self.rates_to_eth[token]
+        if rate is None:
+            return None
+        token_decimals = get_decimals(token, self.blockchain, web3=self.web3)
+        return self.native_token_price * rate / (10 ** abs(18 + 18 - token_decimals))
+
+    def prices(self, tokens_src, connectors=None) -> dict:
+        """
+        :param tokens_src: checksum addresses
+        :param connectors: {token_src: connector} checksum addresses -> the tokens with a connector are priced through
+            it, the rest through the native token
+        :return: the price of every token (None if its rate couldn't be read), by address
+        """
+        connectors = connectors or {}
+        self.fetch(tokens_src, connectors)
+
+        prices = {}
+        for token_src in tokens_src:
+            if token_src == Address.ZERO or token_src not in connectors:
+                prices[token_src] = self.price_through_native_token(token_src)
+                continue
+
+            connector = connectors[token_src]
+            connector_price = self.price_through_native_token(connector)
+            rate = self.rates[token_src, connector]
+            if connector_price is None or rate is None:
+                prices[token_src] = None
+                continue
+            token_src_decimals = get_decimals(token_src, self.blockchain, web3=self.web3)
+            connector_decimals = get_decimals(connector, self.blockchain, web3=self.web3)
+            prices[token_src] = connector_price * rate / (10 ** abs(18 + connector_decimals - token_src_decimals))
+
+        return prices
+
+
+pricing_graphs = caches["_1inch.pricing_graphs"] = LRUCache(PRICING_GRAPHS_CACHE_SIZE)
+
+
+def get_pricing_graph(blockchain, block, web3=None, use_wrappers=False) -> PricingGraph:
+    """
+    :return: the PricingGraph of the block, shared by the following calls at the same block (within a Snapshot, by the
+        calls of the snapshot)
+    """
+    if web3 is None:
+        web3 = get_node(blockchain)
+    block = ensure_a_block_number(block, blockchain)
+
+    snapshot = get_snapshot(blockchain, block)
+    if snapshot is not None:
+        return snapshot.memoize(("1inch", use_wrappers), PricingGraph, blockchain, block, web3, use_wrappers)
+
+    key = (web3, blockchain, block, use_wrappers)
+    graph = pricing_graphs.get(key)
+    if graph is None:
+        graph = PricingGraph(blockchain, block, web3, use_wrappers)
+        pricing_graphs.put(key, graph)
+    return graph
+
+
 # ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 # get_price
 # 'execution' = the current iteration, as the function goes through the different Full/Archival nodes of the blockchain attempting a successfull execution
@@ -140,25 +263,33 @@ def get_price(token_src, block, blockchain, web3=None, use_wrappers=False, conne
     :return:
     """
 
-    if web3 is None:
-        web3 = get_node(blockchain)
-
     token_src = Web3.to_checksum_address(token_src)
+    connectors = {token_src: Web3.to_checksum_address(connector)} if connector is not None else None
 
-    native_token_price = Chainlink.get_native_token_price(web3, block, blockchain)
+    graph = get_pricing_graph(blockchain, block, web3=web3, use_wrappers=use_wrappers)
+    return graph.prices([token_src], connectors)[token_src]
 
-    if token_src == Address.ZERO:
-        return native_token_price
 
-    else:
-        if connector is None:
-            rate = get_rate(token_src, block, blockchain, use_wrappers=use_wrappers)
-            token_src_price = native_token_price * rate
-        else:
-            connector = Web3.to_checksum_address(connector)
-
-            rate = get_rate(token_src, block, blockchain, token_dst=connector, use_wrappers=use_wrappers)
-            connector_price = get_price(connector, block, blockchain, use_wrappers=use_wrappers)
-            token_src_price = connector_price * rate
-
-    return token_src_price
+# ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+# get_prices
+# Batch version of get_price: the native token price is read once and the rates of every token (and connector) are read in a single Multicall
+# 'connectors' = {token_src: connector} -> the tokens with a connector are priced through it, the rest through the native token
+# ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+def get_prices(tokens_src, block, blockchain, web3=None, use_wrappers=False, connectors=None) -> dict:
+    """
+    :param tokens_src:
+    :param block:
+    :param blockchain:
+    :param web3:
+    :param use_wrappers:
+    :param connectors:
+    :return: the price of every token (None if its rate couldn't be read), by checksum address
+    """
+    tokens_src = [Web3.to_checksum_address(token_src) for token_src in tokens_src]
+    connectors = {
+        Web3.to_checksum_address(token_src): Web3.to_checksum_address(connector)
+        for token_src, connector in (connectors or {}).items()
+    }
+
+    graph = get_pricing_graph(blockchain, block, web3=web3, use_wrappers=use_wrappers)
+    return graph.prices(tokens_src, connectors)
@@ -0,0 +1,79 @@
+"""
+# Lending oracles
+
+Prices read from the oracles of the lending protocols, which price every reserve of the protocol in a single call:
+
+- Aave v2 / v3, Spark and Agave oracles: `getAssetsPrices(address[])`.
+- Compound v3 comets: `getPrice(priceFeed)` of the base token and every collateral, in a single Multicall.
+
+The protocols value their positions with these prices, and `publish_prices()` hands them to the price cache, so a
+`get_price` or `get_prices` of the same tokens at the same block without an explicit source reuses them instead of
+asking Chainlink again. The lookups of an explicit source never get an oracle price.
+"""
+
+import logging
+
+from web3 import Web3
+
+from defyes.functions import get_contract
+from defyes.multicall import Multicall
+from defyes.prices.pricecache import DEFAULT_LOOKUP, CachedPrice, get_price_cache
+
+logger = logging.getLogger(__name__)
+
+# Aave Price Oracle ABI - getAssetsPrices
+ABI_ASSETS_PRICES = '[{"inputs":[{"internalType":"address[]","name":"assets","type":"address[]"}],"name":"getAssetsPrices","outputs":[{"internalType":"uint256[]","name":"","type":"uint256[]"}],"stateMutability":"view","type":"function"}]'
+
+
+def get_assets_prices(price_oracle_address, assets, block, blockchain, web3=None) -> dict:
+    """
+    Return the raw prices (in the base currency units of the oracle) of the assets, read with a single
+    `getAssetsPrices` call to an Aave-like oracle.
+    """
+    price_oracle_contract = get_contract(price_oracle_address, blockchain, web3=web3, abi=ABI_ASSETS_PRICES)
+    assets = [Web3.to_checksum_address(asset) for asset in assets]
+    if not assets:
+        return {}
+    prices = price_oracle_contract.functions.getAssetsPrices(assets).call(block_identifier=block)
+    return dict(zip(assets, prices))
+
+
+def get_comet_prices(comet, block, blockchain, web3=None) -> dict:
+    """
+    Return the raw prices (8 decimals, in the price units of the comet) of the base token and every collateral of a
+    Compound v3 comet. The asset infos and the prices are read in a Multicall each.
+
+    Args:
+        comet: The defyes.protocols.compoundv3.Comet instance.
+    """
+    with Multicall(blockchain, block, web3=web3) as multicall:
+        asset_infos = [multicall.add(comet.contract.functions.getAssetInfo(i)) for i in range(comet.num_assets)]
+    price_feeds = {Web3.to_checksum_address(comet.base_token): comet.base_token_price_feed}
+    for asset_info in asset_infos:
+        _, asset, price_feed, *_ = asset_info.result()
+        price_feeds[Web3.to_checksum_address(asset)] = price_feed
+
+    with Multicall(blockchain, block, web3=web3) as multicall:
+        prices = {
+            asset: multicall.add(comet.contract.functions.getPrice(price_feed))
+            for asset, price_feed in price_feeds.items()
+        }
+    return {asset: price.result() for asset, price in prices.items() if price.success}
+
+
+def publish_prices(prices: dict, block, blockchain, source: str) -> None:
+    """
+    Put the USD prices read from a lending oracle in the price cache, so get_price and get_prices reuse them at the
+    same block when they aren't asked for an explicit source. The cached prices record the oracle as their source.
+    """
+    price_cache = get_price_cache()
+    if price_cache is None or not isinstance(block, int):
+        return
+    for token_address, price in prices.items():
+        if not price:
+            continue
+        token_address = Web3.to_checksum_address(token_address)
+        price_cache.put(
+            blockchain, token_address, block, DEFAULT_LOOKUP, CachedPrice(float(price), source, blockchain, block)
+        )
+    logger.debug(f"{len(prices)} prices of the {source} oracle published at block {block}.")
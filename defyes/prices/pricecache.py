@@ -0,0 +1,125 @@
+"""
+# Price cache
+
+Cache of the prices returned by `prices.get_price` and `prices.get_prices`, keyed by (blockchain, token, block
+bucket, requested source). Every cached price records the source that answered and the block it was read at. The
+lookups without an explicit source are cached apart, under DEFAULT_LOOKUP, since they can also be answered by the
+prices published by the lending oracles (see `prices.lending`).
+
+- Exact mode (`bucket_blocks=1`, the default): a price is reused just for its own block. Meant for audits.
+- Bucketed mode: blocks are grouped by `block // bucket_blocks` and the first price read within a bucket is reused for
+  the whole bucket. Meant for dashboards, where a price of the same hour is good enough.
+
+Recent prices are kept in an in-memory LRU. With `persistent=True` they are also kept in the "prices" store
+(optionally expiring after `ttl` seconds), so they survive the process.
+
+    from defyes.prices.pricecache import BLOCKS_PER_HOUR, PriceCache, set_price_cache
+
+    set_price_cache(PriceCache(bucket_blocks=BLOCKS_PER_HOUR, persistent=True, ttl=7 * 24 * 3600))
+"""
+
+from dataclasses import dataclass
+
+from defabipedia import Chain
+
+from defyes.cache import LRUCache, caches
+from defyes.store import get_store
+
+# Default max number of prices kept in memory.
+PRICE_CACHE_SIZE = 100_000
+
+# Requested source of the lookups made without an explicit source.
+DEFAULT_LOOKUP = "default"
+
+# Approximate number of blocks per hour, to bucket the prices by hour.
+BLOCKS_PER_HOUR = {
+    Chain.ETHEREUM: 300,
+    Chain.GNOSIS: 720,
+    Chain.POLYGON: 1800,
+    Chain.ARBITRUM: 14400,
+    Chain.OPTIMISM: 1800,
+    Chain.AVALANCHE: 1800,
+}
+
+
+@dataclass(frozen=True)
+class CachedPrice:
+    price: float
+    source: str
+    blockchain: str
+    block: int
+
+
+class PriceCache:
+    """
+    Cache of token prices by (blockchain, token, block bucket, requested source).
+
+    Args:
+        bucket_blocks (int | dict, optional): Blocks per bucket, or the blocks per bucket of every blockchain (those
+            missing use exact blocks). Defaults to 1, that is, exact blocks.
+        maxsize (int, optional): Max number of prices kept in memory. Defaults to PRICE_CACHE_SIZE.
+        persistent (bool, optional): Keep the prices in the "prices" store as well. Defaults to False.
+        ttl (float, optional): Seconds the persisted prices are kept. Defaults to None, that is, forever (until the
+            store size limit evicts them).
+    """
+
+    def __init__(
+        self,
+        bucket_blocks: int | dict = 1,
+        maxsize: int = PRICE_CACHE_SIZE,
+        persistent: bool = False,
+        ttl: float | None = None,
+    ):
+        self.bucket_blocks = bucket_blocks
+        self.memory = LRUCache(maxsize)
+        self.store = get_store("prices") if persistent else None
+        self.ttl = ttl
+
+    def blocks_per_bucket(self, blockchain: str) -> int:
+        if isinstance(self.bucket_blocks, dict):
+            return self.bucket_blocks.get(blockchain, 1)
+        return self.bucket_blocks
+
+    def key(self, blockchain: str, token_address: str, block: int, source: str) -> tuple:
+        blocks_per_bucket = self.blocks_per_bucket(blockchain)
+        return (str(blockchain), token_address, blocks_per_bucket, block // blocks_per_bucket, source)
+
+    def get(self, blockchain: str, token_address: str, block: int, source: str) -> CachedPrice | None:
+        """Return the cached price of the token within the bucket of the block, or None if there isn't any."""
+        key = self.key(blockchain, token_address, block, source)
+        cached = self.memory.get(key)
+        if cached is None and self.store is not None:
+            cached = self.store.get(key)
+            if cached is not None:
+                self.memory.put(key, cached)
+        return cached
+
+    def put(self, blockchain: str, token_address: str, block: int, source: str, cached: CachedPrice) -> None:
+        """Cache the price read at the block, for the requests of the given source."""
+        key = self.key(blockchain, token_address, block, source)
+        self.memory.put(key, cached)
+        if self.store is not None:
+            self.store.set(key, cached, expire=self.ttl)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.store is not None:
+            self.store.clear()
+
+
+price_cache = PriceCache()
+caches["prices"] = price_cache.memory
+
+
+def get_price_cache() -> PriceCache | None:
+    return price_cache
+
+
+def set_price_cache(cache: PriceCache | None) -> None:
+    """Replace the price cache used by get_price and get_prices. None disables it."""
+    global price_cache
+    price_cache = cache
+    if cache is None:
+        caches.pop("prices", None)
+    else:
+        caches["prices"] = cache.memory
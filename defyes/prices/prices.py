@@ -1,4 +1,8 @@
-from time import sleep
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
+from time import perf_counter
 from typing import Tuple
 
 from defabipedia import Chain
@@ -7,7 +11,9 @@ from karpatkit.explorer import ChainExplorer
 from karpatkit.node import get_node
 from web3 import Web3
 
+from defyes.functions import ensure_a_block_number
 from defyes.prices import Chainlink, CoinGecko, _1inch
+from defyes.prices.pricecache import DEFAULT_LOOKUP, CachedPrice, get_price_cache
 
 # Taken from token_mappings although all of them have the same value
 ONEINCH_CONNECTOR_DICT = {
@@ -21,10 +27,28 @@ ONEINCH_CONNECTOR_DICT = {
     "0xDEf1CA1fb7FBcDC777520aa7f396b4E015F497aB": "0x9C58BAcC331c9aa871AFD802DB6379a98e80CEdb",
 }
 
+logger = logging.getLogger(__name__)
+
 SOURCES_LIST = ["chainlink", "1inch", "coingecko"]
 
+# Seconds each source waits for the sources before it in a parallel get_price, before being queried too. It's
+# queried right away once all of them failed.
+RACE_STAGGER = 0.25
+# Max number of source lookups running at once for the parallel get_price calls
+RACE_WORKERS = 8
+
+race_executor = ThreadPoolExecutor(max_workers=RACE_WORKERS, thread_name_prefix="price-source")
 
-def get_price(token_address, block, blockchain, web3=None, source: str = "chainlink") -> Tuple[int, str, str]:
+
+def get_price(
+    token_address,
+    block,
+    blockchain,
+    web3=None,
+    source: str | None = None,
+    parallel: bool = False,
+    latencies: dict[str, float] | None = None,
+) -> Tuple[int, str, str]:
     """Function to get token prices.
     You can specify the source. In case it is not specified, chainlink is the first oracle to check the price.
     In case it doesn't work (price is Null), 1inch and then coingecko are used.
@@ -35,19 +59,48 @@ def get_price(token_address, block, blockchain, web3=None, source: str = "chainl
         block (int)
         blockchain (str)
         web3 (web3, optional): web3 node. Defaults to None.
-        source (str, optional): Where to get the prices [chainlink, 1inch, coingecko]. Defaults to "chainlink".
+        source (str, optional): Where to get the prices [chainlink, 1inch, coingecko]. Defaults to None, that is,
+            chainlink first, also reusing the prices published by the lending oracles at the same block.
+        parallel (bool, optional): Query all the sources at once instead of one after the other. The answer is the
+            same, but a token without a price in the first sources doesn't wait for them to fail. Defaults to False.
+        latencies (dict, optional): If provided, it's filled with the seconds taken by every source that answered.
 
     Returns:
         (float, str, str): price, source, blockchain
     """
     # Checks
-    assert source in SOURCES_LIST, "Please input an existing oracle."
+    assert source is None or source in SOURCES_LIST, "Please input an existing oracle."
+
+    token_address = Web3.to_checksum_address(token_address)
+    requested_source = DEFAULT_LOOKUP if source is None else source
+    source = source or SOURCES_LIST[0]
+
+    # The prices at a block number are cached (see pricecache), the ones at 'latest' aren't.
+    price_cache = get_price_cache() if isinstance(block, int) else None
+    if price_cache is not None:
+        cached = price_cache.get(blockchain, token_address, block, requested_source)
+        if cached is not None:
+            return cached.price, cached.source, cached.blockchain
+
+    price = _get_price(token_address, block, blockchain, web3, source, parallel, latencies)
+    if price_cache is not None and price[0] is not None:
+        price_cache.put(blockchain, token_address, block, requested_source, CachedPrice(*price, block))
+    return price
 
+
+def _get_price(
+    token_address: str,
+    block,
+    blockchain,
+    web3,
+    source: str,
+    parallel: bool,
+    latencies: dict[str, float] | None,
+) -> Tuple[int, str, str]:
+    """Price the token with the source fallbacks of get_price, without the price cache."""
     if web3 is None:
         web3 = get_node(blockchain)
 
-    token_address = Web3.to_checksum_address(token_address)
-
     # Get price directly from Chainlink in case of native token.
     if token_address == Address.ZERO:
         return Chainlink.get_native_token_price(web3, block, blockchain), "chainlink", blockchain
@@ -56,7 +109,13 @@ def get_price(token_address, block, blockchain, web3=None, source: str = "chainl
     if blockchain != Chain.ETHEREUM and source == "chainlink":
         source = "1inch"
 
+    if parallel:
+        return _race_sources(SOURCES_LIST[SOURCES_LIST.index(source) :], token_address, block, blockchain, latencies)
+
+    start = perf_counter()
     price = _get_price_from_source(source, token_address, block, blockchain)
+    if latencies is not None:
+        latencies[source] = perf_counter() - start
 
     # Created this flag to avoid returning None when 0s appear.
     flag_zero = False
@@ -67,7 +126,10 @@ def get_price(token_address, block, blockchain, web3=None, source: str = "chainl
             flag_zero = True
         try:
             source = SOURCES_LIST[SOURCES_LIST.index(source) + 1]
+            start = perf_counter()
             price = _get_price_from_source(source, token_address, block, blockchain)
+            if latencies is not None:
+                latencies[source] = perf_counter() - start
         except IndexError:
             if flag_zero:
                 price = 0.0
@@ -76,9 +138,196 @@ def get_price(token_address, block, blockchain, web3=None, source: str = "chainl
     return (price, source, blockchain)
 
 
-def _get_price_from_source(source: str, token_address: str, block: int, blockchain: str):
+def _timed_price(
+    source: str,
+    token_address: str,
+    block: int,
+    blockchain: str,
+    start_event: threading.Event,
+    delay: float,
+    cancelled: threading.Event,
+) -> Tuple[float | None, float | None]:
+    """Return the price of the source and the seconds taken, or (None, None) if the race was decided before."""
+    start_event.wait(delay)
+    if cancelled.is_set():
+        return None, None
+    start = perf_counter()
+    price = _get_price_from_source(source, token_address, block, blockchain, cancelled=cancelled)
+    return price, perf_counter() - start
+
+
+def _race_sources(
+    sources: list[str], token_address: str, block: int, blockchain: str, latencies: dict[str, float] | None
+) -> Tuple[float, str, str]:
+    """Query the sources concurrently and return the answer of the first source (in precedence order) with a price
+    other than None or 0, as get_price does. Every source starts RACE_STAGGER seconds after the one before it, or as
+    soon as all the sources before it failed. Once the answer is known, the lookups not started yet are skipped and
+    the running ones stop before spending more rate limited requests.
+    """
+    cancelled = threading.Event()
+    start_events = [threading.Event() for _ in sources]
+    start_events[0].set()
+    # Every lookup runs in a copy of the current context, so an active Snapshot is still used.
+    futures = {
+        race_executor.submit(
+            copy_context().run,
+            _timed_price,
+            source,
+            token_address,
+            block,
+            blockchain,
+            start_event,
+            n * RACE_STAGGER,
+            cancelled,
+        ): source
+        for n, (source, start_event) in enumerate(zip(sources, start_events))
+    }
+    by_source = {source: future for future, source in futures.items()}
+    try:
+        for future in as_completed(futures):
+            if latencies is not None and future.exception() is None and future.result()[1] is not None:
+                latencies[futures[future]] = future.result()[1]
+            # The precedence is kept: stop at the first source still running, or at the first one with a price
+            for n, source in enumerate(sources):
+                if not by_source[source].done():
+                    # Every source before it failed
+                    start_events[n].set()
+                    break
+                price = by_source[source].result()[0]
+                if price is not None and price != 0:
+                    logger.debug(f"{token_address} priced by {source} at block {block}.")
+                    return price, source, blockchain
+            else:
+                break
+    finally:
+        cancelled.set()
+        for start_event in start_events:
+            start_event.set()
+        for future in futures:
+            future.cancel()
+
+    zero_priced = any(by_source[source].result()[0] == 0 for source in sources)
+    return 0.0 if zero_priced else None, sources[-1], blockchain
+
+
+def get_prices(
+    token_addresses: list[str], block, blockchain, web3=None, source: str | None = None
+) -> dict[str, Tuple[float, str, str]]:
+    """Function to get the prices of many tokens at once.
+    Same sources and fallback order as get_price, but every source prices all the pending tokens together: Chainlink
+    feeds and 1inch rates are read in batched calls and the native token price is read once.
+    The next source is only used for the tokens whose price is still None or 0.
+
+    Args:
+        token_addresses (list[str])
+        block (int)
+        blockchain (str)
+        web3 (web3, optional): web3 node. Defaults to None.
+        source (str, optional): Where to get the prices first [chainlink, 1inch, coingecko]. Defaults to None, that
+            is, chainlink first, also reusing the prices published by the lending oracles at the same block.
+
+    Returns:
+        dict[str, (float, str, str)]: price, source, blockchain of every token, by checksum address.
+    """
+    # Checks
+    assert source is None or source in SOURCES_LIST, "Please input an existing oracle."
+
+    if web3 is None:
+        web3 = get_node(blockchain)
+
+    block = ensure_a_block_number(block, blockchain)
+    token_addresses = list(dict.fromkeys(Web3.to_checksum_address(token_address) for token_address in token_addresses))
+    price_cache = get_price_cache()
+    requested_source = DEFAULT_LOOKUP if source is None else source
+    source = source or SOURCES_LIST[0]
+
+    prices = {}
+    pending = []
+    for token_address in token_addresses:
+        cached = (
+            price_cache.get(blockchain, token_address, block, requested_source) if price_cache is not None else None
+        )
+        if cached is not None:
+            prices[token_address] = cached.price, cached.source, cached.blockchain
+        # Get price directly from Chainlink in case of native token.
+        elif token_address == Address.ZERO:
+            prices[token_address] = Chainlink.get_native_token_price(web3, block, blockchain), "chainlink", blockchain
+        else:
+            pending.append(token_address)
+
+    # As chainlink is just for eth, we switch to 1inch in case of xdai and other blockchains.
+    if blockchain != Chain.ETHEREUM and source == "chainlink":
+        source = "1inch"
+
+    # Tokens priced 0 by some source, to avoid returning None for them.
+    zero_priced = set()
+
+    for source in SOURCES_LIST[SOURCES_LIST.index(source) :]:
+        if not pending:
+            break
+        source_prices = _get_prices_from_source(source, pending, block, blockchain, web3)
+        still_pending = []
+        for token_address in pending:
+            price = source_prices.get(token_address)
+            if price is None or price == 0:
+                if price == 0:
+                    zero_priced.add(token_address)
+                still_pending.append(token_address)
+            else:
+                prices[token_address] = price, source, blockchain
+                if price_cache is not None:
+                    price_cache.put(
+                        blockchain,
+                        token_address,
+                        block,
+                        requested_source,
+                        CachedPrice(price, source, blockchain, block),
+                    )
+        pending = still_pending
+
+    for token_address in pending:
+        prices[token_address] = 0.0 if token_address in zero_priced else None, SOURCES_LIST[-1], blockchain
+
+    return {token_address: prices[token_address] for token_address in token_addresses}
+
+
+def _get_prices_from_source(source: str, token_addresses: list[str], block: int, blockchain: str, web3) -> dict:
+    """Get the prices of many tokens from the selected source.
+    Used by the get_prices function. Chainlink and 1inch price all the tokens in batched calls.
+
+    Returns:
+        dict: price by token address.
+    """
+    if source == "chainlink":
+        try:
+            return Chainlink.get_mainnet_prices(token_addresses, block, web3=web3)
+        except Exception:
+            return {}
+
+    elif source == "1inch":
+        connectors = {
+            token_address: ONEINCH_CONNECTOR_DICT[token_address]
+            for token_address in token_addresses
+            if token_address in ONEINCH_CONNECTOR_DICT
+        }
+        try:
+            return _1inch.get_prices(token_addresses, block, blockchain, web3=web3, connectors=connectors)
+        except Exception:
+            return {}
+
+    elif source == "coingecko":
+        return {
+            token_address: _get_price_from_source(source, token_address, block, blockchain)
+            for token_address in token_addresses
+        }
+
+
+def _get_price_from_source(
+    source: str, token_address: str, block: int, blockchain: str, cancelled: threading.Event | None = None
+):
     """Get the price from the selected source.
-    Used by the get_price function, it helps with the logic of choosing the source.
+    Used by the get_price function, it helps with the logic of choosing the source. If the cancelled event is set, the
+    rate limited requests of CoinGecko and the explorer aren't sent and the price is None.
 
     Returns:
         float: price.
@@ -97,14 +346,12 @@ def _get_price_from_source(source: str, token_address: str, block: int, blockcha
             price = None
 
     elif source == "coingecko":
+        if cancelled is not None and cancelled.is_set():
+            return None
         unix_timestamp = ChainExplorer(blockchain).time_from_block(block)
-        price = CoinGecko.get_price(token_address, unix_timestamp, blockchain)
-
-        # In case there is the error for too many requests
-        while price[0] == 429:
-            sleep(1)
-            price = CoinGecko.get_price(token_address, unix_timestamp, blockchain)
-
-        price = price[1][1]
+        if cancelled is not None and cancelled.is_set():
+            return None
+        # Requests answered with a 429 (too many requests) are already retried by the CoinGecko rate limiter
+        price = CoinGecko.get_price(token_address, unix_timestamp, blockchain)[1][1]
 
     return price
@@ -5,12 +5,13 @@ from typing import List
 
 from defabipedia import Chain
 from defabipedia.tokens import EthereumTokenAddr
-from karpatkit.cache import const_call
 from karpatkit.node import get_node
 from web3 import Web3
 from web3.exceptions import ContractLogicError
 
+from defyes.cache import const_call
 from defyes.functions import balance_of, get_contract, get_contract_proxy_abi, to_token_amount
+from defyes.prices.lending import get_assets_prices, publish_prices
 
 logger = logging.getLogger(__name__)
 
@@ -116,6 +117,42 @@ def get_reserves_tokens_balances(
     return balances
 
 
+def get_native_usd_price(block, blockchain, web3=None) -> Decimal:
+    if web3 is None:
+        web3 = get_node(blockchain)
+
+    chainlink_eth_usd_contract = get_contract(
+        CHAINLINK_NATIVE_USD[blockchain], blockchain, web3=web3, abi=ABI_CHAINLINK_ETH_USD
+    )
+    chainlink_eth_usd_decimals = const_call(chainlink_eth_usd_contract.functions.decimals())
+    return chainlink_eth_usd_contract.functions.latestAnswer().call(block_identifier=block) / Decimal(
+        10**chainlink_eth_usd_decimals
+    )
+
+
+def get_oracle_prices(block, blockchain, web3=None, assets=None, eth_usd_price=None) -> dict:
+    """
+    Return the USD price of every reserve (or just of the assets) by checksum address, read from the Aave price oracle
+    with a single getAssetsPrices call. The prices are published to the price cache for get_price and get_prices.
+    """
+    if web3 is None:
+        web3 = get_node(blockchain)
+
+    if assets is None:
+        pdp_contract = get_contract(PROTOCOL_DATA_PROVIDER[blockchain], blockchain, web3=web3, abi=ABI_PDP)
+        assets = get_reserves_tokens(pdp_contract, block)
+    if eth_usd_price is None:
+        eth_usd_price = get_native_usd_price(block, blockchain, web3=web3)
+
+    lpapr_contract = get_contract(POOL_ADDRESSES_PROVIDER[blockchain], blockchain, web3=web3, abi=ABI_LPAPR)
+    price_oracle_address = lpapr_contract.functions.getPriceOracle().call(block_identifier=block)
+    raw_prices = get_assets_prices(price_oracle_address, assets, block, blockchain, web3=web3)
+
+    prices = {asset: raw_price / Decimal(10**18) * eth_usd_price for asset, raw_price in raw_prices.items()}
+    publish_prices(prices, block, blockchain, "aave_v2")
+    return prices
+
+
 def get_data(wallet, block, blockchain, web3=None, decimals=True):
     aave_data = {}
     collaterals = []
@@ -132,27 +169,18 @@ def get_data(wallet, block, blockchain, web3=None, decimals=True):
     lending_pool_address = const_call(lpapr_contract.functions.getLendingPool())
     lending_pool_contract = get_contract(lending_pool_address, blockchain, web3=web3, abi=ABI_LENDING_POOL)
 
-    chainlink_eth_usd_contract = get_contract(
-        CHAINLINK_NATIVE_USD[blockchain], blockchain, web3=web3, abi=ABI_CHAINLINK_ETH_USD
-    )
-    chainlink_eth_usd_decimals = const_call(chainlink_eth_usd_contract.functions.decimals())
-    eth_usd_price = chainlink_eth_usd_contract.functions.latestAnswer().call(block_identifier=block) / Decimal(
-        10**chainlink_eth_usd_decimals
-    )
+    eth_usd_price = get_native_usd_price(block, blockchain, web3=web3)
     balances = get_reserves_tokens_balances(web3, wallet, block, blockchain, decimals=decimals)
 
     if balances:
-        price_oracle_address = lpapr_contract.functions.getPriceOracle().call(block_identifier=block)
-        price_oracle_contract = get_contract(price_oracle_address, blockchain, web3=web3, abi=ABI_PRICE_ORACLE)
+        prices = get_oracle_prices(
+            block, blockchain, web3=web3, assets=[balance[0] for balance in balances], eth_usd_price=eth_usd_price
+        )
 
         for balance in balances:
             asset = {"token_address": balance[0], "token_amount": abs(balance[1])}
 
-            asset["token_price_usd"] = (
-                price_oracle_contract.functions.getAssetPrice(asset["token_address"]).call(block_identifier=block)
-                / Decimal(10**18)
-                * eth_usd_price
-            )
+            asset["token_price_usd"] = prices[Web3.to_checksum_address(asset["token_address"])]
 
             if balance[1] < 0:
                 debts.append(asset)
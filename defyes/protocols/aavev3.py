@@ -3,12 +3,13 @@ from decimal import Decimal
 from typing import List
 
 from defabipedia import Chain
-from karpatkit.cache import const_call
 from karpatkit.node import get_node
 from web3 import Web3
 from web3.exceptions import ContractLogicError
 
+from defyes.cache import const_call
 from defyes.functions import get_contract, last_block, to_token_amount
+from defyes.prices.lending import get_assets_prices, publish_prices
 
 logger = logging.getLogger(__name__)
 
@@ -234,6 +235,31 @@ def get_reserves_tokens_balances(
     return balances
 
 
+def get_oracle_prices(block, blockchain, web3=None, assets=None) -> dict:
+    """
+    Return the USD price of every reserve (or just of the assets) by checksum address, read from the Aave v3 price
+    oracle with a single getAssetsPrices call. The prices are published to the price cache for get_price and get_prices.
+    """
+    if web3 is None:
+        web3 = get_node(blockchain)
+
+    if assets is None:
+        pdp_contract = get_contract(PROTOCOL_DATA_PROVIDER[blockchain], blockchain, web3=web3, abi=ABI_PDP)
+        assets = [token[1] for token in pdp_contract.functions.getAllReservesTokens().call(block_identifier=block)]
+
+    pool_addresses_provider_contract = get_contract(
+        POOL_ADDRESSES_PROVIDER[blockchain], blockchain, web3=web3, abi=ABI_LPAPR
+    )
+    price_oracle_address = pool_addresses_provider_contract.functions.getPriceOracle().call(block_identifier=block)
+    price_oracle_contract = get_contract(price_oracle_address, blockchain, web3=web3, abi=ABI_PRICE_ORACLE)
+    currency_unit = const_call(price_oracle_contract.functions.BASE_CURRENCY_UNIT())
+    raw_prices = get_assets_prices(price_oracle_address, assets, block, blockchain, web3=web3)
+
+    prices = {asset: raw_price / Decimal(currency_unit) for asset, raw_price in raw_prices.items()}
+    publish_prices(prices, block, blockchain, "aave_v3")
+    return prices
+
+
 # TODO: This function should be removed and its functionality added as financial metrics in the underlying_all function
 def get_data(wallet, block, blockchain, web3=None, decimals=True):
     """
@@ -266,16 +292,12 @@ def get_data(wallet, block, blockchain, web3=None, decimals=True):
     data = underlying_all(wallet, block, blockchain, web3=web3, decimals=decimals)["positions"]
     underlying_tokens = list(data.keys())
 
-    price_oracle_address = pool_addresses_provider_contract.functions.getPriceOracle().call(block_identifier=block)
-    price_oracle_contract = get_contract(price_oracle_address, blockchain, web3=web3, abi=ABI_PRICE_ORACLE)
+    prices = get_oracle_prices(block, blockchain, web3=web3, assets=underlying_tokens)
 
     for element in underlying_tokens:
         asset = {"token_address": element, "token_amount": abs(data[element]["underlying"][0]["balance"])}
 
-        currency_unit = price_oracle_contract.functions.BASE_CURRENCY_UNIT().call(block_identifier=block)
-        asset["token_price_usd"] = price_oracle_contract.functions.getAssetPrice(asset["token_address"]).call(
-            block_identifier=block
-        ) / Decimal(currency_unit)
+        asset["token_price_usd"] = prices[Web3.to_checksum_address(element)]
 
         if data[element]["underlying"][0]["balance"] < 0:
             debts.append(asset)
@@ -14,11 +14,12 @@ from decimal import Decimal
 from typing import Dict, List
 
 from defabipedia.tokens import GnosisTokenAddr
-from karpatkit.cache import const_call
 from karpatkit.node import get_node
 from web3 import Web3
 
+from defyes.cache import const_call
 from defyes.functions import balance_of, get_contract, to_token_amount
+from defyes.prices.lending import get_assets_prices, publish_prices
 
 logger = logging.getLogger(__name__)
 
@@ -86,6 +87,41 @@ def get_reserves_tokens_balances(
     return balances
 
 
+def get_xdai_usd_price(block: int | str, blockchain: str, web3=None) -> Decimal:
+    if web3 is None:
+        web3 = get_node(blockchain)
+
+    chainlink_xdai_usd_contract = get_contract(CHAINLINK_XDAI_USD, blockchain, web3=web3, abi=ABI_CHAINLINK_XDAI_USD)
+    chainlink_xdai_usd_decimals = const_call(chainlink_xdai_usd_contract.functions.decimals())
+    xdai_usd_price = chainlink_xdai_usd_contract.functions.latestAnswer().call(block_identifier=block)
+    return Decimal(xdai_usd_price) / Decimal(10**chainlink_xdai_usd_decimals)
+
+
+def get_oracle_prices(
+    block: int | str, blockchain: str, web3=None, assets: List[str] | None = None, xdai_usd_price: Decimal = None
+) -> Dict:
+    """
+    Return the USD price of every reserve (or just of the assets) by checksum address, read from the Agave price oracle
+    with a single getAssetsPrices call. The prices are published to the price cache for get_price and get_prices.
+    """
+    if web3 is None:
+        web3 = get_node(blockchain)
+
+    if assets is None:
+        pdp_contract = get_contract(PDP_GNOSIS, blockchain, web3=web3, abi=ABI_PDP)
+        assets = get_reserves_tokens(pdp_contract, block)
+    if xdai_usd_price is None:
+        xdai_usd_price = get_xdai_usd_price(block, blockchain, web3=web3)
+
+    lpapr_contract = get_contract(LPAPR_GNOSIS, blockchain, web3=web3, abi=ABI_LPAPR)
+    price_oracle_address = lpapr_contract.functions.getPriceOracle().call(block_identifier=block)
+    raw_prices = get_assets_prices(price_oracle_address, assets, block, blockchain, web3=web3)
+
+    prices = {asset: Decimal(raw_price) / Decimal(10**18) * xdai_usd_price for asset, raw_price in raw_prices.items()}
+    publish_prices(prices, block, blockchain, "agave")
+    return prices
+
+
 def get_data(wallet: str, block: int | str, blockchain: str, web3=None, decimals: bool = True) -> Dict:
     agave_data = {}
     collaterals = []
@@ -101,24 +137,19 @@ def get_data(wallet: str, block: int | str, blockchain: str, web3=None, decimals
     lending_pool_address = const_call(lpapr_contract.functions.getLendingPool())
     lending_pool_contract = get_contract(lending_pool_address, blockchain, web3=web3, abi=ABI_LENDING_POOL)
 
-    chainlink_eth_usd_contract = get_contract(CHAINLINK_XDAI_USD, blockchain, web3=web3, abi=ABI_CHAINLINK_XDAI_USD)
-    chainlink_eth_usd_decimals = const_call(chainlink_eth_usd_contract.functions.decimals())
-    xdai_usd_price = chainlink_eth_usd_contract.functions.latestAnswer().call(block_identifier=block)
-    xdai_usd_price = Decimal(xdai_usd_price) / Decimal(10**chainlink_eth_usd_decimals)
+    xdai_usd_price = get_xdai_usd_price(block, blockchain, web3=web3)
 
     balances = get_reserves_tokens_balances(web3, wallet, block, blockchain, decimals=decimals)
 
     if balances:
-        price_oracle_address = lpapr_contract.functions.getPriceOracle().call(block_identifier=block)
-        price_oracle_contract = get_contract(price_oracle_address, blockchain, web3=web3, abi=ABI_PRICE_ORACLE)
+        prices = get_oracle_prices(
+            block, blockchain, web3=web3, assets=[balance[0] for balance in balances], xdai_usd_price=xdai_usd_price
+        )
 
         for balance in balances:
             asset = {"token_address": balance[0], "token_amount": abs(balance[1])}
 
-            token_price_usd = price_oracle_contract.functions.getAssetPrice(asset["token_address"]).call(
-                block_identifier=block
-            )
-            asset["token_price_usd"] = Decimal(token_price_usd) / Decimal(10**18) * xdai_usd_price
+            asset["token_price_usd"] = prices[Web3.to_checksum_address(asset["token_address"])]
 
             if balance[1] < 0:
                 debts.append(asset)
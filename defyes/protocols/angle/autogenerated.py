@@ -11,11 +11,11 @@ class Oracle(Oracle):
     ...
 """
 
-from karpatkit.cache import const_call
-from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.generator import load_abi
+from defyes.cache import const_call
+from defyes.functions import get_contract
+from defyes.generator import load_abi_json
 
 
 class Oracle:
@@ -35,8 +35,7 @@ class Oracle:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "oracle.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "oracle.json"))
 
     @property
     def description(self) -> str:
@@ -67,8 +66,7 @@ class Treasury:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "treasury.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "treasury.json"))
 
     @property
     def stablecoin(self) -> str:
@@ -98,8 +96,7 @@ class VaultManager:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "vault_manager.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "vault_manager.json"))
 
     def balance_of(self, owner: str) -> int:
         return self.contract.functions.balanceOf(owner).call(block_identifier=self.block)
@@ -166,8 +163,7 @@ class Steur:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "steur.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "steur.json"))
 
     @property
     def access_control_manager(self) -> str:
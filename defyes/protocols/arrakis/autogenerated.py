@@ -11,10 +11,10 @@ class ArrakisV2(ArrakisV2):
     ...
 """
 
-from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.generator import load_abi
+from defyes.functions import get_contract
+from defyes.generator import load_abi_json
 
 
 class ArrakisV2:
@@ -34,8 +34,7 @@ class ArrakisV2:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "arrakis_v2.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "arrakis_v2.json"))
 
     def allowance(self, owner: str, spender: str) -> int:
         return self.contract.functions.allowance(owner, spender).call(block_identifier=self.block)
@@ -133,8 +132,7 @@ class ArrakisHelperV2:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "arrakis_helper_v2.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "arrakis_helper_v2.json"))
 
     @property
     def factory(self) -> str:
@@ -4,11 +4,11 @@ from pathlib import Path
 
 from defabipedia import Chain
 from defabipedia.tokens import EthereumTokenAddr
-from karpatkit.cache import const_call
 from karpatkit.helpers import call_contract_method
 from karpatkit.node import get_node
 from web3 import Web3
 
+from defyes.cache import const_call
 from defyes.functions import get_contract, get_decimals, get_logs_web3, last_block, to_token_amount
 
 from .. import balancer
@@ -1,7 +1,11 @@
+import logging
+import threading
+import time
+from bisect import bisect_right
 from collections import defaultdict
 from contextlib import suppress
 from decimal import Decimal
-from functools import cached_property
+from functools import cache, cached_property
 
 from defabipedia import Chain
 from defabipedia.tokens import EthereumTokenAddr
@@ -12,9 +16,14 @@ from karpatkit.node import get_node
 from web3 import Web3
 from web3.exceptions import BadFunctionCallOutput, ContractLogicError
 
+from defyes.cache import LRUCache, caches
 from defyes.functions import ensure_a_block_number, get_decimals, get_logs_web3, to_token_amount
 from defyes.lazytime import Duration, Time
+from defyes.logstore import LogStore
+from defyes.multicall import Multicall
 from defyes.prices.prices import get_price
+from defyes.snapshot import Snapshot, get_snapshot
+from defyes.store import get_store
 from defyes.types import Addr, Token, TokenAmount
 
 from .autogenerated import (
@@ -30,6 +39,8 @@ from .autogenerated import (
     VebalFeeDistributor,
 )
 
+logger = logging.getLogger(__name__)
+
 # First block in every blockchain
 START_BLOCK = {
     "ethereumv1": 14457664,
@@ -39,6 +50,36 @@ START_BLOCK = {
     Chain.GNOSIS: 27088528,
 }
 
+# Supply getters of the pools, in the order they are probed
+SUPPLY_GETTERS = ("get_actual_supply", "get_virtual_supply", "total_supply")
+SUPPLY_FUNCTIONS = {
+    "get_actual_supply": "getActualSupply",
+    "get_virtual_supply": "getVirtualSupply",
+    "total_supply": "totalSupply",
+}
+
+# Max number of blocks whose pool graphs are kept out of a Snapshot
+POOL_GRAPHS_CACHE_SIZE = 64
+
+# Max number of pools whose swap fee timelines are kept in memory
+SWAP_FEE_TIMELINES_CACHE_SIZE = 256
+
+SWAP_FEE_PERCENTAGE_CHANGED_TOPIC = Web3.keccak(text="SwapFeePercentageChanged(uint256)").hex()
+# Emitted by the pools whose fee moves gradually along time (managed and liquidity bootstrapping pools)
+GRADUAL_SWAP_FEE_UPDATE_SCHEDULED_TOPIC = Web3.keccak(
+    text="GradualSwapFeeUpdateScheduled(uint256,uint256,uint256,uint256)"
+).hex()
+GAUGE_CREATED_TOPIC = Web3.keccak(text="GaugeCreated(address)").hex()
+# Min seconds between two lookups of the chain head to extend a gauge index
+GAUGE_INDEX_REFRESH_INTERVAL = 60
+
+# Selectors of the gauge factories create functions, whose first argument is the pool: create(address) in the child
+# chain factories and create(address,uint256) in the mainnet one.
+GAUGE_FACTORY_CREATE_SELECTORS = {
+    Web3.keccak(text="create(address)")[:4],
+    Web3.keccak(text="create(address,uint256)")[:4],
+}
+
 
 class Vault(Vault):
     ADDR: str = "0xBA12222222228d8Ba445958a75a0704d566BF2C8"
@@ -103,14 +144,30 @@ class LiquidityPool(LiquidityPool):
         with suppress(ContractLogicError), suppress_error_codes():
             return self.get_bpt_index
 
+    @property
+    def supply_getter(self) -> str | None:
+        """The supply getter supported by the pool (one of SUPPLY_GETTERS), once it's known."""
+        return get_store("balancer").get(("supply_getter", str(self.blockchain), self.address))
+
+    @supply_getter.setter
+    def supply_getter(self, getter: str) -> None:
+        get_store("balancer")["supply_getter", str(self.blockchain), self.address] = getter
+
     @cached_property
     def supply(self) -> int:
         """
-        Return the first valid attribure: get_actual_supply or get_virtual_supply, otherwise total_supply.
+        Return the first valid attribure: get_actual_supply or get_virtual_supply, otherwise total_supply. The getter
+        found is remembered for the pool, so the following blocks don't probe the reverting ones.
         """
-        for attr in ("get_actual_supply", "get_virtual_supply"):
+        getter = self.supply_getter
+        if getter is not None:
+            return getattr(self, getter)
+        for attr in SUPPLY_GETTERS[:-1]:
             with suppress(ContractLogicError), suppress_error_codes():
-                return getattr(self, attr)
+                supply = getattr(self, attr)
+                self.supply_getter = attr
+                return supply
+        self.supply_getter = "total_supply"
         return self.total_supply
 
     @cached_property
@@ -159,6 +216,10 @@ class LiquidityPool(LiquidityPool):
     def swap_fee_percentage_for(self, block: int | str) -> int:
         return self.contract.functions.getSwapFeePercentage().call(block_identifier=block)
 
+    @property
+    def swap_fee_timeline(self) -> "SwapFeeTimeline":
+        return get_swap_fee_timeline(self.blockchain, self.address, self.contract.w3)
+
     def swap_fees(self, vault_address: str, block_start: int, decimals: bool = True) -> list[dict]:
         node = self.contract.w3
         pool_id = "0x" + self.poolid.hex()
@@ -166,20 +227,24 @@ class LiquidityPool(LiquidityPool):
 
         if block_start < START_BLOCK[self.blockchain]:
             block_start = START_BLOCK[self.blockchain]
+        block_end = ensure_a_block_number(self.block, self.blockchain)
 
         swap_logs = get_logs_web3(
             blockchain=self.blockchain,
             address=vault_address,
             block_start=block_start,
-            block_end=self.block,
+            block_end=block_end,
             topics=[swap_event, pool_id],
             web3=node,
         )
 
+        swap_fee_timeline = self.swap_fee_timeline
+        swap_fee_timeline.load(block_start, block_end)
+
         swaps = []
         for swap_log in swap_logs:
             token_in = Web3.to_checksum_address(f"0x{swap_log['topics'][2].hex()[-40:]}")
-            swap_fee = Decimal(self.swap_fee_percentage_for(swap_log["blockNumber"]))
+            swap_fee = Decimal(swap_fee_timeline.fee_at(swap_log["blockNumber"]))
             swap_fee /= Decimal(10**self.decimals)
             swap_fee *= int(swap_log["data"].hex()[2:66], 16)
 
@@ -194,6 +259,222 @@ class LiquidityPool(LiquidityPool):
         return swaps
 
 
+class SwapFeeTimeline:
+    """
+    Swap fee percentage of a pool along time, built from the fee in force at the start of the loaded range (a single
+    getSwapFeePercentage call) and the SwapFeePercentageChanged logs of the pool after it. The logs are kept in the
+    persistent LogStore, so a pool is scanned just once, and the fee of any block is then looked up in memory.
+
+    The fee at a block is the one at the end of the block, which is what getSwapFeePercentage returns at that block.
+    The fee of the pools which change it without SwapFeePercentageChanged events (a GradualSwapFeeUpdateScheduled log
+    found, or a timeline disagreeing with getSwapFeePercentage at the end of the range) is read at every block instead.
+
+    The timelines are shared between threads (see `get_swap_fee_timeline`): the loads are serialized and the initial
+    fee, positions and fees are replaced together in a single tuple, so `fee_at` never sees them out of step.
+    """
+
+    def __init__(self, blockchain: str, pool_address: str, web3=None, log_store: LogStore = None):
+        if web3 is None:
+            web3 = get_node(blockchain)
+        self.blockchain = blockchain
+        self.pool_address = Web3.to_checksum_address(pool_address)
+        self.web3 = web3
+        self.log_store = log_store if log_store is not None else LogStore(blockchain, web3=web3)
+        # Block range whose fee changes are loaded (both ends included)
+        self.loaded: tuple[int, int] | None = None
+        # The fee at the start of the loaded range and, sorted by block, the (block, log index) positions of the fee
+        # changes and the fees set
+        self.changes: tuple[int | None, list[tuple[int, int]], list[int]] = (None, [], [])
+        # Whether the fee only changes through SwapFeePercentageChanged events
+        self.exact = True
+        self._lock = threading.Lock()
+
+    def read_fee(self, block: int) -> int:
+        contract = LiquidityPool(self.blockchain, block, self.pool_address).contract
+        return contract.functions.getSwapFeePercentage().call(block_identifier=block)
+
+    def load(self, block_start: int, block_end: int) -> None:
+        """Load the fee changes of the block range, extending the range already loaded."""
+        with self._lock:
+            initial_fee = self.changes[0]
+            if self.loaded is not None:
+                if self.loaded[0] <= block_start and block_end <= self.loaded[1]:
+                    return
+                block_end = max(block_end, self.loaded[1])
+                if block_start >= self.loaded[0]:
+                    block_start = self.loaded[0]
+                else:
+                    initial_fee = None
+
+            if initial_fee is None:
+                initial_fee = self.read_fee(block_start)
+
+            logs = self.log_store.get_logs(
+                self.pool_address,
+                [[SWAP_FEE_PERCENTAGE_CHANGED_TOPIC, GRADUAL_SWAP_FEE_UPDATE_SCHEDULED_TOPIC]],
+                block_start,
+                block_end,
+            )
+            changes = sorted(
+                ((log["blockNumber"], log["logIndex"]), int.from_bytes(log["data"][-32:], "big"))
+                for log in logs
+                if log["blockNumber"] > block_start
+                and Web3.to_hex(log["topics"][0]) == SWAP_FEE_PERCENTAGE_CHANGED_TOPIC
+            )
+            self.changes = initial_fee, [position for position, _ in changes], [fee for _, fee in changes]
+            # Set after the changes, so a reader within the new range always finds them
+            self.loaded = block_start, block_end
+
+            if self.exact:
+                gradual = len(changes) < len([log for log in logs if log["blockNumber"] > block_start])
+                if gradual or self.fee_at(block_end) != self.read_fee(block_end):
+                    self.exact = False
+                    logger.warning(
+                        f"The swap fee of the pool {self.pool_address} changes without SwapFeePercentageChanged "
+                        "events. It's read at every block."
+                    )
+        logger.debug(
+            f"{len(changes)} swap fee changes of the pool {self.pool_address} loaded ({block_start}-{block_end})."
+        )
+
+    def fee_at(self, block: int) -> int:
+        """Return the swap fee percentage (18 decimals) at the block, which must be within the loaded range."""
+        if self.loaded is None or not self.loaded[0] <= block <= self.loaded[1]:
+            raise ValueError(f"Block {block} out of the loaded range {self.loaded} of the pool {self.pool_address}.")
+        if not self.exact:
+            return self.read_fee(block)
+        initial_fee, positions, fees = self.changes
+        position = bisect_right(positions, (block, float("inf")))
+        return fees[position - 1] if position else initial_fee
+
+
+swap_fee_timelines = caches["balancer.swap_fee_timelines"] = LRUCache(SWAP_FEE_TIMELINES_CACHE_SIZE)
+
+
+def get_swap_fee_timeline(blockchain: str, pool_address: str, web3) -> SwapFeeTimeline:
+    key = (str(blockchain), Web3.to_checksum_address(pool_address), web3)
+    swap_fee_timeline = swap_fee_timelines.get(key)
+    if swap_fee_timeline is None:
+        swap_fee_timeline = SwapFeeTimeline(blockchain, pool_address, web3)
+        swap_fee_timelines.put(key, swap_fee_timeline)
+    return swap_fee_timeline
+
+
+class GaugeIndex:
+    """
+    LP -> gauges index of a gauge factory, built from its GaugeCreated logs, so the gauge of a pool is resolved with a
+    dictionary lookup.
+
+    The pool of every gauge is decoded from the `create(pool, ...)` input of the transaction which created it (or read
+    from the gauge `lp_token()` when the gauge was created through another contract) and kept in the "balancer" store,
+    while the logs are kept in the persistent LogStore, so every process just looks into the new blocks.
+
+    The index is extended with the new logs up to the confirmed head (the head minus the LogStore confirmations),
+    looking up the head at most once every `refresh_interval` seconds. The pools without a gauge in the index are
+    looked up in the logs of the blocks not indexed yet.
+    """
+
+    def __init__(
+        self,
+        blockchain: str,
+        factory: str,
+        start_block: int,
+        web3=None,
+        log_store: LogStore = None,
+        refresh_interval: float = GAUGE_INDEX_REFRESH_INTERVAL,
+    ):
+        if web3 is None:
+            web3 = get_node(blockchain)
+        self.blockchain = blockchain
+        self.factory = Web3.to_checksum_address(factory)
+        self.start_block = start_block
+        self.web3 = web3
+        self.log_store = log_store if log_store is not None else LogStore(blockchain, web3=web3)
+        self.store = get_store("balancer")
+        self.refresh_interval = refresh_interval
+        self.indexed_block = start_block - 1
+        self.refreshed_at: float | None = None
+        self._lock = threading.Lock()
+        # Gauge -> pool, of the gauges already looked up
+        self.pools: dict[str, str | None] = {}
+        # LP -> sorted (block, log index) positions of the GaugeCreated logs of its gauges and the gauges created
+        self.gauges: dict[str, tuple[list[tuple[int, int]], list[str]]] = {}
+
+    def gauge_pool(self, log, confirmed: bool) -> str | None:
+        """Return the pool of the gauge created by the log, which is persisted if the log is confirmed."""
+        gauge = Web3.to_checksum_address(log["topics"][1][-20:])
+        if gauge in self.pools:
+            return self.pools[gauge]
+        key = ("gauge_pool", str(self.blockchain), self.factory, gauge)
+        pool = self.store.get(key)
+        if pool is not None:
+            self.pools[gauge] = pool
+            return pool
+
+        tx = self.web3.eth.get_transaction(log["transactionHash"])
+        # For some endpoints tx["input"] is a string and for others is a bytes object
+        tx_input = Web3.to_bytes(hexstr=tx["input"]) if isinstance(tx["input"], str) else bytes(tx["input"])
+        if tx["to"] == self.factory and tx_input[:4] in GAUGE_FACTORY_CREATE_SELECTORS:
+            pool = Web3.to_checksum_address(tx_input[16:36])
+        else:
+            pool = None
+            with suppress(ContractLogicError, BadFunctionCallOutput), suppress_error_codes():
+                pool = Web3.to_checksum_address(Gauge(self.blockchain, log["blockNumber"], gauge).lp_token)
+        if confirmed:
+            # The gauges of the unconfirmed blocks are looked up again once they are indexed
+            if pool is not None:
+                self.store[key] = pool
+            self.pools[gauge] = pool
+        return pool
+
+    def refresh(self, block: int) -> None:
+        """Index the gauges created after the indexed block up to the block, which must be confirmed."""
+        with self._lock:
+            if block <= self.indexed_block:
+                return
+            logs = self.log_store.get_logs(self.factory, [GAUGE_CREATED_TOPIC], self.indexed_block + 1, block)
+            for log in logs:
+                pool = self.gauge_pool(log, confirmed=True)
+                if pool is None:
+                    continue
+                positions, pool_gauges = self.gauges.setdefault(pool, ([], []))
+                positions.append((log["blockNumber"], log["logIndex"]))
+                pool_gauges.append(Web3.to_checksum_address(log["topics"][1][-20:]))
+            self.indexed_block = block
+        logger.debug(f"Balancer gauge index of {self.factory} refreshed up to block {block}: {len(logs)} new gauges.")
+
+    def refresh_to_head(self) -> None:
+        """Index up to the confirmed head, unless the head was already looked up in the last refresh_interval."""
+        now = time.monotonic()
+        if self.refreshed_at is not None and now - self.refreshed_at < self.refresh_interval:
+            return
+        self.refreshed_at = now
+        self.refresh(self.web3.eth.block_number - self.log_store.confirmations)
+
+    def get_gauge(self, lp_address: str, block: int) -> str | None:
+        """Return the first gauge created for the pool up to the block, or None if there isn't any."""
+        lp_address = Web3.to_checksum_address(lp_address)
+        if block > self.indexed_block:
+            self.refresh_to_head()
+        if lp_address in self.gauges:
+            positions, gauges = self.gauges[lp_address]
+            return gauges[0] if positions[0][0] <= block else None
+        if block <= self.indexed_block:
+            return None
+
+        # The unconfirmed blocks aren't indexed
+        indexed_block = self.indexed_block
+        for log in self.log_store.get_logs(self.factory, [GAUGE_CREATED_TOPIC], indexed_block + 1, block):
+            if self.gauge_pool(log, confirmed=False) == lp_address:
+                return Web3.to_checksum_address(log["topics"][1][-20:])
+        return None
+
+
+@cache
+def get_gauge_index(blockchain: str, factory: str, start_block: int, web3) -> GaugeIndex:
+    return GaugeIndex(blockchain, factory, start_block, web3)
+
+
 def get_gauge_addresses(blockchain: str, block: int | str, lp_address: str) -> list:
     ADDRS: dict[str, str] = {
         "ethereum": [
@@ -231,25 +512,9 @@ def get_gauge_addresses(blockchain: str, block: int | str, lp_address: str) -> l
                 if gauge_address != Address.ZERO:
                     gauge_addresses.append(gauge_address)
             else:
-                gauge_created_event = Web3.keccak(text="GaugeCreated(address)").hex()
-                logs = get_logs_web3(
-                    address=gauge_factory.address,
-                    blockchain=blockchain,
-                    block_start=blk,
-                    block_end=block_id,
-                    topics=[gauge_created_event],
-                    web3=gauge_factory.contract.w3,
-                )
-                for log in logs:
-                    tx = gauge_factory.contract.w3.eth.get_transaction(log["transactionHash"])
-                    # For some endpoints tx["input"] is a string and for others is a bytes object
-                    tx_input = tx["input"].hex() if isinstance(tx["input"], bytes) else tx["input"]
-                    if lp_address[2 : len(lp_address)].lower() in tx_input:
-                        gauge_address = Web3.to_checksum_address(f"0x{log['topics'][1].hex()[-40:]}")
-                        break
-                if gauge_address == Address.ZERO:
-                    continue
-                else:
+                gauge_index = get_gauge_index(blockchain, gauge_factory.address, blk, gauge_factory.contract.w3)
+                gauge_address = gauge_index.get_gauge(lp_address, block_id)
+                if gauge_address is not None:
                     gauge_addresses.append(gauge_address)
 
     return gauge_addresses
@@ -384,36 +649,184 @@ def get_vebal_rewards(wallet: str, blockchain: str, block: str | int, decimals:
     return rewards
 
 
-def unwrap(blockchain: str, lp_address: str, amount: Decimal, block: int | str, decimals: bool = True) -> dict:
-    block_id = ensure_a_block_number(block, blockchain)
-    lp = LiquidityPool(blockchain, block, lp_address)
-    if lp_address == EthereumTokenAddr.ABPT:
-        pool_tokens = Abpt(blockchain, block).get_pool_data()
-    else:
-        pool_tokens = Vault(blockchain, block).get_pool_data(lp.poolid)
-    balances = {}
-    for n, (addr, balance) in enumerate(pool_tokens):
-        if n == lp.bpt_index:
-            continue
-
-        token = PoolToken(blockchain, block_id, addr)
-        if token.pool_id is not None:
-            pool_token_balance = lp.exit_balance(amount, balance) / Decimal(10**token.decimals if decimals else 1)
-            for token_addr, token_balance in unwrap(
-                blockchain, token.address, pool_token_balance, block_id, decimals
-            ).items():
+class PoolGraph:
+    """
+    Composition of the Balancer pools at a block. The tokens and balances, supply, BPT index and wrapped token rates of
+    every pool (and whether every pool token is a pool itself) are resolved once, when the pool is first reached, and
+    shared by every unwrap of the block, so nested pools (e.g. the linear pools of bb-a-USD) shared by many parent
+    pools or positions are read just once.
+    """
+
+    def __init__(self, blockchain: str, block: int):
+        self.blockchain = blockchain
+        self.block = block
+        self.pools: dict[str, LiquidityPool] = {}
+        self.tokens: dict[str, PoolToken] = {}
+        self.compositions: dict[str, list[tuple[str, int]]] = {}
+        self.balances: dict[tuple[str, bool], dict] = {}
+
+    def pool(self, lp_address: str) -> LiquidityPool:
+        lp_address = Web3.to_checksum_address(lp_address)
+        if lp_address not in self.pools:
+            self.pools[lp_address] = LiquidityPool(self.blockchain, self.block, lp_address)
+        return self.pools[lp_address]
+
+    def token(self, address: str) -> PoolToken:
+        address = Web3.to_checksum_address(address)
+        if address not in self.tokens:
+            self.tokens[address] = PoolToken(self.blockchain, self.block, address)
+        return self.tokens[address]
+
+    def pool_tokens(self, lp_address: str) -> list[tuple[str, int]]:
+        """Return the (token, balance) pairs of the pool."""
+        lp_address = Web3.to_checksum_address(lp_address)
+        if lp_address not in self.compositions:
+            if lp_address == EthereumTokenAddr.ABPT:
+                self.compositions[lp_address] = Abpt(self.blockchain, self.block).get_pool_data()
+            else:
+                self.compositions[lp_address] = Vault(self.blockchain, self.block).get_pool_data(
+                    self.pool(lp_address).poolid
+                )
+        return self.compositions[lp_address]
+
+    def load(self, lp_addresses: list[str]) -> None:
+        """
+        Resolve the pools, and the pools nested in them, with a few Multicalls per nesting level: the pool state
+        (pool id, BPT index, supply, wrapped token and rate), then the Vault tokens and balances, and then which of the
+        tokens are pools themselves. Pool ids are accepted too, since their first 20 bytes are the pool address.
+        """
+        pending = {
+            Web3.to_checksum_address(addr[:20] if isinstance(addr, bytes) else addr[:42]) for addr in lp_addresses
+        }
+        while pending:
+            pools = sorted(lp for lp in pending if lp not in self.compositions and lp != EthereumTokenAddr.ABPT)
+            if not pools:
+                break
+            pending = self._load_pools(pools)
+
+    def _load_pools(self, lp_addresses: list[str]) -> set[str]:
+        """Load the pools and return the addresses of the pools among their tokens."""
+        web3 = self.pool(lp_addresses[0]).contract.w3
+
+        with Multicall(self.blockchain, self.block, web3=web3) as multicall:
+            calls = {}
+            for lp_address in lp_addresses:
+                lp = self.pool(lp_address)
+                functions = lp.contract.functions
+                supply_getters = [lp.supply_getter] if lp.supply_getter else SUPPLY_GETTERS
+                calls[lp_address] = (
+                    {
+                        "poolid": multicall.add(functions.getPoolId()),
+                        "bpt_index": multicall.add(functions.getBptIndex()),
+                        "main_token": multicall.add(functions.getMainToken()),
+                        "wrapped_token": multicall.add(functions.getWrappedToken()),
+                        "wrapped_token_rate": multicall.add(functions.getWrappedTokenRate()),
+                    },
+                    [
+                        (getter, multicall.add(getattr(functions, SUPPLY_FUNCTIONS[getter])()))
+                        for getter in supply_getters
+                    ],
+                )
+
+        for lp_address, (pending_calls, supply_calls) in calls.items():
+            lp = self.pool(lp_address)
+            for name, pending_call in pending_calls.items():
+                if pending_call.success:
+                    lp.__dict__[name] = pending_call.result()
+                elif name != "poolid":
+                    lp.__dict__[name] = None
+            for getter, pending_call in supply_calls:
+                if pending_call.success:
+                    if lp.supply_getter != getter:
+                        lp.supply_getter = getter
+                    lp.__dict__["supply"] = pending_call.result()
+                    break
+
+        vault = Vault(self.blockchain, self.block)
+        with Multicall(self.blockchain, self.block, web3=web3) as multicall:
+            pool_tokens = {
+                lp_address: multicall.add(vault.contract.functions.getPoolTokens(self.pool(lp_address).poolid))
+                for lp_address in lp_addresses
+            }
+        for lp_address, pending_call in pool_tokens.items():
+            with suppress(ContractLogicError, BadFunctionCallOutput):
+                tokens, balances, _ = pending_call.result()
+                self.compositions[lp_address] = list(zip(tokens, balances))
+
+        with Multicall(self.blockchain, self.block, web3=web3) as multicall:
+            token_pool_ids = {}
+            for lp_address in lp_addresses:
+                for addr, _ in self.compositions.get(lp_address, []):
+                    addr = Web3.to_checksum_address(addr)
+                    if addr != lp_address and addr not in self.tokens and addr not in token_pool_ids:
+                        token_pool_ids[addr] = multicall.add(self.token(addr).contract.functions.getPoolId())
+        for addr, pending_call in token_pool_ids.items():
+            pool_id = None
+            with suppress(ContractLogicError, BadFunctionCallOutput):
+                pool_id = pending_call.result()
+            self.token(addr).__dict__["pool_id"] = pool_id
+
+        nested_pools = {
+            Web3.to_checksum_address(addr)
+            for lp_address in lp_addresses
+            for addr, _ in self.compositions.get(lp_address, [])
+            if Web3.to_checksum_address(addr) != lp_address and self.token(addr).pool_id is not None
+        }
+
+        logger.debug(f"{len(lp_addresses)} Balancer pools loaded at block {self.block}.")
+        return nested_pools
+
+    def unwrap(self, lp_address: str, amount: Decimal, decimals: bool = True) -> dict:
+        lp = self.pool(lp_address)
+        balances = {}
+        for n, (addr, balance) in enumerate(self.pool_tokens(lp_address)):
+            if n == lp.bpt_index:
+                continue
+
+            token = self.token(addr)
+            if token.pool_id is not None:
+                pool_token_balance = lp.exit_balance(amount, balance) / Decimal(10**token.decimals if decimals else 1)
+                for token_addr, token_balance in self.unwrap(token.address, pool_token_balance, decimals).items():
+                    balances[token_addr] = balances.get(token_addr, 0) + token_balance
+            else:
+                token_addr, token_balance = lp.calc_amount(token, amount, balance, decimals)
                 balances[token_addr] = balances.get(token_addr, 0) + token_balance
-        else:
-            token_addr, token_balance = lp.calc_amount(token, amount, balance, decimals)
-            balances[token_addr] = balances.get(token_addr, 0) + token_balance
-    return balances
+        return balances
+
+    def pool_balances(self, lp_address: str, decimals: bool = True) -> dict:
+        key = (Web3.to_checksum_address(lp_address), decimals)
+        if key not in self.balances:
+            lp = self.pool(lp_address)
+            lp_amount = lp.supply / Decimal(10**lp.decimals if decimals else 1)
+            self.balances[key] = self.unwrap(lp_address, lp_amount, decimals)
+        return dict(self.balances[key])
+
+
+pool_graphs = caches["balancer.pool_graphs"] = LRUCache(POOL_GRAPHS_CACHE_SIZE)
+
+
+def get_pool_graph(blockchain: str, block: int | str) -> PoolGraph:
+    """Return the PoolGraph of the block, shared by the following calls at the same block (within a Snapshot, by the
+    calls of the snapshot)."""
+    block = ensure_a_block_number(block, blockchain)
+    snapshot = get_snapshot(blockchain, block)
+    if snapshot is not None:
+        return snapshot.memoize("balancer.PoolGraph", PoolGraph, blockchain, block)
+
+    key = (blockchain, block)
+    graph = pool_graphs.get(key)
+    if graph is None:
+        graph = PoolGraph(blockchain, block)
+        pool_graphs.put(key, graph)
+    return graph
+
+
+def unwrap(blockchain: str, lp_address: str, amount: Decimal, block: int | str, decimals: bool = True) -> dict:
+    return get_pool_graph(blockchain, block).unwrap(lp_address, amount, decimals)
 
 
 def pool_balances(blockchain: str, lp_address: str, block: int | str, decimals: bool = True) -> dict:
-    block_id = ensure_a_block_number(block, blockchain)
-    lp = LiquidityPool(blockchain, block, lp_address)
-    lp_amount = lp.supply / Decimal(10**lp.decimals if decimals else 1)
-    return unwrap(blockchain, lp_address, lp_amount, block_id, decimals)
+    return get_pool_graph(blockchain, block).pool_balances(lp_address, decimals)
 
 
 class LPPositions:
@@ -422,7 +835,7 @@ class LPPositions:
         self.block = block
         self.address = Addr(Web3.to_checksum_address(address))
         self.gauge_addrs = get_gauge_addresses(blockchain, block, self.address)
-        self.lp = LiquidityPool(blockchain, block, self.address)
+        self.lp = get_pool_graph(blockchain, block).pool(self.address)
 
     def holdings(self, wallet: str, decimals: bool) -> tuple[dict, dict]:
         pool_fractions = defaultdict(list)
@@ -470,6 +883,28 @@ class LPPositions:
 
         return rewards
 
+    def wallet_calls(self, wallets: list[str]) -> list:
+        """Return the contract functions of the per-wallet reads of holdings(), to be prefetched for many wallets."""
+        calls = [self.lp.contract.functions.balanceOf(wallet) for wallet in wallets]
+        for gauge_addr in self.gauge_addrs:
+            if gauge_addr != Address.ZERO:
+                gauge = Gauge(self.blockchain, self.block, gauge_addr)
+                calls += [gauge.contract.functions.balanceOf(wallet) for wallet in wallets]
+        if self.blockchain == Chain.ETHEREUM:
+            vebal = Vebal(self.blockchain, self.block)
+            if self.address == vebal.token:
+                calls += [vebal.contract.functions.locked(wallet) for wallet in wallets]
+        return calls
+
+
+def lp_positions(blockchain: str, lp_address: str, block: int) -> LPPositions:
+    """Return the LPPositions of the pool, built once and shared by every wallet inside an active Snapshot."""
+    snapshot = get_snapshot(blockchain, block)
+    if snapshot is None:
+        return LPPositions(blockchain, lp_address, block)
+    key = ("balancer.LPPositions", Web3.to_checksum_address(lp_address))
+    return snapshot.memoize(key, LPPositions, blockchain, lp_address, block)
+
 
 def get_protocol_data_for(
     blockchain: str,
@@ -494,9 +929,10 @@ def get_protocol_data_for(
 
     if isinstance(lptoken_address, str):
         lptoken_address = [lptoken_address]
+    get_pool_graph(blockchain, block_id).load(lptoken_address)
 
     for lp_address in lptoken_address:
-        lp = LPPositions(blockchain, lp_address, block_id)
+        lp = lp_positions(blockchain, lp_address, block_id)
         positions = {}
 
         # holdings
@@ -554,6 +990,39 @@ def get_protocol_data_for(
     return ret
 
 
+def get_protocol_data_for_wallets(
+    blockchain: str,
+    wallets: list[str],
+    lptoken_address: str | list,
+    block: int | str = "latest",
+    reward: bool = False,
+    decimals: bool = True,
+    aura_staked: Decimal = None,
+) -> dict[str, dict]:
+    """
+    Batch version of get_protocol_data_for. The pool state (gauges, supply, balances...) is read once per pool and the
+    LP, gauge and veBAL balances of every wallet are fetched in a single Multicall.
+
+    Returns:
+        dict[str, dict]: The data of every wallet, by wallet address.
+    """
+    wallets = [Addr(Web3.to_checksum_address(wallet)) for wallet in wallets]
+    if isinstance(lptoken_address, str):
+        lptoken_address = [lptoken_address]
+
+    with Snapshot(blockchain, block) as snapshot:
+        calls = []
+        for lp_address in lptoken_address:
+            calls += lp_positions(blockchain, lp_address, snapshot.block).wallet_calls(wallets)
+        snapshot.prefetch(calls)
+        return {
+            wallet: get_protocol_data_for(
+                blockchain, wallet, lptoken_address, snapshot.block, reward, decimals, aura_staked
+            )
+            for wallet in wallets
+        }
+
+
 def get_swap_fees_apr(
     lptoken_address: str, blockchain: str, block: int | str = "latest", days: int = 1, apy: bool = False
 ) -> Decimal:
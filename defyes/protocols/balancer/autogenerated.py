@@ -11,11 +11,11 @@ class Gauge(Gauge):
     ...
 """
 
-from karpatkit.cache import const_call
-from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.generator import load_abi
+from defyes.cache import const_call
+from defyes.functions import get_contract
+from defyes.generator import load_abi_json
 
 
 class Gauge:
@@ -35,8 +35,7 @@ class Gauge:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "gauge.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "gauge.json"))
 
     def claimable_tokens(self, addr: str) -> int:
         return self.contract.functions.claimable_tokens(addr).call(block_identifier=self.block)
@@ -175,8 +174,7 @@ class GaugeFactory:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "gauge_factory.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "gauge_factory.json"))
 
     @property
     def get_gauge_implementation(self) -> str:
@@ -206,8 +204,7 @@ class GaugeRewardHelper:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "gauge_reward_helper.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "gauge_reward_helper.json"))
 
 
 class LiquidityPool:
@@ -227,8 +224,7 @@ class LiquidityPool:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "liquidity_pool.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "liquidity_pool.json"))
 
     @property
     def get_pool_id(self) -> bytes:
@@ -319,8 +315,7 @@ class PoolToken:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "pool_token.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "pool_token.json"))
 
     @property
     def decimals(self) -> int:
@@ -375,8 +370,7 @@ class Vault:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "vault.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "vault.json"))
 
     @property
     def weth(self) -> str:
@@ -471,8 +465,7 @@ class Vebal:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "vebal.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "vebal.json"))
 
     @property
     def token(self) -> str:
@@ -499,8 +492,9 @@ class VebalFeeDistributor:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "vebal_fee_distributor.json"))
+        self.contract = get_contract(
+            self.address, blockchain, abi=load_abi_json(__file__, "vebal_fee_distributor.json")
+        )
 
     def claim_tokens(self, user: str, tokens: list[str]) -> list[int]:
         return self.contract.functions.claimTokens(user, tokens).call(block_identifier=self.block)
@@ -523,8 +517,7 @@ class Abpt:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "abpt.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "abpt.json"))
 
     @property
     def decimals(self) -> int:
@@ -657,8 +650,7 @@ class Bpool:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "bpool.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "bpool.json"))
 
     @property
     def bone(self) -> int:
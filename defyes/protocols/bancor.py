@@ -1,7 +1,7 @@
-from karpatkit.cache import const_call
 from karpatkit.node import get_node
 from web3 import Web3
 
+from defyes.cache import const_call
 from defyes.functions import get_contract, to_token_amount
 
 # Contracts for calling liquidity pools and underlying tokens
@@ -11,10 +11,10 @@ class LiquidityPool(LiquidityPool):
     ...
 """
 
-from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.generator import load_abi
+from defyes.functions import get_contract
+from defyes.generator import load_abi_json
 
 
 class LiquidityPool:
@@ -34,8 +34,7 @@ class LiquidityPool:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "liquidity_pool.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "liquidity_pool.json"))
 
     @property
     def asset(self) -> str:
@@ -169,8 +168,7 @@ class PoolManager:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "pool_manager.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "pool_manager.json"))
 
     def currency_address_to_id(self, arg0: str) -> int:
         """
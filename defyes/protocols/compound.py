@@ -7,11 +7,11 @@ from typing import Dict, List, Tuple
 
 from defabipedia import Chain
 from defabipedia.tokens import EthereumTokenAddr
-from karpatkit.cache import const_call
 from karpatkit.constants import Address
 from karpatkit.node import get_node
 from web3 import Web3
 
+from defyes.cache import const_call
 from defyes.functions import balance_of, get_contract, get_decimals, to_token_amount
 from defyes.prices import prices
 
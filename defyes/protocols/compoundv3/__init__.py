@@ -6,6 +6,9 @@ from defabipedia.tokens import EthereumTokenAddr
 from web3 import Web3
 
 from defyes.functions import ensure_a_block_number, to_token_amount
+from defyes.prices import Chainlink
+from defyes.prices.lending import get_comet_prices, publish_prices
+from defyes.snapshot import Snapshot
 from defyes.types import Token, TokenAmount
 
 from .autogenerated import Comet, CometRewards
@@ -16,6 +19,9 @@ COMETS = {
     "ethereum": [EthereumTokenAddr.cUSDCv3, EthereumTokenAddr.cWETHv3],
 }
 
+# Comets whose price feeds are quoted in the native token instead of USD.
+NATIVE_QUOTED_COMETS = [EthereumTokenAddr.cWETHv3]
+
 
 class CometRewards(CometRewards):
     default_addresses: dict[str, str] = {
@@ -48,6 +54,26 @@ class Comet(Comet):
         return {"borrow_apr": borrow_apr, "supply_apr": supply_apr}
 
 
+def get_oracle_prices(comet_address: str, block: int | str, blockchain: str = Chain.ETHEREUM) -> dict[str, Decimal]:
+    """
+    Return the USD price of the base token and every collateral of the comet by checksum address, read from the comet
+    price feeds (getPrice) in a Multicall. The prices are published to the price cache for get_price and get_prices.
+    """
+    block = ensure_a_block_number(block, blockchain)
+    comet_address = Web3.to_checksum_address(comet_address)
+    comet = Comet(blockchain, block, address=comet_address)
+    raw_prices = get_comet_prices(comet, block, blockchain, web3=comet.contract.w3)
+
+    # getPrice returns 8 decimals
+    unit_price = Decimal(1) / Decimal(10**8)
+    if comet_address in NATIVE_QUOTED_COMETS:
+        unit_price *= Chainlink.get_native_token_price(comet.contract.w3, block, blockchain, decimals=True)
+
+    prices = {asset: raw_price * unit_price for asset, raw_price in raw_prices.items()}
+    publish_prices(prices, block, blockchain, "compound_v3")
+    return prices
+
+
 def get_protocol_data_for(
     blockchain: str, wallet: str, lptoken_address: str, block: int | str = "latest", decimals: bool = True
 ) -> dict:
@@ -72,6 +98,32 @@ def get_protocol_data_for(
     return data
 
 
+def get_protocol_data_for_wallets(
+    blockchain: str, wallets: list[str], lptoken_address: str, block: int | str = "latest", decimals: bool = True
+) -> dict[str, dict]:
+    """
+    Batch version of get_protocol_data_for. The comet state is read once and the balances and rewards of every wallet
+    are fetched in a single Multicall.
+
+    Returns:
+        dict[str, dict]: The data of every wallet, by wallet address.
+    """
+    wallets = [Web3.to_checksum_address(wallet) for wallet in wallets]
+    lptoken_address = Web3.to_checksum_address(lptoken_address)
+
+    with Snapshot(blockchain, block) as snapshot:
+        comet = Comet(blockchain, snapshot.block, lptoken_address)
+        rewards = CometRewards(blockchain, snapshot.block)
+        snapshot.prefetch(
+            [comet.contract.functions.balanceOf(wallet) for wallet in wallets]
+            + [rewards.contract.functions.getRewardOwed(lptoken_address, wallet) for wallet in wallets]
+        )
+        return {
+            wallet: get_protocol_data_for(blockchain, wallet, lptoken_address, snapshot.block, decimals)
+            for wallet in wallets
+        }
+
+
 def get_protocol_data(blockchain: str, wallet: str, block: int | str = "latest", decimals: bool = True) -> dict:
     """
     TODO: Add documentation
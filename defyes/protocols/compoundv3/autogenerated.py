@@ -11,11 +11,11 @@ class Comet(Comet):
     ...
 """
 
-from karpatkit.cache import const_call
-from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.generator import load_abi
+from defyes.cache import const_call
+from defyes.functions import get_contract
+from defyes.generator import load_abi_json
 
 
 class Comet:
@@ -35,8 +35,7 @@ class Comet:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "comet.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "comet.json"))
 
     def balance_of(self, account: str) -> int:
         return self.contract.functions.balanceOf(account).call(block_identifier=self.block)
@@ -251,8 +250,7 @@ class CometRewards:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "comet_rewards.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "comet_rewards.json"))
 
     def get_reward_owed(self, comet: str, account: str) -> tuple:
         return self.contract.functions.getRewardOwed(comet, account).call(block_identifier=self.block)
@@ -4,11 +4,11 @@ from decimal import Decimal
 from defabipedia import Chain
 from gql import Client, gql  # thegraph queries
 from gql.transport.requests import RequestsHTTPTransport
-from karpatkit.cache import const_call
 from karpatkit.helpers import call_contract_method
 from karpatkit.node import get_node
 from web3 import Web3
 
+from defyes.cache import const_call
 from defyes.functions import balance_of, get_contract, get_decimals
 
 # Subgraph API endpoints for Connext on different blockchains: https://docs.connext.network/resources/subgraphs
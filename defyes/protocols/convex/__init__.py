@@ -5,11 +5,11 @@ from pathlib import Path
 
 from defabipedia import Chain
 from defabipedia.tokens import EthereumTokenAddr
-from karpatkit.cache import const_call
 from karpatkit.explorer import ChainExplorer
 from karpatkit.node import get_node
 from web3 import Web3
 
+from defyes.cache import const_call
 from defyes.functions import get_contract, last_block, to_token_amount
 from defyes.protocols import curve
 from defyes.protocols.convex.autogenerated import StakedCvx
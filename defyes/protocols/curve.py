@@ -1,20 +1,29 @@
 import logging
+import threading
+import time
 from contextlib import suppress
+from dataclasses import dataclass, replace
 from decimal import Decimal
+from functools import cache
 
 from defabipedia import Chain
 from defabipedia.tokens import EthereumTokenAddr, GnosisTokenAddr
-from karpatkit.cache import const_call
 from karpatkit.constants import Address
 from karpatkit.explorer import ChainExplorer
 from karpatkit.helpers import suppress_error_codes
 from karpatkit.node import get_node
+from requests.exceptions import RequestException
 from web3 import Web3
+from web3.contract import Contract
 from web3.exceptions import BadFunctionCallOutput, ContractLogicError
 
+from defyes.cache import const_call
 from defyes.functions import balance_of, get_contract, get_decimals, get_logs_web3, to_token_amount
 from defyes.lazytime import Duration, Time
+from defyes.logstore import CONFIRMATIONS
+from defyes.multicall import Multicall, PendingCall
 from defyes.prices.prices import get_price
+from defyes.store import get_store
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +31,14 @@ PROVIDER_ADDRESS = "0x0000000022D53366457F9d5E68Ec105046FC4383"
 
 X_CHAIN_GAUGE_FACTORY_ADDRESS = "0xabC000d88f23Bb45525E447528DBF656A9D55bf5"
 
+# Registries of the address provider indexed by the pool registry, in the order they are looked up
+REGISTRY_IDS = (0, 3, 5, 6, 11)
+# Min seconds between two refreshes of the pool registry to look up the addresses not found in it
+POOL_REGISTRY_REFRESH_INTERVAL = 60
+
+# Max number of coins of a Curve pool
+MAX_COINS = 8
+
 # Provider ABI - get_address
 ABI_PROVIDER = '[{"name":"get_address","outputs":[{"type":"address","name":""}],"inputs":[{"type":"uint256","name":"_id"}],"stateMutability":"view","type":"function","gas":1308}]'
 
@@ -89,7 +106,7 @@ def get_registry_contract(web3, id, block, blockchain):
     return get_contract(registry_address, blockchain, web3=web3, abi=abi)
 
 
-def get_pool_gauge_address(web3, pool_address, lptoken_address, block, blockchain):
+def get_gauge_address_from_registries(web3, pool_address, lptoken_address, block, blockchain):
     gauge_address = None
 
     # 1: Try to retrieve the gauge address assuming the pool is a Regular Pool
@@ -136,45 +153,67 @@ def get_pool_gauge_address(web3, pool_address, lptoken_address, block, blockchai
     return gauge_address
 
 
-def working_version_request(gauge_contract):
-    with suppress(ContractLogicError):
-        version = const_call(gauge_contract.functions.version())
-        if gauge_contract.w3._network_name != Chain.ETHEREUM:
+def get_pool_gauge_address(web3, pool_address, lptoken_address, block, blockchain):
+    record = get_pool_record(web3, block, blockchain, lptoken_address=lptoken_address)
+    if record is not None and record.gauge != Address.ZERO:
+        return record.gauge
+
+    gauge_address = get_gauge_address_from_registries(web3, pool_address, lptoken_address, block, blockchain)
+    if record is not None and gauge_address not in (None, Address.ZERO):
+        # The gauge was added to the registries after the pool was indexed
+        get_pool_registry(blockchain, web3).set_gauge(record, gauge_address)
+    return gauge_address
+
+
+def gauge_version_from_probes(probes: dict, blockchain) -> str:
+    """
+    Return the gauge version told by the GAUGE_VERSION_PROBES calls made to the gauge.
+
+    Args:
+        probes (dict): The result of every probe call which didn't revert, by name.
+        blockchain (str)
+    """
+    if "version" in probes:
+        if blockchain != Chain.ETHEREUM:
             return "ChildGauge"
-        else:
-            if "v6" in version:
-                return "LiquidityGaugeV6"
-            elif "v5" in version:
-                return "LiquidityGaugeV5"
-
-    with suppress(ContractLogicError):
-        const_call(gauge_contract.functions.claimable_reward_write(Address.ZERO, Address.ZERO))
-        const_call(gauge_contract.functions.crv_token())
-        return "LiquidityGaugeV3"
-
-    with suppress(ContractLogicError):
-        const_call(gauge_contract.functions.claimable_reward_write(Address.ZERO, Address.ZERO))
-        return "RewardsOnlyGauge"
-
-    with suppress(ContractLogicError):
-        const_call(gauge_contract.functions.minter())
-        const_call(gauge_contract.functions.decimals())
-        const_call(gauge_contract.functions.claimable_reward(Address.ZERO))
-        return "LiquidityGaugeReward"
-
-    with suppress(ContractLogicError):
-        const_call(gauge_contract.functions.minter())
-        const_call(gauge_contract.functions.decimals())
-        const_call(gauge_contract.functions.decimals())
-        return "LiquidityGaugeV2"
-
-    with suppress(ContractLogicError):
-        const_call(gauge_contract.functions.minter())
+        elif "v6" in probes["version"]:
+            return "LiquidityGaugeV6"
+        elif "v5" in probes["version"]:
+            return "LiquidityGaugeV5"
+
+    if "claimable_reward_write" in probes:
+        return "LiquidityGaugeV3" if "crv_token" in probes else "RewardsOnlyGauge"
+
+    if "minter" in probes:
+        if "decimals" in probes:
+            return "LiquidityGaugeReward" if "claimable_reward" in probes else "LiquidityGaugeV2"
         return "LiquidityGauge"
 
     return "LiquidityGaugeV4"
 
 
+def get_gauge_versions(gauge_addresses, block, blockchain, web3=None) -> dict:
+    """Return the version of every gauge, probing all of them in a single Multicall."""
+    with Multicall(blockchain, block, web3=web3) as multicall:
+        gauge_probes = {}
+        for gauge_address in gauge_addresses:
+            functions = get_contract(gauge_address, blockchain, web3=web3, abi=ABI_GAUGE).functions
+            gauge_probes[gauge_address] = {
+                "version": multicall.add(functions.version()),
+                "claimable_reward_write": multicall.add(functions.claimable_reward_write(Address.ZERO, Address.ZERO)),
+                "crv_token": multicall.add(functions.crv_token()),
+                "minter": multicall.add(functions.minter()),
+                "decimals": multicall.add(functions.decimals()),
+                "claimable_reward": multicall.add(functions.claimable_reward(Address.ZERO)),
+            }
+
+    versions = {}
+    for gauge_address, probes in gauge_probes.items():
+        probes = {name: result for name, call in probes.items() if (result := call_result(call)) is not None}
+        versions[gauge_address] = gauge_version_from_probes(probes, blockchain)
+    return versions
+
+
 def get_gauge_version(gauge_address, block, blockchain, web3=None, only_version=True):
     if web3 is None:
         web3 = get_node(blockchain)
@@ -182,18 +221,13 @@ def get_gauge_version(gauge_address, block, blockchain, web3=None, only_version=
     # The ABI used to get the Gauge Contract is a general ABI for all types. This is because some gauges do not have
     # their ABIs available in the explorers
     gauge_contract = get_contract(gauge_address, blockchain, web3=web3, abi=ABI_GAUGE)
-    version = working_version_request(gauge_contract)
+    version = get_pool_registry(blockchain, web3).get_gauge_version(gauge_contract.address)
     if only_version:
         return version
     return [version, gauge_contract]
 
 
-def get_pool_address(web3, lptoken_address, block, blockchain):
-    """
-    IMPORTANT: "crypto factory" pools are not considered
-                because the pool address is retrieved by
-                the function get_lptoken_data (minter function)
-    """
+def get_pool_address_from_registries(web3, lptoken_address, block, blockchain):
     # 1: Try to retrieve the pool address assuming the pool is a Regular Pool
     registry_contract = get_registry_contract(web3, 0, block, blockchain)
 
@@ -214,75 +248,417 @@ def get_pool_address(web3, lptoken_address, block, blockchain):
     return pool_address
 
 
+def get_pool_address(web3, lptoken_address, block, blockchain):
+    """
+    IMPORTANT: "crypto factory" pools which aren't in the pool registry are not considered
+                because the pool address is retrieved by
+                the function get_lptoken_data (minter function)
+    """
+    record = get_pool_record(web3, block, blockchain, lptoken_address=lptoken_address)
+    if record is not None:
+        return record.pool
+    return get_pool_address_from_registries(web3, lptoken_address, block, blockchain)
+
+
+def get_pool_coins(web3, pool_address, block, blockchain, abi=ABI_POOL):
+    """
+    Return the pool contract and the list of its coins. The coins of the pools in the pool registry are already known,
+    those of the rest are found calling coins(i) until it reverts.
+
+    Args:
+        abi (str, optional): ABI of the pool contract, None for the ABI of the explorer. Defaults to ABI_POOL, which is
+            replaced by ABI_POOL_ALTERNATIVE for the pools whose coins(i) takes an int128.
+    """
+    record = get_pool_record(web3, block, blockchain, pool_address=pool_address)
+    if record is not None:
+        if record.int128_coins and abi == ABI_POOL:
+            abi = ABI_POOL_ALTERNATIVE
+        return get_contract(pool_address, blockchain, web3=web3, abi=abi), list(record.coins)
+
+    pool_contract = get_contract(pool_address, blockchain, web3=web3, abi=abi)
+    alternative = abi == ABI_POOL_ALTERNATIVE
+    coins = []
+    while True:
+        try:
+            coins.append(pool_contract.functions.coins(len(coins)).call(block_identifier=block))
+        except ContractLogicError:
+            # If the query fails for the first coin -> the pool contract must be retrieved with the ABI_POOL_ALTERNATIVE
+            if coins or alternative:
+                break
+            pool_contract = get_contract(pool_address, blockchain, web3=web3, abi=ABI_POOL_ALTERNATIVE)
+            alternative = True
+        except ValueError:
+            break
+
+    return pool_contract, coins
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Pool registry
+# ----------------------------------------------------------------------------------------------------------------------
+@dataclass(frozen=True)
+class PoolRecord:
+    """Metadata of a Curve pool, which doesn't change once the pool is deployed (but the gauge, set later on)."""
+
+    lptoken: str
+    pool: str
+    registry_id: int
+    gauge: str
+    gauge_version: str | None
+    coins: tuple[str, ...]
+    # The coins with the LP token of the base pool of a metapool (its last coin) replaced by the base pool coins
+    underlying_coins: tuple[str, ...]
+    is_metapool: bool
+    # coins(i) and balances(i) take an int128 (ABI_POOL_ALTERNATIVE) instead of an uint256 (ABI_POOL)
+    int128_coins: bool
+
+    @property
+    def base_lptoken(self) -> str | None:
+        """The LP token of the base pool of a metapool, or None if the pool isn't a metapool over a base pool."""
+        return self.coins[-1] if len(self.underlying_coins) > len(self.coins) else None
+
+
+def call_result(call: PendingCall):
+    """Return the result of a Multicall call, or None if it reverted or its output couldn't be decoded."""
+    with suppress(ContractLogicError, BadFunctionCallOutput):
+        return call.result()
+    return None
+
+
+class PoolRegistry:
+    """
+    LP token -> PoolRecord index of the pools listed by the registries of the address provider (REGISTRY_IDS), so the
+    pool, gauge, coins and metapool flag of an LP token are resolved with a lookup instead of a cascade of registry
+    and pool calls, most of them reverting.
+
+    The registries are append-only lists. The records and the number of pools indexed from every registry are kept in
+    the "curve" store, so a refresh reads `pool_count()` and indexes just the new `pool_list(i)` entries, with a few
+    Multicalls. The registry is refreshed when an LP token isn't found in it, up to `confirmations` blocks behind the
+    head, at most once every `refresh_interval` seconds. The addresses not found are remembered along with the pool
+    counts of the registries, so they aren't looked up again until a new pool is indexed. The versions of the gauges,
+    also kept in the store, are probed once in a single Multicall.
+    """
+
+    def __init__(
+        self,
+        blockchain: str,
+        web3=None,
+        confirmations: int = CONFIRMATIONS,
+        refresh_interval: float = POOL_REGISTRY_REFRESH_INTERVAL,
+    ):
+        if web3 is None:
+            web3 = get_node(blockchain)
+        self.blockchain = blockchain
+        self.web3 = web3
+        self.confirmations = confirmations
+        self.refresh_interval = refresh_interval
+        self.store = get_store("curve")
+        self.indexed_block = -1
+        self.refreshed_at: float | None = None
+        self._lock = threading.Lock()
+        # LP token -> record and pool -> LP token, of the records already looked up
+        self.records: dict[str, PoolRecord] = {}
+        self.lptokens: dict[str, str] = {}
+        # Pool counts of the registries indexed, and address -> pool counts when it wasn't found in the registries
+        self.pool_counts: tuple[int, ...] = ()
+        self.misses: dict[str, tuple[int, ...]] = {}
+
+    def key(self, kind: str, address: str) -> tuple:
+        return (kind, str(self.blockchain), address)
+
+    def _remember(self, record: PoolRecord) -> None:
+        self.records[record.lptoken] = record
+        self.lptokens[record.pool] = record.lptoken
+
+    def _save(self, record: PoolRecord) -> None:
+        self._remember(record)
+        self.store[self.key("pool", record.lptoken)] = record
+        self.store[self.key("lptoken", record.pool)] = record.lptoken
+        if record.gauge_version is not None:
+            self.store[self.key("gauge_version", record.gauge)] = record.gauge_version
+
+    def _cached_record(self, lptoken_address: str) -> PoolRecord | None:
+        record = self.records.get(lptoken_address)
+        if record is None:
+            record = self.store.get(self.key("pool", lptoken_address))
+            if record is not None:
+                self._remember(record)
+        return record
+
+    def _cached_lptoken(self, pool_address: str) -> str | None:
+        lptoken_address = self.lptokens.get(pool_address)
+        if lptoken_address is None:
+            lptoken_address = self.store.get(self.key("lptoken", pool_address))
+        return lptoken_address
+
+    def _missing(self, address: str, block: int | str) -> bool:
+        """
+        Whether an address not found could be in the registries at the block, after refreshing them if they weren't
+        refreshed in the last refresh_interval, so it's worth looking it up again.
+        """
+        if block != "latest" and block <= self.indexed_block:
+            return False
+        self.refresh_to_head()
+        return self.misses.get(address) != self.pool_counts
+
+    def get_record(self, lptoken_address: str, block: int | str = "latest") -> PoolRecord | None:
+        """Return the record of the LP token, or None if the pool isn't in any registry."""
+        lptoken_address = Web3.to_checksum_address(lptoken_address)
+        record = self._cached_record(lptoken_address)
+        if record is None and self._missing(lptoken_address, block):
+            record = self._cached_record(lptoken_address)
+            if record is None:
+                self.misses[lptoken_address] = self.pool_counts
+        return record
+
+    def get_record_by_pool(self, pool_address: str, block: int | str = "latest") -> PoolRecord | None:
+        """Return the record of the pool, or None if the pool isn't in any registry."""
+        pool_address = Web3.to_checksum_address(pool_address)
+        lptoken_address = self._cached_lptoken(pool_address)
+        if lptoken_address is None and self._missing(pool_address, block):
+            lptoken_address = self._cached_lptoken(pool_address)
+            if lptoken_address is None:
+                self.misses[pool_address] = self.pool_counts
+        return None if lptoken_address is None else self._cached_record(lptoken_address)
+
+    def set_gauge(self, record: PoolRecord, gauge_address: str) -> PoolRecord:
+        """Record the gauge of a pool which didn't have any when it was indexed."""
+        record = replace(record, gauge=gauge_address, gauge_version=None)
+        self._save(record)
+        return record
+
+    def get_gauge_version(self, gauge_address: str) -> str:
+        version = self.store.get(self.key("gauge_version", gauge_address))
+        if version is None:
+            version = get_gauge_versions([gauge_address], "latest", self.blockchain, web3=self.web3)[gauge_address]
+            self.store[self.key("gauge_version", gauge_address)] = version
+        return version
+
+    def refresh_to_head(self) -> None:
+        """Refresh the registries, unless they were already refreshed in the last refresh_interval."""
+        now = time.monotonic()
+        if self.refreshed_at is not None and now - self.refreshed_at < self.refresh_interval:
+            return
+        self.refreshed_at = now
+        self.refresh()
+
+    def refresh(self, block: int | None = None) -> None:
+        """Index the pools added to the registries up to the block (by default, the head minus the confirmations)."""
+        with self._lock:
+            self._refresh(block)
+
+    def _refresh(self, block: int | None) -> None:
+        if block is None:
+            block = self.web3.eth.block_number - self.confirmations
+
+        registries = [(id, get_registry_contract(self.web3, id, block, self.blockchain)) for id in REGISTRY_IDS]
+        registries = [(id, registry) for id, registry in registries if registry.address != Address.ZERO]
+        with Multicall(self.blockchain, block, web3=self.web3) as multicall:
+            pool_counts = [multicall.add(registry.functions.pool_count()) for _, registry in registries]
+
+        pool_lists = []
+        with Multicall(self.blockchain, block, web3=self.web3) as multicall:
+            for (id, registry), pool_count in zip(registries, pool_counts):
+                pool_count = call_result(pool_count)
+                if pool_count is None:
+                    continue
+                indexed = self.store.get(self.key("pool_count", registry.address), 0)
+                calls = [multicall.add(registry.functions.pool_list(i)) for i in range(indexed, pool_count)]
+                pool_lists.append((id, registry, pool_count, calls))
+
+        pools = [(id, registry, call.result()) for id, registry, _, calls in pool_lists for call in calls]
+        records = self.read_pools(pools, block)
+        for record in records:
+            self._save(record)
+        for _, registry, pool_count, _ in pool_lists:
+            self.store[self.key("pool_count", registry.address)] = pool_count
+        self.pool_counts = tuple(pool_count for _, _, pool_count, _ in pool_lists)
+        self.indexed_block = max(self.indexed_block, block)
+        logger.debug(
+            f"Curve pool registry of {self.blockchain} refreshed up to block {block}: {len(records)} new pools."
+        )
+
+    def read_pools(self, pools: list[tuple[int, Contract, str]], block: int) -> list[PoolRecord]:
+        """Read the records of the (registry id, registry contract, pool address) pools, in a few Multicalls."""
+        with Multicall(self.blockchain, block, web3=self.web3) as multicall:
+            pool_calls = [self._queue_pool_calls(multicall, *pool) for pool in pools]
+
+        # The coins of the old pools, whose coins(i) takes an int128, are read apart
+        with Multicall(self.blockchain, block, web3=self.web3) as multicall:
+            for (_, _, pool_address), calls in zip(pools, pool_calls):
+                if call_result(calls["coins"][0]) is None:
+                    pool_contract = get_contract(
+                        pool_address, self.blockchain, web3=self.web3, abi=ABI_POOL_ALTERNATIVE
+                    )
+                    calls["coins"] = [multicall.add(pool_contract.functions.coins(i)) for i in range(MAX_COINS)]
+                    calls["int128_coins"] = True
+
+        records = []
+        for (id, _, pool_address), calls in zip(pools, pool_calls):
+            record = self._make_record(id, pool_address, calls)
+            if record is not None:
+                # Remembered right away, since the base pools of the metapools are indexed before them
+                self._remember(record)
+                records.append(record)
+
+        if self.blockchain != Chain.ETHEREUM:
+            # Pools which don't have their gauge registered in none of the registries
+            x_chain_factory_contract = get_contract(
+                X_CHAIN_GAUGE_FACTORY_ADDRESS, self.blockchain, web3=self.web3, abi=ABI_X_CHAIN_GAUGE_FACTORY_ADDRESS
+            )
+            with Multicall(self.blockchain, block, web3=self.web3) as multicall:
+                x_chain_gauges = {
+                    record.lptoken: multicall.add(
+                        x_chain_factory_contract.functions.get_gauge_from_lp_token(record.lptoken)
+                    )
+                    for record in records
+                    if record.gauge == Address.ZERO
+                }
+            for i, record in enumerate(records):
+                if record.lptoken in x_chain_gauges:
+                    records[i] = replace(record, gauge=call_result(x_chain_gauges[record.lptoken]) or Address.ZERO)
+
+        gauges = {record.gauge for record in records if record.gauge != Address.ZERO}
+        versions = get_gauge_versions(sorted(gauges), block, self.blockchain, web3=self.web3) if gauges else {}
+        return [replace(record, gauge_version=versions.get(record.gauge)) for record in records]
+
+    def _queue_pool_calls(self, multicall: Multicall, id: int, registry: Contract, pool_address: str) -> dict:
+        registry_functions = registry.functions
+        pool_functions = get_contract(pool_address, self.blockchain, web3=self.web3, abi=ABI_POOL).functions
+        calls = {
+            "coins": [multicall.add(pool_functions.coins(i)) for i in range(MAX_COINS)],
+            "int128_coins": False,
+            "underlying_coin": multicall.add(pool_functions.underlying_coins(0)),
+        }
+        if id in (0, 5):
+            calls["lptoken"] = multicall.add(registry_functions.get_lp_token(pool_address))
+            calls["gauges"] = multicall.add(registry_functions.get_gauges(pool_address))
+        else:
+            calls["gauge"] = multicall.add(registry_functions.get_gauge(pool_address))
+        if id == 6:
+            # The crypto factory pools have an LP token of their own
+            calls["lptoken"] = multicall.add(pool_functions.token())
+        if id in (0, 3):
+            calls["is_meta"] = multicall.add(registry_functions.is_meta(pool_address))
+        if id == 0:
+            calls["underlying_coins"] = multicall.add(registry_functions.get_underlying_coins(pool_address))
+        if id == 3:
+            calls["base_pool"] = multicall.add(registry_functions.get_base_pool(pool_address))
+        return calls
+
+    def _make_record(self, id: int, pool_address: str, calls: dict) -> PoolRecord | None:
+        coins = []
+        for call in calls["coins"]:
+            coin = call_result(call)
+            if coin is None or coin == Address.ZERO:
+                break
+            coins.append(coin)
+        if not coins:
+            logger.debug(f"Curve pool {pool_address} of the registry {id} without coins. Not indexed.")
+            return None
+
+        lptoken_address = pool_address
+        if "lptoken" in calls:
+            lptoken_address = call_result(calls["lptoken"]) or Address.ZERO
+            if lptoken_address == Address.ZERO:
+                lptoken_address = pool_address
+        if self._cached_record(lptoken_address) is not None:
+            # Already indexed from a registry looked up before
+            return None
+
+        if "gauges" in calls:
+            gauges = call_result(calls["gauges"])
+            gauge_address = gauges[0][0] if gauges else Address.ZERO
+        else:
+            gauge_address = call_result(calls["gauge"]) or Address.ZERO
+
+        is_meta = bool(call_result(calls["is_meta"])) if "is_meta" in calls else False
+        underlying_coins = []
+        if is_meta and "underlying_coins" in calls:
+            # The underlying coins of the lending pools (cTokens, aTokens, ...) aren't expanded
+            underlying_coins = [coin for coin in call_result(calls["underlying_coins"]) or () if coin != Address.ZERO]
+        base_pool = call_result(calls["base_pool"]) if "base_pool" in calls else None
+        if not underlying_coins and base_pool not in (None, Address.ZERO):
+            base_lptoken = self._cached_lptoken(base_pool)
+            base_record = None if base_lptoken is None else self._cached_record(base_lptoken)
+            if base_record is not None:
+                underlying_coins = coins[:-1] + list(base_record.coins)
+
+        return PoolRecord(
+            lptoken=lptoken_address,
+            pool=pool_address,
+            registry_id=id,
+            gauge=gauge_address,
+            gauge_version=None,
+            coins=tuple(coins),
+            underlying_coins=tuple(underlying_coins or coins),
+            is_metapool=is_meta or call_result(calls["underlying_coin"]) is not None,
+            int128_coins=calls["int128_coins"],
+        )
+
+
+@cache
+def get_pool_registry(blockchain: str, web3) -> PoolRegistry:
+    return PoolRegistry(blockchain, web3)
+
+
+def get_pool_record(web3, block, blockchain, lptoken_address=None, pool_address=None) -> PoolRecord | None:
+    """
+    Return the pool registry record of the LP token (or of the pool), or None if it isn't in any registry or the
+    registry couldn't be read, so the caller falls back to the registry calls.
+    """
+    if web3 is None:
+        web3 = get_node(blockchain)
+
+    try:
+        registry = get_pool_registry(blockchain, web3)
+        if lptoken_address is not None:
+            return registry.get_record(lptoken_address, block)
+        return registry.get_record_by_pool(pool_address, block)
+    except (ContractLogicError, BadFunctionCallOutput, ValueError, RequestException) as e:
+        logger.warning(f"Curve pool registry unavailable ({e}). Calling the registries.")
+        return None
+
+
 def get_pool_data(web3, minter, block, blockchain):
     pool_data = {
-        "contract": get_contract(minter, blockchain, web3=web3, abi=ABI_POOL),
+        "contract": None,
         "is_metapool": False,
         "coins": {},
     }
 
+    record = get_pool_record(web3, block, blockchain, pool_address=minter)
+    if record is not None:
+        # The LP token of the base pool of the metapools is already expanded into the base pool coins
+        pool_data["is_metapool"] = record.is_metapool
+        pool_data["contract"], _ = get_pool_coins(web3, minter, block, blockchain)
+        pool_data["coins"] = dict(enumerate(record.underlying_coins))
+        return pool_data
+
     try:
-        const_call(pool_data["contract"].functions.underlying_coins(0))
+        const_call(get_contract(minter, blockchain, web3=web3, abi=ABI_POOL).functions.underlying_coins(0))
         pool_data["is_metapool"] = True
     except ContractLogicError:
         pass
 
-    next_token = True
-    i = 0
-    j = 0
-    while next_token:
-        try:
-            token_address = pool_data["contract"].functions.coins(i).call(block_identifier=block)
-
-        except ContractLogicError:
-            # If the query fails when i == 0 -> the pool contract must be retrieved with the ABI_POOL_ALETRNATIVE
-            if i == 0:
-                pool_data["contract"] = get_contract(minter, blockchain, web3=web3, abi=ABI_POOL_ALTERNATIVE)
-            else:
-                next_token = False
-
-            continue
-
-        except ValueError:
-            next_token = False
-            continue
+    pool_data["contract"], coins = get_pool_coins(web3, minter, block, blockchain)
 
+    j = 0
+    for i, token_address in enumerate(coins):
         # IMPORTANT: AD-HOC FIX UNTIL WE FIND A WAY TO SOLVE HOW META POOLS WORK FOR DIFFERENT POOL TYPES AND SIDE-CHAINS
         # if token_address == EthereumTokenAddr.X3CRV or token_address == X3CRV_POL or token_address == GnosisTokenAddr.x3CRV:
         if token_address == EthereumTokenAddr.X3CRV:
             pool_data["is_metapool"] = True
 
             x3crv_minter = get_pool_address(web3, token_address, block, blockchain)
-            x3crv_pool_contract = get_contract(x3crv_minter, blockchain, web3=web3, abi=ABI_POOL)
-
-            x3crv_next_token = True
-            while x3crv_next_token:
-                try:
-                    token_address = x3crv_pool_contract.functions.coins(j).call(block_identifier=block)
-
-                except ContractLogicError:
-                    # If the query fails when j == 0 -> the pool contract must be retrieved with the ABI_POOL_ALETRNATIVE
-                    if i == 0:
-                        x3crv_pool_contract = get_contract(
-                            x3crv_minter, blockchain, web3=web3, abi=ABI_POOL_ALTERNATIVE
-                        )
-                    else:
-                        x3crv_next_token = False
-
-                    continue
-
-                except ValueError:
-                    x3crv_next_token = False
-                    continue
-
+            _, x3crv_coins = get_pool_coins(web3, x3crv_minter, block, blockchain)
+            for token_address in x3crv_coins:
                 pool_data["coins"][i + j] = token_address
                 j += 1
 
         else:
             pool_data["coins"][i + j] = token_address
 
-        i += 1
-
     return pool_data
 
 
@@ -447,28 +823,12 @@ def underlying(
     else:
         lptoken_data["staked"] = 0
 
-    pool_contract = get_contract(lptoken_data["minter"], blockchain, web3=web3, abi=ABI_POOL)
+    pool_contract, coins = get_pool_coins(web3, lptoken_data["minter"], block, blockchain)
 
     pool_balance_fraction = lptoken_data["balanceOf"] / lptoken_data["totalSupply"]
     pool_staked_fraction = lptoken_data["staked"] / lptoken_data["totalSupply"]
 
-    next_token = True
-    i = 0
-    while next_token:
-        try:
-            token_address = pool_contract.functions.coins(i).call(block_identifier=block)
-        except ContractLogicError:
-            # If the query fails when i == 0 -> the pool contract must be retrieved with the ABI_POOL_ALETRNATIVE
-            if i == 0:
-                pool_contract = get_contract(lptoken_data["minter"], blockchain, web3=web3, abi=ABI_POOL_ALTERNATIVE)
-            else:
-                next_token = False
-            continue
-
-        except ValueError:
-            next_token = False
-            continue
-
+    for i, token_address in enumerate(coins):
         balance = pool_contract.functions.balances(i).call(block_identifier=block)
         balance = to_token_amount(token_address, balance, blockchain, web3, decimals)
 
@@ -481,8 +841,6 @@ def underlying(
             convex_pool_fraction = convex_staked / lptoken_data["totalSupply"]
             balances.append([token_address, balance * Decimal(convex_pool_fraction)])
 
-        i += 1
-
     result = balances
     if reward:
         all_rewards = get_all_rewards(
@@ -518,27 +876,12 @@ def unwrap(lptoken_amount, lptoken_address, block, blockchain, web3=None, decima
     if lptoken_data["minter"] is None:
         lptoken_data["minter"] = get_pool_address(web3, lptoken_address, block, blockchain)
 
-    pool_contract = get_contract(lptoken_data["minter"], blockchain, web3=web3)
+    pool_contract, coins = get_pool_coins(web3, lptoken_data["minter"], block, blockchain, abi=None)
     pool_fraction = (
         Decimal(lptoken_amount) / Decimal(lptoken_data["totalSupply"]) * Decimal(10 ** lptoken_data["decimals"])
     )
 
-    next_token = True
-    i = 0
-    while next_token:
-        try:
-            token_address = pool_contract.functions.coins(i).call(block_identifier=block)
-        except ContractLogicError:
-            # If the query fails when i == 0 -> the pool contract must be retrieved with the ABI_POOL_ALTERNATIVE
-            if i == 0:
-                pool_contract = get_contract(lptoken_data["minter"], blockchain, web3=web3, abi=ABI_POOL_ALTERNATIVE)
-            else:
-                next_token = False
-            continue
-        except ValueError:
-            next_token = False
-            continue
-
+    for i, token_address in enumerate(coins):
         if decimals:
             if token_address == Address.E:
                 token_decimals = get_decimals(Address.ZERO, blockchain, web3=web3)
@@ -556,8 +899,6 @@ def unwrap(lptoken_amount, lptoken_address, block, blockchain, web3=None, decima
 
         balances.append([token_address, token_balance])
 
-        i += 1
-
     return balances
 
 
@@ -583,43 +924,28 @@ def pool_balances(lptoken_address, block, blockchain, web3=None, decimals=True,
     if minter is None:
         minter = get_pool_address(web3, lptoken_address, block, blockchain)
 
-    pool_contract = get_contract(minter, blockchain, web3=web3, abi=ABI_POOL)
+    pool_contract, coins = get_pool_coins(web3, minter, block, blockchain)
 
-    next_token = True
-    i = 0
-    while next_token:
-        try:
-            token_address = pool_contract.functions.coins(i).call(block_identifier=block)
-        except ContractLogicError:
-            # If the query fails when i == 0 -> the pool contract must be retrieved with the ABI_POOL_ALTERNATIVE
-            if i == 0:
-                pool_contract = get_contract(minter, blockchain, web3=web3, abi=ABI_POOL_ALTERNATIVE)
-            else:
-                next_token = False
-            continue
-
-        except ValueError:
-            next_token = False
-            continue
+    # The LP token of the base pool of a metapool, whose balance is unwrapped into the base pool coins when meta is True
+    record = get_pool_record(web3, block, blockchain, lptoken_address=lptoken_address)
+    if record is not None:
+        base_lptokens = {record.base_lptoken} - {None}
+    else:
+        base_lptokens = {EthereumTokenAddr.X3CRV, GnosisTokenAddr.x3CRV}
 
+    for i, token_address in enumerate(coins):
         balance = pool_contract.functions.balances(i).call(block_identifier=block)
-        # Fetches the 3CR underlying balances in the 3pool
-        if token_address != EthereumTokenAddr.X3CRV and token_address != GnosisTokenAddr.x3CRV:
-            balances.append([token_address, to_token_amount(token_address, balance, blockchain, web3, decimals)])
+        if meta and token_address in base_lptokens:
+            underlying = unwrap(
+                to_token_amount(token_address, balance, blockchain, web3, decimals),
+                token_address,
+                block,
+                blockchain,
+            )
+            for element in underlying:
+                balances.append([element[0], element[1]])
         else:
-            if meta is False:
-                balances.append([token_address, to_token_amount(token_address, balance, blockchain, web3, decimals)])
-            else:
-                underlying = unwrap(
-                    to_token_amount(token_address, balance, blockchain, web3, decimals),
-                    token_address,
-                    block,
-                    blockchain,
-                )
-                for element in underlying:
-                    balances.append([element[0], element[1]])
-
-        i += 1
+            balances.append([token_address, to_token_amount(token_address, balance, blockchain, web3, decimals)])
 
     return balances
 
@@ -11,10 +11,10 @@ class DarbIsolation(DarbIsolation):
     ...
 """
 
-from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.generator import load_abi
+from defyes.functions import get_contract
+from defyes.generator import load_abi_json
 
 
 class DarbIsolation:
@@ -34,8 +34,7 @@ class DarbIsolation:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "dARB_isolation.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "dARB_isolation.json"))
 
     @property
     def borrow_position_proxy(self) -> str:
@@ -149,8 +148,7 @@ class DolomiteMargin:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "dolomite_margin.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "dolomite_margin.json"))
 
     def get_account_balances(self, account: tuple) -> tuple[list[int], list[str], list[tuple], list[tuple]]:
         return self.contract.functions.getAccountBalances(account).call(block_identifier=self.block)
@@ -1,12 +1,13 @@
 from dataclasses import dataclass
 from decimal import Decimal
 
-from karpatkit.cache import const_call
 from karpatkit.explorer import ChainExplorer
 from karpatkit.node import get_node
 from web3 import Web3
 
+from defyes.cache import const_call
 from defyes.functions import get_contract, to_token_amount
+from defyes.rpcbatch import RPCBatch
 from defyes.topic import decode_address_hexor
 
 from .curve import unwrap
@@ -78,6 +79,7 @@ def get_tranche(
     blockchain: str,
     web3: str,
     block: int,
+    tx_receipt: dict = None,
 ) -> Tranche:
     deploy_contract = get_contract(underlying_address, blockchain, web3=web3, abi=underlying_address_abi)
     function_output = deploy_contract.decode_function_input(input_data)
@@ -86,7 +88,7 @@ def get_tranche(
 
     yield_token = const_call(yield_token_contract.functions.interestToken())
 
-    tx = web3.eth.get_transaction_receipt(hash)
+    tx = web3.eth.get_transaction_receipt(hash) if tx_receipt is None else tx_receipt
     pool_id = tx["logs"][0]["topics"][1].hex()
     pool_address = decode_address_hexor(tx["logs"][0]["topics"][2])
 
@@ -106,20 +108,25 @@ def get_tranches(block: int, blockchain: str, web3) -> list:
     for deployer in [ELEMENT_DEPLOYER, ELEMENT_DEPLOYER2]:
         underlying_address = Web3.to_checksum_address(deployer)
         tx_list = ChainExplorer(blockchain).get_transactions(underlying_address, 0, block)
-
-        for item in tx_list:
-            if item["functionName"] == DEPLOYER_FUNCNAMES[deployer]:
-                tranches.append(
-                    get_tranche(
-                        item["input"],
-                        item["hash"],
-                        underlying_address,
-                        DEPLOYER_ABIS[deployer],
-                        blockchain,
-                        web3,
-                        block,
-                    )
+        tx_list = [item for item in tx_list if item["functionName"] == DEPLOYER_FUNCNAMES[deployer]]
+
+        # Fetch all the receipts in a single JSON-RPC batch
+        with RPCBatch(blockchain, web3=web3, flush_interval=None) as batch:
+            tx_receipts = [batch.get_transaction_receipt(item["hash"]) for item in tx_list]
+
+        for item, tx_receipt in zip(tx_list, tx_receipts):
+            tranches.append(
+                get_tranche(
+                    item["input"],
+                    item["hash"],
+                    underlying_address,
+                    DEPLOYER_ABIS[deployer],
+                    blockchain,
+                    web3,
+                    block,
+                    tx_receipt=tx_receipt.result(),
                 )
+            )
 
     return tranches
 
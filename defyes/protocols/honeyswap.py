@@ -2,10 +2,10 @@ import logging
 from decimal import Decimal
 from typing import List, Tuple
 
-from karpatkit.cache import const_call
 from karpatkit.node import get_node
 from web3 import Web3
 
+from defyes.cache import const_call
 from defyes.functions import get_contract, get_decimals, get_logs_web3, to_token_amount
 
 logger = logging.getLogger(__name__)
@@ -13,6 +13,7 @@ from web3 import Web3
 from web3.exceptions import ContractLogicError
 
 from defyes.functions import ensure_a_block_number, get_contract
+from defyes.snapshot import Snapshot
 from defyes.types import Addr, Token, TokenAmount
 
 from .autogenerated import LiquidityPool, LiquidityPoolToken, Rewarder
@@ -254,6 +255,38 @@ def get_protocol_data_for(
     return data
 
 
+def get_protocol_data_for_wallets(
+    blockchain: str,
+    wallets: list[str],
+    lptoken_address: str,
+    block: int | str = "latest",
+    decimals: bool = True,
+) -> dict[str, dict]:
+    """
+    Batch version of get_protocol_data_for. The pool state is read once and the staked balances and earned rewards of
+    every wallet are fetched in a single Multicall.
+
+    Returns:
+        dict[str, dict]: The data of every wallet, by wallet address.
+    """
+    wallets = [Addr(Web3.to_checksum_address(wallet)) for wallet in wallets]
+    lptoken_address = Web3.to_checksum_address(lptoken_address)
+
+    with Snapshot(blockchain, block) as snapshot:
+        lptoken_data = get_lptoken_data_from_db(lptoken_address, blockchain)
+        if lptoken_data is not None:
+            calls = []
+            for rewarder_address in get_rewards_contracts_from_db()[blockchain][lptoken_data["token"]]:
+                rewarder = Rewarder(blockchain, snapshot.block, rewarder_address)
+                calls += [rewarder.contract.functions.balanceOf(wallet) for wallet in wallets]
+                calls += [rewarder.contract.functions.earned(wallet) for wallet in wallets]
+            snapshot.prefetch(calls)
+        return {
+            wallet: get_protocol_data_for(blockchain, wallet, lptoken_address, snapshot.block, decimals)
+            for wallet in wallets
+        }
+
+
 # TODO: analize it
 def get_balance(blockchain: str, address: str, block="latest") -> float:
     """Get balance of hop_brigde in a specific chain.
@@ -11,10 +11,10 @@ class LiquidityPoolToken(LiquidityPoolToken):
     ...
 """
 
-from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.generator import load_abi
+from defyes.functions import get_contract
+from defyes.generator import load_abi_json
 
 
 class LiquidityPoolToken:
@@ -34,8 +34,7 @@ class LiquidityPoolToken:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "liquidity_pool_token.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "liquidity_pool_token.json"))
 
     def allowance(self, owner: str, spender: str) -> int:
         return self.contract.functions.allowance(owner, spender).call(block_identifier=self.block)
@@ -85,8 +84,7 @@ class LiquidityPool:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "liquidity_pool.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "liquidity_pool.json"))
 
     def calculate_current_withdraw_fee(self, user: str) -> int:
         return self.contract.functions.calculateCurrentWithdrawFee(user).call(block_identifier=self.block)
@@ -163,8 +161,7 @@ class Rewarder:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "rewarder.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "rewarder.json"))
 
     def balance_of(self, account: str) -> int:
         return self.contract.functions.balanceOf(account).call(block_identifier=self.block)
@@ -7,12 +7,12 @@ from defabipedia import Chain
 # thegraph queries
 from gql import Client, gql
 from gql.transport.requests import RequestsHTTPTransport
-from karpatkit.cache import const_call
 from karpatkit.constants import ABI_TOKEN_SIMPLIFIED
 from karpatkit.node import get_node
 from web3 import Web3
 from web3.exceptions import BadFunctionCallOutput
 
+from defyes.cache import const_call
 from defyes.functions import get_contract, to_token_amount
 
 DB_FILE = Path(__file__).parent / "db.json"
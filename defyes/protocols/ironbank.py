@@ -2,12 +2,12 @@ from decimal import Decimal
 from typing import List, Tuple
 
 from defabipedia import Chain
-from karpatkit.cache import const_call
 from karpatkit.constants import Address
 from karpatkit.node import get_node
 from web3 import Web3
 from web3.exceptions import BadFunctionCallOutput, ContractLogicError
 
+from defyes.cache import const_call
 from defyes.functions import get_contract, get_decimals, last_block, to_token_amount
 
 # Optimism - Unitroller Address
@@ -21,6 +21,7 @@ from defyes.protocols.maker.autogenerated import (
     Sdai,
     Vat,
 )
+from defyes.snapshot import Snapshot
 from defyes.types import Token, TokenAmount
 
 logger = logging.getLogger(__name__)
@@ -228,6 +229,38 @@ def get_protocol_data_for(
     return data
 
 
+def get_protocol_data_for_wallets(
+    blockchain: str, wallets: list[str], lptoken_address: str, block: int | str = "latest", decimals: bool = True
+) -> dict[str, dict]:
+    """
+    Batch version of get_protocol_data_for. The shared state (rates, chi, ...) is read once and the IOU, sDAI and DSR
+    balances of every wallet are fetched in a single Multicall.
+
+    Returns:
+        dict[str, dict]: The data of every wallet, by wallet address.
+    """
+    wallets = [Web3.to_checksum_address(wallet) for wallet in wallets]
+
+    with Snapshot(blockchain, block) as snapshot:
+        calls = []
+        if lptoken_address == "na":
+            iou = Iou(blockchain, snapshot.block)
+            calls = [iou.contract.functions.balanceOf(wallet) for wallet in wallets]
+        elif Web3.is_address(lptoken_address):
+            address = Web3.to_checksum_address(lptoken_address)
+            if address in ["0x83F20F44975D03b1b09e64809B757c47f942BEeA", "0xaf204776c7245bF4147c2612BF6e5972Ee483701"]:
+                sdai = Sdai(blockchain, snapshot.block)
+                calls = [sdai.contract.functions.balanceOf(wallet) for wallet in wallets]
+            elif address == "0x373238337Bfe1146fb49989fc222523f83081dDb":
+                dsr = DsrManager(blockchain, snapshot.block)
+                calls = [dsr.contract.functions.pieOf(wallet) for wallet in wallets]
+        snapshot.prefetch(calls)
+        return {
+            wallet: get_protocol_data_for(blockchain, wallet, lptoken_address, snapshot.block, decimals)
+            for wallet in wallets
+        }
+
+
 def get_protocol_data(blockchain: str, wallet: str, block: int | str = "latest", decimals: bool = True) -> dict:
     """
     TODO: Add documentation
@@ -312,7 +345,7 @@ def reduce_sdai(
         raise ValueError(f"Token address {underlying_token_address} is not a valid sDAI address.")
 
     sdai_contract = Sdai(blockchain, block)
-    sdai_token = Token(sdai_contract.address, blockchain, block)
+    sdai_token = Token.get_instance(sdai_contract.address, blockchain, block)
 
     # In case the amount is in teu just convert it to ETH else convert it to teu and then to ETH
     if teu:
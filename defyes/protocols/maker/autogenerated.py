@@ -11,10 +11,10 @@ class ProxyRegistry(ProxyRegistry):
     ...
 """
 
-from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.generator import load_abi
+from defyes.functions import get_contract
+from defyes.generator import load_abi_json
 
 
 class ProxyRegistry:
@@ -34,8 +34,7 @@ class ProxyRegistry:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "proxy_registry.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "proxy_registry.json"))
 
     def proxies(self, arg0: str) -> str:
         return self.contract.functions.proxies(arg0).call(block_identifier=self.block)
@@ -58,8 +57,7 @@ class CdpManager:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "cdp_manager.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "cdp_manager.json"))
 
     def cdp_can(self, arg0: str, arg1: int, arg2: str) -> int:
         return self.contract.functions.cdpCan(arg0, arg1, arg2).call(block_identifier=self.block)
@@ -117,8 +115,7 @@ class IlkRegistry:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "ilk_registry.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "ilk_registry.json"))
 
     @property
     def cat(self) -> str:
@@ -207,8 +204,7 @@ class Vat:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "vat.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "vat.json"))
 
     @property
     def line(self) -> int:
@@ -271,8 +267,7 @@ class McdSpot:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "mcd_spot.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "mcd_spot.json"))
 
     def ilks(self, arg0: bytes) -> tuple[str, int]:
         """
@@ -313,8 +308,7 @@ class Pot:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "pot.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "pot.json"))
 
     @property
     def pie(self) -> int:
@@ -375,8 +369,7 @@ class DsrManager:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "dsr_manager.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "dsr_manager.json"))
 
     @property
     def dai(self) -> str:
@@ -415,8 +408,7 @@ class Sdai:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "sdai.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "sdai.json"))
 
     @property
     def domain_separator(self) -> bytes:
@@ -531,8 +523,7 @@ class Iou:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "iou.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "iou.json"))
 
     def allowance(self, arg0: str, arg1: str) -> int:
         return self.contract.functions.allowance(arg0, arg1).call(block_identifier=self.block)
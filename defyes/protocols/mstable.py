@@ -1,9 +1,9 @@
 from decimal import Decimal
 
-from karpatkit.cache import const_call
 from karpatkit.node import get_node
 from web3 import Web3
 
+from defyes.cache import const_call
 from defyes.functions import get_contract
 
 BASIC_META_VAULT = "0x6d68f5b8c22a549334ca85960978f9de4deba2d3"
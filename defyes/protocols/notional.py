@@ -3,11 +3,11 @@ from typing import List, Tuple
 
 from defabipedia import Chain
 from defabipedia.tokens import EthereumTokenAddr
-from karpatkit.cache import const_call
 from karpatkit.explorer import ChainExplorer
 from karpatkit.node import get_node
 from web3 import Web3
 
+from defyes.cache import const_call
 from defyes.functions import get_contract, to_token_amount
 
 NPROXY_Chain = "0x1344A36A1B56144C3Bc62E7757377D288fDE0369"
@@ -11,10 +11,10 @@ class EthVault(EthVault):
     ...
 """
 
-from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.generator import load_abi
+from defyes.functions import get_contract
+from defyes.generator import load_abi_json
 
 
 class EthVault:
@@ -34,8 +34,7 @@ class EthVault:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "eth_vault.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "eth_vault.json"))
 
     @property
     def upgrade_interface_version(self) -> str:
@@ -3,11 +3,11 @@ from typing import List, Tuple
 
 from defabipedia import Chain
 from defabipedia.tokens import GnosisTokenAddr, PolygonTokenAddr
-from karpatkit.cache import const_call
 from karpatkit.explorer import ChainExplorer
 from karpatkit.node import get_node
 from web3 import Web3
 
+from defyes.cache import const_call
 from defyes.functions import get_contract, get_decimals, to_token_amount
 
 # QiDao Vaults List
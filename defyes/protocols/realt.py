@@ -1,9 +1,9 @@
 from decimal import Decimal
 
-from karpatkit.cache import const_call
 from karpatkit.node import get_node
 from web3 import Web3
 
+from defyes.cache import const_call
 from defyes.functions import get_contract
 
 # RealT Token Address
@@ -13,6 +13,7 @@ from web3 import Web3
 
 from defyes.functions import ensure_a_block_number, to_token_amount
 from defyes.prices import Chainlink as chainlink
+from defyes.prices.lending import publish_prices
 from defyes.protocols.spark.autogenerated import (
     IncentivesController,
     LendingPool,
@@ -185,12 +186,13 @@ def get_full_financial_metrics(wallet: Addr, block: int | str, blockchain: Chain
         "debts": (debts := []),
     }
 
-    currency_unit = Decimal(pap.price_oracle_contract.base_currency_unit)
-    for underlying in ProtocolDataProvider(blockchain, block).underlyings(wallet):
+    underlyings = list(ProtocolDataProvider(blockchain, block).underlyings(wallet))
+    prices = get_oracle_prices(block, blockchain, assets=[str(underlying.token) for underlying in underlyings], pap=pap)
+    for underlying in underlyings:
         asset = {
             "token_address": str(underlying.token),
             "token_amount": abs(underlying.as_dict(decimals)["balance"]),
-            "token_price_usd": pap.price_oracle_contract.get_asset_price(underlying.token) / currency_unit,
+            "token_price_usd": prices[Web3.to_checksum_address(str(underlying.token))],
         }
         if underlying.amount < 0:
             debts.append(asset)
@@ -200,6 +202,27 @@ def get_full_financial_metrics(wallet: Addr, block: int | str, blockchain: Chain
     return ret
 
 
+def get_oracle_prices(
+    block: int | str, blockchain: Chain, assets: list[str] | None = None, pap: PoolAddressesProvider | None = None
+) -> dict[str, Decimal]:
+    """Get the USD price of every reserve (or just of the assets) with a single getAssetsPrices call to the Spark
+    price oracle. The prices are published to the price cache for get_price and get_prices."""
+    block = ensure_a_block_number(block, blockchain)
+    if pap is None:
+        pap = PoolAddressesProvider(blockchain, block)
+    if assets is None:
+        assets = [str(token) for _, token in ProtocolDataProvider(blockchain, block).all_reserves_tokens]
+    assets = [Web3.to_checksum_address(asset) for asset in assets]
+    if not assets:
+        return {}
+
+    currency_unit = Decimal(pap.price_oracle_contract.base_currency_unit)
+    raw_prices = pap.price_oracle_contract.get_assets_prices(assets)
+    prices = {asset: raw_price / currency_unit for asset, raw_price in zip(assets, raw_prices)}
+    publish_prices(prices, block, blockchain, "spark")
+    return prices
+
+
 def get_rewards(wallet: Addr, block: int | str, blockchain: Chain, decimals: bool = True) -> dict:
     """Get rewards from the IncentivesController contract.
     https://devs.spark.fi/sparklend/periphery-contracts/rewardscontroller"""
@@ -11,11 +11,11 @@ class PoolAddressesProvider(PoolAddressesProvider):
     ...
 """
 
-from karpatkit.cache import const_call
-from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.generator import load_abi
+from defyes.cache import const_call
+from defyes.functions import get_contract
+from defyes.generator import load_abi_json
 
 
 class PoolAddressesProvider:
@@ -35,8 +35,9 @@ class PoolAddressesProvider:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "pool_addresses_provider.json"))
+        self.contract = get_contract(
+            self.address, blockchain, abi=load_abi_json(__file__, "pool_addresses_provider.json")
+        )
 
     @property
     def get_acl_admin(self) -> str:
@@ -95,8 +96,7 @@ class LendingPool:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "lending_pool.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "lending_pool.json"))
 
     @property
     def addresses_provider(self) -> str:
@@ -179,8 +179,7 @@ class PriceOracle:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "price_oracle.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "price_oracle.json"))
 
     @property
     def addresses_provider(self) -> str:
@@ -225,8 +224,9 @@ class ProtocolDataProvider:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "protocol_data_provider.json"))
+        self.contract = get_contract(
+            self.address, blockchain, abi=load_abi_json(__file__, "protocol_data_provider.json")
+        )
 
     @property
     def addresses_provider(self) -> str:
@@ -338,8 +338,7 @@ class VariableDebtToken:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "variable_debt_token.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "variable_debt_token.json"))
 
     @property
     def debt_token_revision(self) -> int:
@@ -428,8 +427,9 @@ class IncentivesController:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "incentives_controller.json"))
+        self.contract = get_contract(
+            self.address, blockchain, abi=load_abi_json(__file__, "incentives_controller.json")
+        )
 
     @property
     def emission_manager(self) -> str:
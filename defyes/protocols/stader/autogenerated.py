@@ -11,10 +11,10 @@ class DepositPool(DepositPool):
     ...
 """
 
-from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.generator import load_abi
+from defyes.functions import get_contract
+from defyes.generator import load_abi_json
 
 
 class DepositPool:
@@ -34,8 +34,7 @@ class DepositPool:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "deposit_pool.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "deposit_pool.json"))
 
     @property
     def burner_role(self) -> bytes:
@@ -106,9 +105,8 @@ class StakingPoolManagerEthx:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(
-            address=self.address, abi=load_abi(__file__, "staking_pool_manager_ethx.json")
+        self.contract = get_contract(
+            self.address, blockchain, abi=load_abi_json(__file__, "staking_pool_manager_ethx.json")
         )
 
     @property
@@ -214,9 +212,8 @@ class StakingPoolManagerMaticx:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(
-            address=self.address, abi=load_abi(__file__, "staking_pool_manager_maticx.json")
+        self.contract = get_contract(
+            self.address, blockchain, abi=load_abi_json(__file__, "staking_pool_manager_maticx.json")
         )
 
     @property
@@ -3,6 +3,7 @@ from web3 import Web3
 from web3.exceptions import ContractLogicError
 
 from defyes.functions import ensure_a_block_number
+from defyes.snapshot import Snapshot
 from defyes.types import Addr, Token, TokenAmount
 
 from .autogenerated import Gauge, Operator, Sdtoken
@@ -77,3 +78,32 @@ def get_protocol_data_for(
     data["unclaimed_rewards"] = gauge.get_rewards(wallet)
 
     return data
+
+
+def get_protocol_data_for_wallets(
+    blockchain: str, wallets: list[str], lptoken_address: str, block: int | str = "latest", decimals: bool = True
+) -> dict[str, dict]:
+    """
+    Batch version of get_protocol_data_for. The sdToken, operator and gauge are resolved once and the gauge balances
+    of every wallet are fetched in a single Multicall.
+
+    Returns:
+        dict[str, dict]: The data of every wallet, by wallet address.
+    """
+    wallets = [Web3.to_checksum_address(wallet) for wallet in wallets]
+    lptoken_address = Web3.to_checksum_address(lptoken_address)
+    if lptoken_address not in TOKEN_ADDRS[blockchain]:
+        raise ValueError(f"Wrong sdtoken provided ({lptoken_address}) for {blockchain}")
+
+    with Snapshot(blockchain, block) as snapshot:
+        sd_token = Sdtoken(blockchain, snapshot.block, lptoken_address)
+        try:
+            operator_addr = sd_token.operator
+        except ContractLogicError:
+            operator_addr = sd_token.minter
+        gauge = Gauge(blockchain, snapshot.block, Operator(blockchain, snapshot.block, operator_addr).gauge)
+        snapshot.prefetch([gauge.contract.functions.balanceOf(wallet) for wallet in wallets])
+        return {
+            wallet: get_protocol_data_for(blockchain, wallet, lptoken_address, snapshot.block, decimals)
+            for wallet in wallets
+        }
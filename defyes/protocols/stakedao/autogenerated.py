@@ -11,10 +11,10 @@ class Sdtoken(Sdtoken):
     ...
 """
 
-from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.generator import load_abi
+from defyes.functions import get_contract
+from defyes.generator import load_abi_json
 
 
 class Sdtoken:
@@ -34,8 +34,7 @@ class Sdtoken:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "sdtoken.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "sdtoken.json"))
 
     @property
     def minter(self) -> str:
@@ -97,8 +96,7 @@ class Operator:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "operator.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "operator.json"))
 
     @property
     def fee_denominator(self) -> int:
@@ -154,8 +152,7 @@ class Gauge:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "gauge.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "gauge.json"))
 
     @property
     def decimals(self) -> int:
@@ -11,10 +11,10 @@ class OsTokenVaultController(OsTokenVaultController):
     ...
 """
 
-from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.generator import load_abi
+from defyes.functions import get_contract
+from defyes.generator import load_abi_json
 
 
 class OsTokenVaultController:
@@ -34,9 +34,8 @@ class OsTokenVaultController:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(
-            address=self.address, abi=load_abi(__file__, "os_token_vault_controller.json")
+        self.contract = get_contract(
+            self.address, blockchain, abi=load_abi_json(__file__, "os_token_vault_controller.json")
         )
 
     @property
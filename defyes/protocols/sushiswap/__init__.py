@@ -7,7 +7,6 @@ from pathlib import Path
 from typing import List, Tuple
 
 from defabipedia import Chain
-from karpatkit.cache import const_call
 from karpatkit.constants import Address
 from karpatkit.explorer import ChainExplorer
 from karpatkit.helpers import suppress_error_codes
@@ -15,6 +14,7 @@ from karpatkit.node import get_node
 from web3 import Web3
 from web3.exceptions import ABIFunctionNotFound, BadFunctionCallOutput, ContractLogicError
 
+from defyes.cache import const_call
 from defyes.functions import get_contract, get_decimals, get_logs_web3, last_block, to_token_amount
 from defyes.lazytime import Duration, Time
 from defyes.prices.prices import get_price
@@ -4,12 +4,12 @@ from pathlib import Path
 from typing import List, Tuple
 
 from defabipedia import Chain
-from karpatkit.cache import const_call
 from karpatkit.node import get_node
 from tqdm import tqdm
 from web3 import Web3
 from web3.exceptions import BadFunctionCallOutput, ContractLogicError
 
+from defyes.cache import const_call
 from defyes.functions import get_contract, get_decimals, get_logs_web3
 
 # Staking Rewards Contract ETHEREUM
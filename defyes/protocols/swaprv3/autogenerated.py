@@ -11,10 +11,10 @@ class AlgebraFactory(AlgebraFactory):
     ...
 """
 
-from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.generator import load_abi
+from defyes.functions import get_contract
+from defyes.generator import load_abi_json
 
 
 class AlgebraFactory:
@@ -34,8 +34,7 @@ class AlgebraFactory:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "algebra_factory.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "algebra_factory.json"))
 
     @property
     def base_fee_configuration(self) -> tuple[int, int, int, int, int, int, int, int, int]:
@@ -86,8 +85,7 @@ class AlgebraPool:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "algebra_pool.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "algebra_pool.json"))
 
     @property
     def active_incentive(self) -> str:
@@ -199,8 +197,7 @@ class AlgebraPositionNft:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "algebra_position_nft.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "algebra_position_nft.json"))
 
     @property
     def domain_separator(self) -> bytes:
@@ -2,12 +2,12 @@ import logging
 from decimal import Decimal
 
 from defabipedia import Chain
-from karpatkit.cache import const_call
 from karpatkit.constants import Address
 from karpatkit.node import get_node
 from web3 import Web3
 from web3.exceptions import ContractLogicError
 
+from defyes.cache import const_call
 from defyes.functions import BlockchainError, get_contract, last_block, to_token_amount
 
 logger = logging.getLogger(__name__)
@@ -11,11 +11,11 @@ class LpToken(LpToken):
     ...
 """
 
-from karpatkit.cache import const_call
-from karpatkit.node import get_node
 from web3 import Web3
 
-from defyes.generator import load_abi
+from defyes.cache import const_call
+from defyes.functions import get_contract
+from defyes.generator import load_abi_json
 
 
 class LpToken:
@@ -35,8 +35,7 @@ class LpToken:
                 raise ValueError(
                     f"{blockchain!r} not defined in default_addresses when trying to guess the address."
                 ) from e
-        node = get_node(blockchain)
-        self.contract = node.eth.contract(address=self.address, abi=load_abi(__file__, "lp_token.json"))
+        self.contract = get_contract(self.address, blockchain, abi=load_abi_json(__file__, "lp_token.json"))
 
     @property
     def decimals(self) -> int:
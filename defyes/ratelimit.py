@@ -0,0 +1,55 @@
+"""
+# Rate limit
+
+`TokenBucket` is a thread-safe token-bucket rate limiter shared by every caller of a rate-limited API. Each request
+takes a token, tokens refill at a steady rate up to the bucket capacity (the allowed burst), and `acquire()` blocks
+just the time needed for the next token. When the API answers "too many requests", `pause()` drains the bucket so all
+the callers back off together.
+
+    limiter = TokenBucket(rate=0.5, capacity=10)  # 30 requests per minute, bursts of 10
+    limiter.acquire()
+    response = requests.get(url)
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter.
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (float): Max number of tokens in the bucket, that is, the max burst of requests.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def acquire(self, tokens: float = 1) -> None:
+        """Take the tokens from the bucket, blocking until they are available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.updated <= now and self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = max(self.updated - now, 0) + max(tokens - self.tokens, 0) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Empty the bucket and stop refilling it for the given seconds."""
+        with self._lock:
+            self.tokens = 0
+            self.updated = max(self.updated, time.monotonic() + seconds)
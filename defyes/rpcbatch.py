@@ -0,0 +1,250 @@
+"""
+# RPC Batch
+
+Coalesce JSON-RPC requests which can't be aggregated inside a contract (`eth_getStorageAt`, `eth_getCode`,
+`eth_getBalance`, `eth_getTransactionReceipt`, ...) into JSON-RPC batch arrays.
+
+Every request returns a `BatchedRequest` right away. The queue is sent when it reaches `max_batch_size` requests, when
+`flush_interval` seconds have passed since the first queued request, when the batch is explicitly flushed (or the
+context manager exits) or when the result of a still queued request is needed.
+
+    with RPCBatch(Chain.ETHEREUM) as batch:
+        code = batch.get_code(address, block)
+        slot = batch.get_storage_at(address, IMPLEMENTATION_SLOT, block)
+    code.result(), slot.result()
+
+Errors are mapped back to the request which caused them: `result()` raises the same `ValueError(error)` web3 raises
+for a failed single request.
+
+A batch is sent through the provider `make_batch_request()` when it has one, or posted to its HTTP endpoint (to every
+endpoint of a provider manager in turn, from the current one, as failover). When it can't be sent as a batch, its
+requests are sent one by one through the web3 request manager, so they go through the middlewares as usual.
+"""
+
+import json
+import logging
+import threading
+
+from karpatkit.node import get_node
+from requests.exceptions import RequestException
+from web3 import Web3
+from web3._utils.method_formatters import PYTHONIC_RESULT_FORMATTERS
+from web3._utils.request import make_post_request
+from web3.datastructures import AttributeDict
+
+logger = logging.getLogger(__name__)
+
+# Default max number of requests sent in a single JSON-RPC batch array.
+MAX_BATCH_SIZE = 100
+
+# Default seconds a queued request waits for other requests before the batch is sent.
+FLUSH_INTERVAL = 0.05
+
+# Max seconds `result()` waits for a batch being sent by another thread.
+RESULT_TIMEOUT = 120
+
+
+def block_param(block: int | str) -> str:
+    return hex(block) if isinstance(block, int) else block
+
+
+def batch_providers(provider) -> list:
+    """
+    Return the HTTP providers a batch array can be posted to, in failover order: the provider itself, or the
+    `providers` of a provider manager.
+    """
+    if getattr(provider, "endpoint_uri", None) is not None:
+        return [provider]
+    return [p for p in getattr(provider, "providers", None) or () if getattr(p, "endpoint_uri", None) is not None]
+
+
+def post_batch(provider, requests: list[tuple[str, list]]) -> list[dict]:
+    """Post the (method, params) requests to the HTTP provider in a batch array and return the responses in order."""
+    payload = [
+        {"jsonrpc": "2.0", "method": method, "params": params, "id": n} for n, (method, params) in enumerate(requests)
+    ]
+    raw_response = make_post_request(
+        provider.endpoint_uri, json.dumps(payload).encode(), **dict(provider.get_request_kwargs())
+    )
+    response = json.loads(raw_response)
+    if not isinstance(response, list):
+        raise ValueError(response.get("error", response))
+
+    responses_by_id = {item.get("id"): item for item in response}
+    missing = {"error": {"code": -32603, "message": "Missing response in the JSON-RPC batch."}}
+    return [responses_by_id.get(n, missing) for n in range(len(requests))]
+
+
+def format_result(method: str, result):
+    formatter = PYTHONIC_RESULT_FORMATTERS.get(method)
+    if formatter is not None:
+        result = formatter(result)
+    if isinstance(result, dict):
+        result = AttributeDict.recursive(result)
+    return result
+
+
+class BatchedRequest:
+    """A JSON-RPC request queued in a RPCBatch."""
+
+    def __init__(self, batch: "RPCBatch", method: str, params: list):
+        self.batch = batch
+        self.method = method
+        self.params = params
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.method} {'done' if self.done else 'pending'}>"
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def set_response(self, response: dict):
+        try:
+            if "error" in response:
+                self._error = ValueError(response["error"])
+            else:
+                self._result = format_result(self.method, response.get("result"))
+        except Exception as e:
+            self._error = e
+        self._done.set()
+
+    def set_error(self, error: Exception):
+        self._error = error
+        self._done.set()
+
+    def result(self):
+        """
+        Return the formatted result of the request, sending the batch first if needed.
+
+        Raises:
+            ValueError: With the JSON-RPC error of this very request.
+            TimeoutError: If the batch sent by another thread isn't answered within RESULT_TIMEOUT seconds.
+        """
+        if not self.done:
+            self.batch.flush()
+            if not self._done.wait(RESULT_TIMEOUT):
+                raise TimeoutError(f"{self!r} not answered in {RESULT_TIMEOUT} seconds.")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class RPCBatch:
+    """
+    Queue of JSON-RPC requests sent as batch arrays.
+
+    Args:
+        blockchain (str): The blockchain where the requests are made.
+        web3 (Web3, optional): The Web3 instance to use. If not provided, a default instance will be used.
+        max_batch_size (int, optional): Max number of requests per batch array. Defaults to MAX_BATCH_SIZE.
+        flush_interval (float | None, optional): Seconds to wait for more requests before sending a batch.
+            None disables the timer, so batches are just sent when full or explicitly flushed.
+            Defaults to FLUSH_INTERVAL.
+    """
+
+    def __init__(
+        self,
+        blockchain: str,
+        web3: Web3 = None,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        flush_interval: float | None = FLUSH_INTERVAL,
+    ):
+        if web3 is None:
+            web3 = get_node(blockchain)
+        self.blockchain = blockchain
+        self.web3 = web3
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.queue: list[BatchedRequest] = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def request(self, method: str, params: list) -> BatchedRequest:
+        """Queue a raw JSON-RPC request."""
+        batched_request = BatchedRequest(self, method, params)
+        with self._lock:
+            self.queue.append(batched_request)
+            full = len(self.queue) >= self.max_batch_size
+            if not full and self.flush_interval is not None and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+        return batched_request
+
+    def get_storage_at(self, address: str, position: int | str, block: int | str = "latest") -> BatchedRequest:
+        position = hex(position) if isinstance(position, int) else position
+        return self.request("eth_getStorageAt", [Web3.to_checksum_address(address), position, block_param(block)])
+
+    def get_code(self, address: str, block: int | str = "latest") -> BatchedRequest:
+        return self.request("eth_getCode", [Web3.to_checksum_address(address), block_param(block)])
+
+    def get_balance(self, address: str, block: int | str = "latest") -> BatchedRequest:
+        return self.request("eth_getBalance", [Web3.to_checksum_address(address), block_param(block)])
+
+    def get_transaction_receipt(self, tx_hash: str) -> BatchedRequest:
+        """The result is None when the transaction is unknown."""
+        tx_hash = tx_hash if isinstance(tx_hash, str) else Web3.to_hex(tx_hash)
+        return self.request("eth_getTransactionReceipt", [tx_hash])
+
+    def flush(self) -> None:
+        """Send every queued request, in batch arrays of at most `max_batch_size` requests."""
+        with self._lock:
+            queue, self.queue = self.queue, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        try:
+            for start in range(0, len(queue), self.max_batch_size):
+                self._send(queue[start : start + self.max_batch_size])
+        except Exception as e:
+            # The requests not answered yet would wait forever otherwise
+            for batched_request in queue:
+                if not batched_request.done:
+                    batched_request.set_error(e)
+            raise
+
+    def _send(self, chunk: list[BatchedRequest]) -> None:
+        responses = self._post(chunk)
+        if responses is None:
+            logger.warning("JSON-RPC batch not sent. Sending %d single requests.", len(chunk))
+            responses = [self.web3.manager._make_request(item.method, item.params) for item in chunk]
+
+        for batched_request, response in zip(chunk, responses):
+            batched_request.set_response(response)
+
+    def _post(self, chunk: list[BatchedRequest]) -> list[dict] | None:
+        """Send the chunk as a batch array and return the responses in order, or None if it couldn't be sent."""
+        provider = self.web3.provider
+        requests = [(item.method, item.params) for item in chunk]
+        if hasattr(provider, "make_batch_request"):
+            try:
+                responses = provider.make_batch_request(requests)
+            except (RequestException, ValueError) as e:
+                logger.warning("JSON-RPC batch request failed (%s).", e)
+                return None
+            if not isinstance(responses, list) or len(responses) != len(chunk):
+                logger.warning("JSON-RPC batch request failed (%s).", responses)
+                return None
+            return responses
+
+        providers = batch_providers(provider)
+        if not providers:
+            logger.warning("Provider %s can't send JSON-RPC batches.", provider)
+        for http_provider in providers:
+            try:
+                return post_batch(http_provider, requests)
+            except (RequestException, ValueError) as e:
+                logger.warning("JSON-RPC batch request to %s failed (%s).", http_provider.endpoint_uri, e)
+        return None
@@ -0,0 +1,191 @@
+"""
+# Snapshot
+
+Block-pinned session shared by every protocol call made inside it.
+
+While a `Snapshot` is active (it's kept in a contextvar, so it's picked up without threading it through the calls):
+
+- `ensure_a_block_number(block="latest", blockchain)` resolves to the snapshot block instead of asking the node.
+- Every `eth_call` sent through the snapshot node at the snapshot block is memoized, so the same price feed,
+  `decimals()` or registry lookup is requested just once, no matter how many protocols read it.
+- `Snapshot.token()` and `Snapshot.memoize()` hold the Token instances and resolved addresses of the session.
+  `Token.get_instance()` returns the snapshot tokens, so the protocols share them without any change.
+- `Snapshot.prefetch()` sends many calls (e.g. the balance of every wallet) in a single Multicall and memoizes their
+  results, so the following one-by-one reads don't reach the node.
+
+Everything is released when the context exits, so memory stays bounded along a long backfill.
+
+    with Snapshot(Chain.ETHEREUM, block) as snapshot:
+        for protocol in protocols:
+            results.append(protocol.get_protocol_data_for(Chain.ETHEREUM, wallet, snapshot.block))
+"""
+
+import logging
+import threading
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, Callable, Hashable
+
+from defabipedia import Blockchain
+from karpatkit.node import get_node
+from web3 import Web3
+
+if TYPE_CHECKING:
+    from defyes.types import Token
+
+logger = logging.getLogger(__name__)
+
+current_snapshot: ContextVar["Snapshot | None"] = ContextVar("current_snapshot", default=None)
+
+# Guards the install of the snapshot middleware on the web3 instances shared by the threads
+_middleware_lock = threading.Lock()
+
+
+def get_snapshot(blockchain: Blockchain, block: int | str | None = None) -> "Snapshot | None":
+    """Return the active snapshot if it's pinned to the given blockchain (and block, if provided)."""
+    snapshot = current_snapshot.get()
+    if snapshot is None or snapshot.blockchain != blockchain:
+        return None
+    if block is not None and block != "latest" and block != snapshot.block:
+        return None
+    return snapshot
+
+
+def block_from_param(block_identifier) -> int | None:
+    if isinstance(block_identifier, int):
+        return block_identifier
+    if isinstance(block_identifier, str) and block_identifier.startswith("0x"):
+        return int(block_identifier, 16)
+    return None
+
+
+def call_key(transaction: dict) -> tuple:
+    """Return the memo key of an eth_call transaction."""
+    return (str(transaction.get("to", "")).lower(), str(transaction.get("data", "")).lower(), transaction.get("from"))
+
+
+def snapshot_middleware(make_request, w3):
+    """Web3 middleware memoizing the eth_calls made at the block of the active snapshot of this node."""
+
+    def middleware(method, params):
+        snapshot = current_snapshot.get()
+        if method != "eth_call" or snapshot is None or snapshot.web3 is not w3 or len(params) < 2:
+            return make_request(method, params)
+        if block_from_param(params[1]) != snapshot.block:
+            return make_request(method, params)
+
+        key = call_key(params[0])
+        try:
+            return snapshot.calls[key]
+        except KeyError:
+            pass
+        response = make_request(method, params)
+        if "error" not in response:
+            snapshot.calls[key] = response
+        return response
+
+    return middleware
+
+
+def install_snapshot_middleware(web3: Web3) -> None:
+    """Add the snapshot middleware to the web3 instance, unless it's already there."""
+    with _middleware_lock:
+        if "snapshot" not in web3.middleware_onion:
+            web3.middleware_onion.add(snapshot_middleware, "snapshot")
+
+
+class Snapshot:
+    """
+    Block-pinned session holding the memos of the eth_call results, Token instances and resolved addresses.
+
+    Args:
+        blockchain (Blockchain): The blockchain of the snapshot.
+        block (int | str): The block number or 'latest', resolved once when the snapshot is created.
+        web3 (Web3, optional): The Web3 instance to use. If not provided, a default instance will be used.
+    """
+
+    def __init__(self, blockchain: Blockchain, block: int | str, web3: Web3 = None):
+        if web3 is None:
+            web3 = get_node(blockchain)
+        if block == "latest":
+            block = web3.eth.block_number
+        elif not isinstance(block, int):
+            raise ValueError("block should be an integer or just the string 'latest'")
+        self.blockchain = blockchain
+        self.web3 = web3
+        self.block = block
+        self.calls: dict[tuple, dict] = {}
+        self.tokens: dict[str, "Token"] = {}
+        self.memos: dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+        self._context_token = None
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.blockchain} {self.block}>"
+
+    def __enter__(self):
+        install_snapshot_middleware(self.web3)
+        self._context_token = current_snapshot.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        current_snapshot.reset(self._context_token)
+        self._context_token = None
+        logger.debug(
+            "Snapshot %s released: %d eth_calls, %d tokens, %d memos.",
+            self,
+            len(self.calls),
+            len(self.tokens),
+            len(self.memos),
+        )
+        self.clear()
+
+    def clear(self) -> None:
+        self.calls.clear()
+        self.tokens.clear()
+        self.memos.clear()
+
+    def prefetch(self, contract_functions: list) -> None:
+        """
+        Send the calls of the web3 ContractFunctions (already bound to their arguments) in a single Multicall at the
+        snapshot block and memoize the successful results. Reverted calls aren't memoized, so they raise as usual when
+        they are made later.
+        """
+        # Imported here because defyes.multicall depends on defyes.functions, which depends on this module.
+        from defyes.multicall import Multicall
+
+        keys = [
+            call_key({"to": function.address, "data": function._encode_transaction_data()})
+            for function in contract_functions
+        ]
+        multicall = Multicall(self.blockchain, self.block, web3=self.web3)
+        pending = {
+            key: multicall.add(function) for key, function in zip(keys, contract_functions) if key not in self.calls
+        }
+        multicall.execute()
+        for key, pending_call in pending.items():
+            if pending_call.success:
+                self.calls[key] = {"jsonrpc": "2.0", "id": 0, "result": "0x" + pending_call.return_data.hex()}
+
+    def token(self, address: str) -> "Token":
+        """Return the Token instance of the address at the snapshot block."""
+        # Imported here because defyes.types depends on the autogenerated contracts, which depend on defyes.functions.
+        from defyes.types import Token
+
+        address = Web3.to_checksum_address(address)
+        try:
+            return self.tokens[address]
+        except KeyError:
+            with self._lock:
+                return self.tokens.setdefault(address, Token(address, self.blockchain, self.block))
+
+    def memoize(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """
+        Return `func(*args, **kwargs)`, computed just once per key during the snapshot. Useful for resolved addresses
+        (registries, pools, gauges, ...) read by many protocols.
+        """
+        try:
+            return self.memos[key]
+        except KeyError:
+            value = func(*args, **kwargs)
+            with self._lock:
+                return self.memos.setdefault(key, value)
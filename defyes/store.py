@@ -0,0 +1,21 @@
+"""
+# Store
+
+Persistent on-disk stores (indexes, histories, price points...) built by defyes itself, as opposed to the cache of
+web3 calls handled by karpatkit.
+
+Every store is a `diskcache.Cache` living in its own directory below `DEFYES_STORE_DIR` (by default `/tmp/defyes/`).
+"""
+
+import os
+from functools import cache
+
+import diskcache
+
+STORE_DIR = os.environ.get("DEFYES_STORE_DIR", "/tmp/defyes")
+
+
+@cache
+def get_store(name: str) -> diskcache.Cache:
+    """Return the store with the given name, creating it if needed."""
+    return diskcache.Cache(os.path.join(STORE_DIR, name))
@@ -6,6 +6,7 @@ from karpatkit.constants import Address
 from web3 import Web3
 
 from .contracts import Erc20
+from .snapshot import get_snapshot
 
 simple_repr = True
 
@@ -79,8 +80,12 @@ class Token(Addr):
     @classmethod
     def get_instance(cls, addr: int | str, chain: Blockchain = Chain.ETHEREUM, block: int | str = "latest"):
         """
-        Return the cached token, otherwise create a new instance and cache it.
+        Return the token of the active snapshot pinned to the chain and block (see `defyes.snapshot`), otherwise the
+        cached token, creating a new instance and caching it if needed.
         """
+        snapshot = get_snapshot(chain, block)
+        if snapshot is not None and cls is Token:
+            return snapshot.token(addr)
         try:
             return cls._cache[addr, chain]
         except KeyError:
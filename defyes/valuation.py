@@ -0,0 +1,266 @@
+"""
+# Valuation
+
+Streaming valuation of wallet positions over a range of blocks:
+
+    blocks -> per-block snapshot of the positions -> priced balances -> NAV of the block
+
+Every stage is a generator, so a multi-year daily series is valued one block at a time and memory stays flat. The
+positions of the next `prefetch` blocks are read in worker threads (each block inside its own `Snapshot`) while the
+current block is being priced, so the node latency of consecutive blocks overlaps instead of adding up.
+
+    sources = [
+        PositionSource("compoundv3", wallet, partial(compoundv3.get_protocol_data_for, Chain.ETHEREUM, wallet, cUSDCv3)),
+        PositionSource("spark", wallet, lambda block: spark.get_protocol_data(Chain.ETHEREUM, wallet, block)),
+    ]
+    for valuation in value_positions(Chain.ETHEREUM, block_range(start, end, step=7200), sources):
+        print(valuation.block, valuation.nav)
+
+The balances are taken from any of the protocol output layouts (`ProtocolData`, the dicts of lists of
+{"address", "balance"} or {"token_address", "token_amount"} and lists of `TokenAmount`), so the protocols must be asked
+for balances with decimals. The collaterals add to the NAV and the debts subtract from it. Lists of balances under any
+other field are left out with a warning.
+"""
+
+import itertools
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, Callable, Iterable, Iterator, NamedTuple
+
+from defabipedia import Blockchain
+from web3 import Web3
+
+from defyes.prices.prices import get_prices
+from defyes.protocols import ProtocolData
+from defyes.snapshot import Snapshot
+from defyes.types import TokenAmount
+
+logger = logging.getLogger(__name__)
+
+# Fields of the protocol outputs holding the debts of the wallet, reported with negative balances. compoundv3 reports
+# its debt as "borrowred".
+DEBT_FIELDS = ("debts", "borrowed", "borrowred")
+
+# Fields of the protocol outputs holding token balances (lists of them, or a single one).
+BALANCE_FIELDS = ("holdings", "underlyings", "unclaimed_rewards", "rewards", "collaterals") + DEBT_FIELDS
+
+# Fields added up in the NAV. The holdings are left out since they are the LP / receipt tokens backing the
+# underlyings, which would count the same value twice.
+VALUED_FIELDS = ("underlyings", "unclaimed_rewards", "rewards", "collaterals") + DEBT_FIELDS
+
+# Default number of blocks whose positions are read ahead of the block being priced.
+PREFETCH_BLOCKS = 4
+
+
+@dataclass(frozen=True)
+class PositionSource:
+    """
+    Positions of a wallet in a protocol.
+
+    Args:
+        protocol (str): Name of the protocol, as reported in the valuations.
+        wallet (str): The wallet address.
+        get_data (Callable[[int], Any]): Returns the protocol output of the wallet at the given block, e.g. a partial of
+            the `get_protocol_data_for` of the protocol.
+    """
+
+    protocol: str
+    wallet: str
+    get_data: Callable[[int], Any]
+
+
+class PositionBalance(NamedTuple):
+    position_key: str
+    position_type: str | None
+    field: str
+    token: str
+    balance: Decimal
+
+
+class PricedBalance(NamedTuple):
+    protocol: str
+    wallet: str
+    position_key: str
+    position_type: str | None
+    field: str
+    token: str
+    balance: Decimal
+    price: Decimal | None
+    price_source: str | None
+
+    @property
+    def value(self) -> Decimal | None:
+        return None if self.price is None else self.balance * self.price
+
+
+@dataclass
+class BlockPositions:
+    blockchain: Blockchain
+    block: int
+    results: list[tuple[PositionSource, Any]] = field(default_factory=list)
+    errors: dict[PositionSource, str] = field(default_factory=dict)
+
+
+@dataclass
+class BlockValuation:
+    blockchain: Blockchain
+    block: int
+    balances: list[PricedBalance]
+    nav: Decimal
+    unpriced: list[str] = field(default_factory=list)
+    errors: dict[PositionSource, str] = field(default_factory=dict)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Balances
+# ----------------------------------------------------------------------------------------------------------------------
+def _balance_item(item) -> tuple[str, Decimal] | None:
+    if isinstance(item, TokenAmount):
+        return str(item.token), item.amount
+    if isinstance(item, dict) and "address" in item and "balance" in item:
+        return item["address"], Decimal(item["balance"])
+    if isinstance(item, dict) and "token_address" in item and "token_amount" in item:
+        return item["token_address"], Decimal(item["token_amount"])
+    if isinstance(item, (list, tuple)) and len(item) == 2 and isinstance(item[0], str):
+        return item[0], Decimal(item[1])
+    return None
+
+
+def iter_balances(data, path: tuple = ()) -> Iterator[PositionBalance]:
+    """
+    Yield the token balances found in a protocol output, without copying it.
+
+    The position key is made of the dict keys leading to the balance, except the position type (one of
+    `ProtocolData.POSITION_TYPES`) and the balance field (one of BALANCE_FIELDS), which are reported apart. The
+    balances of the DEBT_FIELDS are negative.
+    """
+    if isinstance(data, ProtocolData):
+        yield from iter_balances(data.positions, path)
+    elif isinstance(data, dict):
+        for key, value in data.items():
+            if key == "financial_metrics":
+                continue
+            if key in BALANCE_FIELDS and isinstance(value, (list, dict)):
+                position_type = next((step for step in path if step in ProtocolData.POSITION_TYPES), None)
+                position_key = "/".join(str(step) for step in path if step != position_type)
+                for item in value if isinstance(value, list) else [value]:
+                    balance = _balance_item(item)
+                    if balance is not None:
+                        token, amount = balance
+                        amount = -abs(amount) if key in DEBT_FIELDS else amount
+                        yield PositionBalance(position_key, position_type, key, token, amount)
+            elif isinstance(value, list) and any(_balance_item(item) is not None for item in value):
+                logger.warning(f"Balances of the unknown field {key!r} left out of the valuation.")
+            elif isinstance(value, (dict, list, ProtocolData)):
+                yield from iter_balances(value, path + (key,))
+    elif isinstance(data, list):
+        for value in data:
+            yield from iter_balances(value, path)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Stages
+# ----------------------------------------------------------------------------------------------------------------------
+def block_range(start: int, end: int, step: int = 1) -> Iterator[int]:
+    """Yield the blocks from start to end (both included) every step blocks."""
+    return iter(range(start, end + 1, step))
+
+
+def snapshot_positions(
+    blockchain: Blockchain, block: int, sources: Iterable[PositionSource], web3=None
+) -> BlockPositions:
+    """
+    Read the positions of every source at the block, inside a Snapshot shared by all of them. The errors of a source
+    are recorded in the result instead of being raised, so a long backfill goes on.
+    """
+    positions = BlockPositions(blockchain, block)
+    with Snapshot(blockchain, block, web3=web3):
+        for source in sources:
+            try:
+                positions.results.append((source, source.get_data(block)))
+            except Exception as error:
+                logger.warning(f"Failed to read {source.protocol} of {source.wallet} at block {block}: {error!r}")
+                positions.errors[source] = repr(error)
+    return positions
+
+
+def price_positions(positions: BlockPositions, price_source: str | None = None, web3=None) -> BlockValuation:
+    """Price the balances of the positions at their block, with a single get_prices call, and add up the NAV."""
+    balances = [
+        (source, balance) for source, data in positions.results for balance in iter_balances(data) if balance.balance
+    ]
+    tokens = {balance.token for _, balance in balances if balance.field in VALUED_FIELDS}
+    prices = get_prices(list(tokens), positions.block, positions.blockchain, web3=web3, source=price_source)
+
+    priced_balances = []
+    unpriced = set()
+    nav = Decimal(0)
+    for source, balance in balances:
+        price, answered_by, _ = prices.get(Web3.to_checksum_address(balance.token), (None, None, None))
+        price = None if price is None else Decimal(str(price))
+        priced = PricedBalance(source.protocol, source.wallet, *balance, price, answered_by)
+        priced_balances.append(priced)
+        if balance.field in VALUED_FIELDS:
+            if price is None:
+                unpriced.add(balance.token)
+            else:
+                nav += priced.value
+
+    return BlockValuation(
+        positions.blockchain, positions.block, priced_balances, nav, sorted(unpriced), dict(positions.errors)
+    )
+
+
+def run_ahead(func: Callable, items: Iterable, prefetch: int) -> Iterator:
+    """
+    Yield func(item) for every item, in order, computing up to prefetch items ahead in worker threads. Each call runs
+    in a copy of the current context. With prefetch 0 everything runs in the calling thread.
+    """
+    if prefetch <= 0:
+        yield from map(func, items)
+        return
+
+    items = iter(items)
+    executor = ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix="valuation")
+    pending = deque(executor.submit(copy_context().run, func, item) for item in itertools.islice(items, prefetch))
+    try:
+        while pending:
+            future = pending.popleft()
+            for item in itertools.islice(items, 1):
+                pending.append(executor.submit(copy_context().run, func, item))
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def value_positions(
+    blockchain: Blockchain,
+    blocks: Iterable[int],
+    sources: list[PositionSource],
+    prefetch: int = PREFETCH_BLOCKS,
+    price_source: str | None = None,
+    web3=None,
+) -> Iterator[BlockValuation]:
+    """
+    Yield the valuation of the positions of the sources at every block, in order.
+
+    Args:
+        blockchain (Blockchain)
+        blocks (Iterable[int]): The blocks to value, e.g. block_range(start, end, step). It's consumed lazily.
+        sources (list[PositionSource]): The protocol positions of the wallets.
+        prefetch (int, optional): Blocks whose positions are read ahead, in worker threads, while the current one is
+            priced. 0 values every block serially. Defaults to PREFETCH_BLOCKS.
+        price_source (str, optional): First source of the prices, as in get_prices. Defaults to None, that is,
+            chainlink first, also reusing the prices of the lending oracles read by the protocols.
+        web3 (web3, optional): web3 node. Defaults to None.
+    """
+
+    def read_positions(block: int) -> BlockPositions:
+        return snapshot_positions(blockchain, block, sources, web3=web3)
+
+    for positions in run_ahead(read_positions, blocks, prefetch):
+        yield price_positions(positions, price_source=price_source, web3=web3)
@@ -4,6 +4,7 @@ from defabipedia import Chain
 from defabipedia.tokens import EthereumTokenAddr
 
 from defyes import Aave
+from defyes.prices.prices import get_price
 
 STK_AAVE = "0x4da27a545c0c5B758a6BA100e3a049001de870f5"
 STK_ABPT = "0xa1116930326D21fB917d5A27F1E9943A9595fb47"
@@ -94,3 +95,14 @@ def test_get_all_rewards():
 def test_get_all_rewards_abpt():
     data = Aave.get_all_rewards("0x6cf63938f2cd5dfebbde0010bb640ed7fa679693", block=19328476, blockchain=Chain.ETHEREUM)
     assert data == [["0x7Fc66500c84A76Ad7e9c93437bFc5Ac33E2DDaE9", Decimal("8.625794912538402899")]]
+
+
+def test_get_oracle_prices():
+    snx = "0xC011a73ee8576Fb46F5E1c5751cA3B9Fe0af2a6F"
+    prices = Aave.get_oracle_prices(16870553, Chain.ETHEREUM)
+    assert prices[snx] == Decimal("3.0891558")
+    # The oracle prices are reused by the get_price lookups without an explicit source at the same block
+    assert get_price(snx, 16870553, Chain.ETHEREUM) == (3.0891558, "aave_v2", Chain.ETHEREUM)
+    # but never answer an explicitly requested source
+    assert get_price(snx, 16870553, Chain.ETHEREUM, source="chainlink")[1] != "aave_v2"
+    assert get_price(snx, 16870553, Chain.ETHEREUM, source="coingecko")[1] != "aave_v2"
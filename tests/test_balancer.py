@@ -2,6 +2,7 @@ from decimal import Decimal
 
 from defabipedia import Chain
 from defabipedia.tokens import EthereumTokenAddr, GnosisTokenAddr
+from karpatkit.node import get_node
 from web3 import Web3
 
 from defyes import Balancer
@@ -61,6 +62,15 @@ def test_gauge_address():
     ]
 
 
+def test_gauge_index():
+    block = 16978206
+    gauge_index = Balancer.get_gauge_index(
+        Chain.ETHEREUM, "0xf1665E19bc105BE4EDD3739F88315cC699cc5b65", 15399251, get_node(Chain.ETHEREUM)
+    )
+    assert gauge_index.get_gauge(B60WETH40DAI_ADDR, block) == "0x4ca6AC0509E6381Ca7CD872a6cdC0Fbf00600Fa1"
+    assert gauge_index.get_gauge(B60WETH40DAI_ADDR, 15399251) is None
+
+
 def test_pool_balances():
     block = 16978206
     balances = Balancer.pool_balances(Chain.ETHEREUM, B50USDC50WETH_ADDR, block)
@@ -109,6 +119,33 @@ def test_pool_balances():
     assert gno[GnosisTokenAddr.GNO] == Decimal("13.94405206096083141310932405")
 
 
+def test_pool_graph():
+    block = 17117344
+    graph = Balancer.get_pool_graph(Chain.ETHEREUM, block)
+    balances = graph.pool_balances(bbaUSD_ADDR)
+    # The nested linear pools are resolved while unwrapping bb-a-USD and reused afterwards
+    assert {Web3.to_checksum_address(addr) for addr in (bbaUSDT_ADDR, bbaUSDC_ADDR, bbaDAI_ADDR)} <= set(graph.pools)
+    assert Balancer.get_pool_graph(Chain.ETHEREUM, block) is graph
+    assert Balancer.pool_balances(Chain.ETHEREUM, bbaUSD_ADDR, block) == balances
+    assert Balancer.unwrap(Chain.ETHEREUM, bbaUSDT_ADDR, 1, block) == graph.unwrap(bbaUSDT_ADDR, 1)
+
+
+def test_pool_graph_load():
+    block = 17117344
+    graph = Balancer.PoolGraph(Chain.ETHEREUM, block)
+    graph.load([bbaUSD_ADDR])
+    assert {Web3.to_checksum_address(addr) for addr in (bbaUSD_ADDR, bbaUSDT_ADDR, bbaUSDC_ADDR, bbaDAI_ADDR)} <= set(
+        graph.compositions
+    )
+    assert graph.pool(bbaUSD_ADDR).supply_getter == "get_actual_supply"
+    assert graph.pool(bbaUSDT_ADDR).supply_getter == "get_virtual_supply"
+    assert graph.pool_balances(bbaUSD_ADDR) == {
+        EthereumTokenAddr.USDT: Decimal("11433582.31554748359005298347"),
+        EthereumTokenAddr.USDC: Decimal("13368829.78950840748853951224"),
+        EthereumTokenAddr.DAI: Decimal("13416454.19566038579649334747"),
+    }
+
+
 def test_unwrap():
     block = 16950590
     lptoken_amount = 1
@@ -611,6 +648,18 @@ def test_swap_fees():
     ]
 
 
+def test_swap_fee_timeline():
+    blockstart = date_to_block("2023-02-20 18:25:00", Chain.ETHEREUM)
+    blockend = date_to_block("2023-02-20 18:30:00", Chain.ETHEREUM)
+
+    lp = Balancer.LiquidityPool(Chain.ETHEREUM, blockend, B80BAL20WETH_ADDR)
+    timeline = lp.swap_fee_timeline
+    timeline.load(blockstart, blockend)
+    assert timeline.exact
+    for block in (blockstart, 16671528, 16671542, blockend):
+        assert timeline.fee_at(block) == lp.swap_fee_percentage_for(block)
+
+
 def test_swap_fees_apr():
     blockend = date_to_block("2023-02-20 18:30:00", Chain.ETHEREUM)
     apr = Balancer.get_swap_fees_apr(B80BAL20WETH_ADDR, Chain.ETHEREUM, blockend)
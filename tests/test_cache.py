@@ -0,0 +1,48 @@
+from defabipedia import Chain
+from defabipedia.tokens import EthereumTokenAddr
+from karpatkit.node import get_node
+
+from defyes.cache import CACHE_DISABLE_ENV, LRUCache, cache_stats, const_call, const_call_cache, const_call_key, warm_up
+from defyes.functions import get_contract, get_decimals
+
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_const_call():
+    const_call_cache.clear()
+    dai = get_contract(EthereumTokenAddr.DAI, Chain.ETHEREUM)
+    assert const_call(dai.functions.decimals()) == 18
+    assert const_call(dai.functions.decimals()) == 18
+    assert cache_stats()["const_call"]["hits"] == 1
+
+
+def test_const_call_key():
+    dai = get_contract(EthereumTokenAddr.DAI, Chain.ETHEREUM)
+    usdc = get_contract(EthereumTokenAddr.USDC, Chain.ETHEREUM)
+    assert const_call_key(dai.functions.decimals()) == const_call_key(dai.functions.decimals())
+    assert const_call_key(dai.functions.decimals()) != const_call_key(dai.functions.symbol())
+    assert const_call_key(dai.functions.decimals()) != const_call_key(usdc.functions.decimals())
+
+
+def test_const_call_disabled(monkeypatch):
+    monkeypatch.setenv(CACHE_DISABLE_ENV, "1")
+    const_call_cache.clear()
+    dai = get_contract(EthereumTokenAddr.DAI, Chain.ETHEREUM)
+    assert const_call(dai.functions.decimals()) == 18
+    assert len(const_call_cache) == 0
+
+
+def test_warm_up():
+    const_call_cache.clear()
+    assert warm_up({Chain.ETHEREUM: [EthereumTokenAddr.DAI, EthereumTokenAddr.USDC]}) == 4
+    assert get_decimals(EthereumTokenAddr.USDC, Chain.ETHEREUM, web3=get_node(Chain.ETHEREUM)) == 6
+    assert const_call_cache.stats()["hits"] == 1
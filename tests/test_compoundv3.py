@@ -76,3 +76,20 @@ def test_get_protocol_data():
         },
         "version": 0,
     }
+
+
+def test_get_protocol_data_for_wallets():
+    block = 17836566
+    wallets = [WALLET_N1, "0x849D52316331967b6fF1198e5E32A0eB168D039d"]
+    data = compoundv3.get_protocol_data_for_wallets(Chain.ETHEREUM, wallets, EthereumTokenAddr.cUSDCv3, block)
+    assert list(data) == wallets
+    for wallet in wallets:
+        assert data[wallet] == compoundv3.get_protocol_data_for(
+            Chain.ETHEREUM, wallet, EthereumTokenAddr.cUSDCv3, block
+        )
+
+
+def test_get_oracle_prices():
+    prices = compoundv3.get_oracle_prices(EthereumTokenAddr.cUSDCv3, 17_000_000, Chain.ETHEREUM)
+    assert abs(prices[EthereumTokenAddr.USDC] - 1) < Decimal("0.01")
+    assert EthereumTokenAddr.WETH in prices
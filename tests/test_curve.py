@@ -56,6 +56,34 @@ def test_get_gauge_version():
     assert gv == "LiquidityGauge"
 
 
+@pytest.mark.parametrize(
+    "probes, blockchain, expected",
+    [
+        ({"version": "v6.0.0"}, Chain.ETHEREUM, "LiquidityGaugeV6"),
+        ({"version": "v5.0.0"}, Chain.ETHEREUM, "LiquidityGaugeV5"),
+        ({"version": "v0.1.0"}, Chain.GNOSIS, "ChildGauge"),
+        ({"claimable_reward_write": 0, "crv_token": EthereumTokenAddr.CRV}, Chain.ETHEREUM, "LiquidityGaugeV3"),
+        ({"claimable_reward_write": 0}, Chain.GNOSIS, "RewardsOnlyGauge"),
+        ({"minter": CURVE_3POOL, "decimals": 18, "claimable_reward": 0}, Chain.ETHEREUM, "LiquidityGaugeReward"),
+        ({"minter": CURVE_3POOL, "decimals": 18}, Chain.ETHEREUM, "LiquidityGaugeV2"),
+        ({"minter": CURVE_3POOL}, Chain.ETHEREUM, "LiquidityGauge"),
+        ({}, Chain.ETHEREUM, "LiquidityGaugeV4"),
+    ],
+)
+def test_gauge_version_from_probes(probes, blockchain, expected):
+    assert Curve.gauge_version_from_probes(probes, blockchain) == expected
+
+
+def test_get_pool_record():
+    record = Curve.get_pool_record(WEB3, TEST_BLOCK, Chain.ETHEREUM, lptoken_address=EthereumTokenAddr.X3CRV)
+    assert record.pool == CURVE_3POOL
+    assert record.gauge == CURVE_3POOL_GAUGE
+    assert record.gauge_version == "LiquidityGauge"
+    assert record.coins == (EthereumTokenAddr.DAI, EthereumTokenAddr.USDC, EthereumTokenAddr.USDT)
+    assert not record.int128_coins
+    assert Curve.get_pool_record(WEB3, TEST_BLOCK, Chain.ETHEREUM, pool_address=CURVE_3POOL) == record
+
+
 def test_get_pool_data():
     pd = Curve.get_pool_data(WEB3, CURVE_3POOL, TEST_BLOCK, Chain.ETHEREUM)
     expected = {
@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+import pytest
+
+from defyes.export import COLUMNS, ColumnarWriter, export_valuations, protocol_rows
+from defyes.protocols import ProtocolData
+from defyes.valuation import BlockValuation, PricedBalance
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def valuations(blocks):
+    for block in range(blocks):
+        balances = [
+            PricedBalance(
+                "spark", "0xWallet", "0xWallet", "liquidity", "underlyings", "0xDAI", Decimal(block), None, None
+            ),
+            PricedBalance(
+                "spark",
+                "0xWallet",
+                "0xWallet",
+                "liquidity",
+                "holdings",
+                "0xspDAI",
+                Decimal("1.0000000000000000009"),
+                Decimal("1.05"),
+                "chainlink",
+            ),
+        ]
+        yield BlockValuation("ethereum", block, balances, Decimal(0))
+
+
+def test_export_valuations(tmp_path):
+    path = tmp_path / "nav.parquet"
+    assert export_valuations(valuations(5), path, batch_size=3) == 10
+
+    table = pq.read_table(path)
+    assert table.column_names == list(COLUMNS)
+    rows = table.to_pylist()
+    assert [row["block"] for row in rows] == [0, 0, 1, 1, 2, 2, 3, 3, 4, 4]
+    assert rows[1]["balance"] == Decimal("1.000000000000000000")
+    assert rows[1]["price"] == 1.05 and rows[0]["price"] is None
+
+
+def test_export_large_balances(tmp_path):
+    balances = [
+        PricedBalance("shib", "0xWallet", "0xWallet", "holdings", "holdings", "0xSHIB", Decimal(amount), None, None)
+        for amount in ("123456789012345678901234.5", "-1e30", "1e60")
+    ]
+    path = tmp_path / "nav.parquet"
+    assert export_valuations([BlockValuation("ethereum", 1, balances, Decimal(0))], path) == 3
+
+    assert [row["balance"] for row in pq.read_table(path).to_pylist()] == [
+        Decimal("123456789012345678901234.5"),
+        Decimal(-(10**30)),
+        None,
+    ]
+
+
+def test_protocol_rows(tmp_path):
+    data = ProtocolData("Spark", "ethereum", 18000000, "wallet")
+    data.add_underlying("0xWallet", "liquidity", "0xDAI", Decimal("1.6"))
+    path = tmp_path / "spark.arrow"
+    with ColumnarWriter(path) as writer:
+        writer.write_rows(
+            protocol_rows(data, "ethereum", 18000000, "spark", "0xWallet", {"0xDAI": (1.0, "chainlink", "ethereum")})
+        )
+
+    assert pa.ipc.open_file(path).read_all().to_pylist() == [
+        {
+            "chain": "ethereum",
+            "block": 18000000,
+            "protocol": "spark",
+            "wallet": "0xWallet",
+            "position_key": "0xWallet",
+            "position_type": "liquidity",
+            "field": "underlyings",
+            "token": "0xDAI",
+            "balance": Decimal("1.6").quantize(Decimal(1).scaleb(-18)),
+            "price": 1.0,
+        }
+    ]
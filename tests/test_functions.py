@@ -7,11 +7,15 @@ from hexbytes import HexBytes
 from web3.types import LogReceipt
 
 from defyes.functions import (
+    balance_of,
     block_to_date,
+    contract_cache,
     date_to_block,
     get_abi_function_signatures,
+    get_contract,
     get_logs_web3,
     get_symbol,
+    native_balances,
     search_proxy_impl_address,
 )
 
@@ -403,3 +407,21 @@ def test_get_logs_web3():
             }
         ),
     ]
+
+
+def test_native_balances():
+    wallets = ["0x849D52316331967b6fF1198e5E32A0eB168D039d", "0x0000000000000000000000000000000000000000"]
+    balances = native_balances(wallets, 17_000_000, Chain.ETHEREUM)
+    assert balances == [
+        balance_of(wallet, "0x0000000000000000000000000000000000000000", 17_000_000, Chain.ETHEREUM)
+        for wallet in wallets
+    ]
+
+
+def test_get_contract_cache():
+    abi = '[{"inputs":[],"name":"decimals","outputs":[{"name":"","type":"uint8"}],"stateMutability":"view","type":"function"}]'
+    contract = get_contract(EthereumTokenAddr.DAI, Chain.ETHEREUM, abi=abi)
+    hits = contract_cache.hits
+    assert get_contract(EthereumTokenAddr.DAI.lower(), Chain.ETHEREUM, abi=abi) is contract
+    assert contract_cache.hits == hits + 1
+    assert contract.functions.decimals().call() == 18
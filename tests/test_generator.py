@@ -0,0 +1,70 @@
+import json
+import marshal
+import os
+from pathlib import Path
+
+from eth_abi import encode
+from web3 import Web3
+
+from defyes import generator
+from defyes.contracts import autogenerated
+from defyes.generator import DirectCall, generate_methods_from_abi, load_abi, load_abi_json
+
+ADDRESS = "0x6B175474E89094C44Da98b954EedeAC495271d0F"
+
+
+def test_load_abi():
+    abi = load_abi(autogenerated.__file__, "erc20.json")
+    with open(Path(autogenerated.__file__).parent / "abis" / "erc20.json") as f:
+        assert abi == json.load(f)
+    # Every ABI is loaded just once, but each caller gets its own copy
+    assert load_abi_json(autogenerated.__file__, "erc20.json") is load_abi_json(autogenerated.__file__, "erc20.json")
+    abi.append({"type": "fallback"})
+    assert abi != load_abi(autogenerated.__file__, "erc20.json")
+
+
+def test_load_abi_bundle_outdated(tmp_path, monkeypatch):
+    with open(Path(autogenerated.__file__).parent / "abis" / "erc20.json") as f:
+        abi = json.load(f)
+    bundle_path = tmp_path / "abi_bundle.marshal"
+    with open(bundle_path, "wb") as f:
+        marshal.dump({("contracts", "erc20.json"): abi[:1]}, f)
+    monkeypatch.setattr(generator, "ABI_BUNDLE_PATH", bundle_path)
+    generator.load_abi_bundle.cache_clear()
+    load_abi_json.cache_clear()
+    try:
+        abi_path = Path(autogenerated.__file__).parent / "abis" / "erc20.json"
+        # The bundle is used while it's newer than the ABI file...
+        os.utime(bundle_path, (abi_path.stat().st_mtime + 1,) * 2)
+        assert load_abi(autogenerated.__file__, "erc20.json") == abi[:1]
+        # ...and ignored once the ABI file is modified after it
+        load_abi_json.cache_clear()
+        os.utime(bundle_path, (abi_path.stat().st_mtime - 1,) * 2)
+        assert load_abi(autogenerated.__file__, "erc20.json") == abi
+    finally:
+        generator.load_abi_bundle.cache_clear()
+        load_abi_json.cache_clear()
+
+
+def test_direct_call():
+    abi = load_abi(autogenerated.__file__, "erc20.json")
+    contract = Web3().eth.contract(address=ADDRESS, abi=abi)
+    balance_of = DirectCall("balanceOf", ["address"], ["uint256"])
+    assert balance_of.encode(ADDRESS) == Web3.to_bytes(
+        hexstr=contract.functions.balanceOf(ADDRESS)._encode_transaction_data()
+    )
+    assert balance_of.decode((10**18).to_bytes(32, "big")) == 10**18
+
+    get_pool_tokens = DirectCall("getPoolTokens", ["bytes32"], ["address[]", "uint256[]", "uint256"])
+    pool_id = "0x" + "ab" * 32
+    assert get_pool_tokens.encode(pool_id)[4:] == bytes.fromhex("ab" * 32)
+    return_data = encode(["address[]", "uint256[]", "uint256"], [[ADDRESS.lower()], [1], 2])
+    assert get_pool_tokens.decode(return_data) == [[ADDRESS], [1], 2]
+
+
+def test_generate_methods_from_abi_direct_call():
+    abi_path = Path(autogenerated.__file__).parent / "abis" / "erc20.json"
+    methods = generate_methods_from_abi(abi_path, const_call_methods=["decimals"], direct_call=True)
+    assert "_balance_of_call = DirectCall('balanceOf', ['address'], ['uint256'])" in methods
+    assert "return self._balance_of_call.call(self, arg0)" in methods
+    assert "return const_call(self.contract.functions.decimals())" in methods
@@ -0,0 +1,81 @@
+from defabipedia import Chain
+
+from defyes.functions import get_logs_web3
+from defyes.logs import (
+    BACKOFF,
+    LogFetcher,
+    LogFetchProgress,
+    backoff_seconds,
+    is_rate_limit,
+    is_too_many_results,
+    uncovered_ranges,
+)
+from defyes.logstore import LogStore, merge_interval
+
+TOPICS = ["0xe2403640ba68fed3a2f88b7557551d1993f84b99bb10ff833f0cf8db0c5e0486"]
+
+
+def test_error_classification():
+    too_many = [
+        {"code": -32005, "message": "query returned more than 10000 results", "data": {"from": "0x1", "to": "0x10"}},
+        {"code": -32602, "message": "Log response size exceeded. this block range should work: [0x1, 0x20]"},
+        {"code": -32600, "message": "block range is too wide"},
+        {"code": -32000, "message": "eth_getLogs is limited to a 10,000 range"},
+    ]
+    rate_limited = [
+        {
+            "code": -32005,
+            "message": "daily request count exceeded, request rate limited",
+            "data": {"backoff_seconds": 30},
+        },
+        {"code": 429, "message": "Your app has exceeded its compute units per second capacity"},
+        {"code": -32000, "message": "request rate limit exceeded"},
+    ]
+    for error_info in too_many:
+        assert is_too_many_results(ValueError(error_info)) and not is_rate_limit(ValueError(error_info))
+    for error_info in rate_limited:
+        assert is_rate_limit(ValueError(error_info)) and not is_too_many_results(ValueError(error_info))
+
+
+def test_backoff_seconds():
+    message = "daily request count exceeded, request rate limited"
+    assert backoff_seconds(ValueError({"code": -32005, "message": message, "data": {"backoff_seconds": 30}}), 1) == 30
+    nested = {"code": -32005, "message": message, "data": {"rate": {"allowed_rps": 1, "backoff_seconds": 12}}}
+    assert backoff_seconds(ValueError(nested), 1) == 12
+    # No backoff in the data: exponential backoff
+    no_backoff = {"code": -32005, "message": message, "data": {"see": "https://infura.io/dashboard"}}
+    assert backoff_seconds(ValueError(no_backoff), 1) == BACKOFF
+    assert backoff_seconds(ValueError(no_backoff), 3) == BACKOFF * 4
+
+
+def test_fetch_in_chunks():
+    expected = get_logs_web3(blockchain=Chain.ETHEREUM, topics=TOPICS, block_start=18934050, block_end=18934090)
+    fetcher = LogFetcher(Chain.ETHEREUM, chunk_size=7, max_workers=3, sparse_results=0)
+    assert fetcher.fetch(None, TOPICS, 18934050, 18934090) == expected
+
+
+def test_resume():
+    expected = get_logs_web3(blockchain=Chain.ETHEREUM, topics=TOPICS, block_start=18934050, block_end=18934090)
+    fetcher = LogFetcher(Chain.ETHEREUM, chunk_size=10)
+    progress = LogFetchProgress(18934050, 18934090)
+    progress.chunks[(18934050, 18934069)] = fetcher.fetch(None, TOPICS, 18934050, 18934069)
+    assert progress.pending_ranges() == [(18934070, 18934090)]
+    assert fetcher.fetch(None, TOPICS, 18934050, 18934090, progress=progress) == expected
+
+
+def test_log_store():
+    expected = get_logs_web3(blockchain=Chain.ETHEREUM, topics=TOPICS, block_start=18934050, block_end=18934090)
+    store = LogStore(Chain.ETHEREUM)
+    assert store.get_logs(None, TOPICS, 18934050, 18934070) == [
+        log for log in expected if log["blockNumber"] <= 18934070
+    ]
+    assert store.get_logs(None, TOPICS, 18934050, 18934090) == expected
+    assert not uncovered_ranges(store.coverage(None, TOPICS), 18934050, 18934090)
+
+
+def test_merge_interval():
+    assert merge_interval([(1, 10), (20, 30)], (11, 19)) == ((1, 30), [(1, 10), (20, 30)])
+    assert merge_interval([(1, 10), (20, 30)], (5, 12)) == ((1, 12), [(1, 10)])
+    assert merge_interval([(1, 10), (20, 30)], (40, 50)) == ((40, 50), [])
+    # Intervals stored before they were merged
+    assert merge_interval([(1, 10), (11, 15), (5, 12)], (16, 20)) == ((1, 20), [(11, 15), (1, 10), (5, 12)])
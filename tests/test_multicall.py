@@ -0,0 +1,35 @@
+import pytest
+from defabipedia import Chain
+from defabipedia.tokens import EthereumTokenAddr
+from web3.exceptions import BadFunctionCallOutput
+
+from defyes.contracts import Erc20
+from defyes.multicall import Multicall
+
+WALLET = "0x849D52316331967b6fF1198e5E32A0eB168D039d"
+BLOCK = 17_000_000
+
+
+def test_bind():
+    dai = Erc20(Chain.ETHEREUM, BLOCK, EthereumTokenAddr.DAI)
+    usdc = Erc20(Chain.ETHEREUM, BLOCK, EthereumTokenAddr.USDC)
+    with Multicall(Chain.ETHEREUM, BLOCK) as multicall:
+        dai_supply = multicall.bind(dai).total_supply
+        usdc_balance = multicall.bind(usdc).balance_of(WALLET)
+        assert not dai_supply.executed
+
+    assert dai_supply.result() == dai.total_supply
+    assert usdc_balance.result() == usdc.balance_of(WALLET)
+
+
+def test_add():
+    dai = Erc20(Chain.ETHEREUM, BLOCK, EthereumTokenAddr.DAI)
+    multicall = Multicall(Chain.ETHEREUM, BLOCK)
+    supply = multicall.add(dai.contract.functions.totalSupply())
+    # The wallet isn't a contract, so this call fails without breaking the rest of the batch.
+    no_contract = multicall.add(Erc20(Chain.ETHEREUM, BLOCK, WALLET).contract.functions.totalSupply())
+
+    assert supply.result() == dai.total_supply
+    assert no_contract.executed
+    with pytest.raises(BadFunctionCallOutput):
+        no_contract.result()
@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+from defabipedia import Chain
+
+from defyes.prices.lending import publish_prices
+from defyes.prices.pricecache import DEFAULT_LOOKUP, CachedPrice, PriceCache, get_price_cache, set_price_cache
+from defyes.prices.prices import SOURCES_LIST
+
+TOKEN = "0x1f9840a85d5aF5bf1D1762F925BDADdC4201F984"
+
+
+def test_exact_block():
+    cache = PriceCache()
+    cache.put(Chain.ETHEREUM, TOKEN, 100, "chainlink", CachedPrice(5.0, "chainlink", Chain.ETHEREUM, 100))
+    assert cache.get(Chain.ETHEREUM, TOKEN, 100, "chainlink") == CachedPrice(5.0, "chainlink", Chain.ETHEREUM, 100)
+    assert cache.get(Chain.ETHEREUM, TOKEN, 101, "chainlink") is None
+    assert cache.get(Chain.ETHEREUM, TOKEN, 100, "coingecko") is None
+    assert cache.get(Chain.GNOSIS, TOKEN, 100, "chainlink") is None
+
+
+def test_bucketed():
+    cache = PriceCache(bucket_blocks={Chain.ETHEREUM: 300})
+    cached = CachedPrice(5.0, "1inch", Chain.ETHEREUM, 310)
+    cache.put(Chain.ETHEREUM, TOKEN, 310, "chainlink", cached)
+    assert cache.get(Chain.ETHEREUM, TOKEN, 599, "chainlink") == cached
+    assert cache.get(Chain.ETHEREUM, TOKEN, 600, "chainlink") is None
+    # Exact blocks for the blockchains without a bucket size
+    cache.put(Chain.GNOSIS, TOKEN, 310, "chainlink", cached)
+    assert cache.get(Chain.GNOSIS, TOKEN, 311, "chainlink") is None
+
+
+def test_eviction():
+    cache = PriceCache(maxsize=2)
+    for block in range(3):
+        cache.put(Chain.ETHEREUM, TOKEN, block, "chainlink", CachedPrice(1.0, "chainlink", Chain.ETHEREUM, block))
+    assert cache.get(Chain.ETHEREUM, TOKEN, 0, "chainlink") is None
+    assert cache.get(Chain.ETHEREUM, TOKEN, 2, "chainlink") is not None
+
+
+def test_persistent():
+    cached = CachedPrice(5.0, "chainlink", Chain.ETHEREUM, 12345)
+    PriceCache(persistent=True).put(Chain.ETHEREUM, TOKEN, 12345, "chainlink", cached)
+    assert PriceCache(persistent=True).get(Chain.ETHEREUM, TOKEN, 12345, "chainlink") == cached
+
+
+def test_publish_prices():
+    cache = PriceCache()
+    previous = get_price_cache()
+    set_price_cache(cache)
+    try:
+        publish_prices({TOKEN: Decimal("2.5")}, 100, Chain.ETHEREUM, "aave_v2")
+    finally:
+        set_price_cache(previous)
+    assert cache.get(Chain.ETHEREUM, TOKEN, 100, DEFAULT_LOOKUP) == CachedPrice(2.5, "aave_v2", Chain.ETHEREUM, 100)
+    # The explicitly requested sources never get the oracle prices
+    assert all(cache.get(Chain.ETHEREUM, TOKEN, 100, source) is None for source in SOURCES_LIST)
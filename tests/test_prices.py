@@ -1,7 +1,10 @@
 import pytest
 from defabipedia import Chain
+from web3 import Web3
 
-from defyes.prices.prices import get_price
+from defyes.functions import get_contract
+from defyes.prices import Chainlink, _1inch, pricecache
+from defyes.prices.prices import get_price, get_prices
 
 avalanche = {
     "Wrapped AVAX": "0xb31f66aa3c1e785363f0875a1b74e27b85fd66c7",
@@ -27,3 +30,57 @@ def test_price(token, block, blockchain, expected_price):
 def test_get_price():
     price = get_price("0x1f9840a85d5af5bf1d1762f925bdaddc4201f984", 17628203, Chain.ETHEREUM, source="coingecko")
     assert price == (5.426491078544339, "coingecko", "ethereum")
+
+
+def test_get_prices():
+    block = 17628203
+    tokens = [
+        "0x1f9840a85d5af5bf1d1762f925bdaddc4201f984",  # UNI, chainlink USD feed
+        "0x6B175474E89094C44Da98b954EedeAC495271d0F",  # DAI
+        "0x0000000000000000000000000000000000000000",
+    ]
+    prices = get_prices(tokens, block, Chain.ETHEREUM)
+    assert list(prices) == [Web3.to_checksum_address(token) for token in tokens]
+    for token in tokens:
+        assert prices[Web3.to_checksum_address(token)] == get_price(token, block, Chain.ETHEREUM)
+
+
+def test_chainlink_feed_index():
+    block = 17628203
+    uni = Web3.to_checksum_address("0x1f9840a85d5af5bf1d1762f925bdaddc4201f984")
+    usd, eth = Chainlink.CHAINLINK_ETH_QUOTES
+    registry = get_contract(
+        Chainlink.CHAINLINK_FEED_REGISTRY, Chain.ETHEREUM, abi=Chainlink.ABI_CHAINLINK_FEED_REGISTRY
+    )
+    feed_index = Chainlink.FeedIndex()
+    assert feed_index.get_feed(uni, usd, block) == registry.functions.getFeed(uni, usd).call(block_identifier=block)
+    # Negative results don't need a registry call
+    assert feed_index.get_feed(uni, usd, Chainlink.CHAINLINK_FEED_REGISTRY_START_BLOCK) is None
+
+
+def test_chainlink_price_series():
+    uni = "0x1f9840a85d5af5bf1d1762f925bdaddc4201f984"
+    blocks = [17628203, 17628203 + 300, 17628203 + 3600, 17628203 + 7200]
+    series = Chainlink.get_mainnet_price_series(uni, blocks)
+    assert series == {block: Chainlink.get_mainnet_price(uni, block) for block in blocks}
+
+
+def test_get_price_parallel(monkeypatch):
+    monkeypatch.setattr(pricecache, "price_cache", None)
+    latencies = {}
+    token, block = "0x1f9840a85d5af5bf1d1762f925bdaddc4201f984", 17628203
+    price = get_price(token, block, Chain.ETHEREUM, parallel=True, latencies=latencies)
+    assert price == get_price(token, block, Chain.ETHEREUM)
+    assert latencies["chainlink"] > 0
+
+
+def test_1inch_pricing_graph():
+    block = 17628210
+    gno = "0x6810e776880C02933D47DB1b9fc05908e5386b96"
+    bal = "0xba100000625a3754423978a60c9317c58a424e3D"
+    connector = "0x6B175474E89094C44Da98b954EedeAC495271d0F"
+    prices = {token: _1inch.get_price(token, block, Chain.ETHEREUM, connector=connector) for token in (gno, bal)}
+    graph = _1inch.get_pricing_graph(Chain.ETHEREUM, block)
+    # The connector was resolved just once for both tokens
+    assert list(graph.rates_to_eth) == [connector]
+    assert _1inch.get_prices([gno, bal], block, Chain.ETHEREUM, connectors={gno: connector, bal: connector}) == prices
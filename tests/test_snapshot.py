@@ -0,0 +1,30 @@
+from defabipedia import Chain
+from defabipedia.tokens import EthereumTokenAddr
+
+from defyes.contracts import Erc20
+from defyes.functions import ensure_a_block_number
+from defyes.snapshot import Snapshot, get_snapshot
+from defyes.types import Token
+
+BLOCK = 17_000_000
+
+
+def test_snapshot():
+    dai = Erc20(Chain.ETHEREUM, BLOCK, EthereumTokenAddr.DAI)
+    with Snapshot(Chain.ETHEREUM, BLOCK) as snapshot:
+        assert get_snapshot(Chain.ETHEREUM) is snapshot
+        assert get_snapshot(Chain.GNOSIS) is None
+        assert ensure_a_block_number("latest", Chain.ETHEREUM) == BLOCK
+
+        supply = dai.total_supply
+        assert len(snapshot.calls) == 1
+        assert dai.total_supply == supply
+        assert len(snapshot.calls) == 1
+
+        assert snapshot.token(EthereumTokenAddr.DAI) is snapshot.token(EthereumTokenAddr.DAI.lower())
+        assert snapshot.token(EthereumTokenAddr.DAI).block == BLOCK
+        assert Token.get_instance(EthereumTokenAddr.DAI, Chain.ETHEREUM, BLOCK) is snapshot.token(EthereumTokenAddr.DAI)
+        assert Token.get_instance(EthereumTokenAddr.DAI, Chain.GNOSIS) is not snapshot.token(EthereumTokenAddr.DAI)
+
+    assert get_snapshot(Chain.ETHEREUM) is None
+    assert not snapshot.calls
@@ -2,10 +2,10 @@ from decimal import Decimal
 
 from defabipedia import Chain
 from defabipedia.tokens import EthereumTokenAddr
-from karpatkit.cache import const_call
 from karpatkit.node import get_node
 
 from defyes import SushiSwap
+from defyes.cache import const_call
 
 SUSHISWAP_POOL_USDC_WETH = "0x397FF1542f962076d0BFE58eA045FfA2d347ACa0"
 UNUSED_ADDRESS = "0xCafe7CceDfB2deBE0a49830D3C2777721E3728A5"
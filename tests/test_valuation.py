@@ -0,0 +1,76 @@
+from decimal import Decimal
+from functools import partial
+
+from defabipedia import Chain
+from defabipedia.tokens import EthereumTokenAddr
+
+from defyes import compoundv3
+from defyes.protocols import ProtocolData
+from defyes.valuation import PositionBalance, PositionSource, block_range, iter_balances, value_positions
+
+WALLET_N1 = "0x616dE58c011F8736fa20c7Ae5352F7f6FB9F0669"
+
+
+def test_iter_balances():
+    data = ProtocolData("Spark", Chain.ETHEREUM, 18000000, "wallet")
+    data.add_holding("0xWallet", "liquidity", "0xspDAI", Decimal("1.5"))
+    data.add_underlying("0xWallet", "liquidity", "0xDAI", Decimal("1.6"))
+    data.add_reward("0xWallet", "staked", "0xSPK", Decimal("2"), extra_level="0xGauge", extra_level_type="gauge")
+    assert list(iter_balances(data)) == [
+        PositionBalance("0xWallet", "liquidity", "holdings", "0xspDAI", Decimal("1.5")),
+        PositionBalance("0xWallet", "liquidity", "underlyings", "0xDAI", Decimal("1.6")),
+        PositionBalance("0xWallet/0xGauge", "staked", "unclaimed_rewards", "0xSPK", Decimal("2")),
+    ]
+
+    data = {
+        "holdings": [["0xLP", Decimal(3)]],
+        "underlyings": [{"address": "0xA", "balance": Decimal(1)}],
+        "financial_metrics": {"collateral_ratio": 2},
+    }
+    assert [(b.position_key, b.field, b.token, b.balance) for b in iter_balances(data)] == [
+        ("", "holdings", "0xLP", Decimal(3)),
+        ("", "underlyings", "0xA", Decimal(1)),
+    ]
+
+    # A borrower: the collaterals count and the debts subtract
+    data = {
+        "0xComet": {
+            "collaterals": [{"address": "0xWETH", "balance": Decimal(5)}],
+            "borrowred": {"address": "0xUSDC", "balance": Decimal(100)},
+        },
+        "debts": [{"token_address": "0xDAI", "token_amount": Decimal(7), "token_price_usd": 1}],
+    }
+    assert [(b.position_key, b.field, b.token, b.balance) for b in iter_balances(data)] == [
+        ("0xComet", "collaterals", "0xWETH", Decimal(5)),
+        ("0xComet", "borrowred", "0xUSDC", Decimal(-100)),
+        ("", "debts", "0xDAI", Decimal(-7)),
+    ]
+
+
+def test_value_positions():
+    sources = [
+        PositionSource("compoundv3", WALLET_N1, partial(compoundv3.get_protocol_data, Chain.ETHEREUM, WALLET_N1))
+    ]
+    valuations = list(value_positions(Chain.ETHEREUM, block_range(17836565, 17836566), sources, prefetch=2))
+    assert [valuation.block for valuation in valuations] == [17836565, 17836566]
+
+    valuation = valuations[-1]
+    assert not valuation.errors and not valuation.unpriced
+    usdc = next(balance for balance in valuation.balances if balance.token == EthereumTokenAddr.USDC)
+    assert usdc.balance == Decimal("2221178.851613")
+    assert usdc.position_key == EthereumTokenAddr.cUSDCv3 and usdc.position_type == "liquidity"
+    assert valuation.nav == sum(balance.value for balance in valuation.balances)
+    assert 2_200_000 < valuation.nav < 2_300_000
+
+
+def test_value_positions_borrower():
+    wallet = "0x8f02a8ecd8734381795ff251360dbf1730cb46e6"
+    sources = [PositionSource("compoundv3", wallet, partial(compoundv3.get_protocol_data, Chain.ETHEREUM, wallet))]
+    (valuation,) = value_positions(Chain.ETHEREUM, [19134207], sources, prefetch=0)
+
+    assert not valuation.errors and not valuation.unpriced
+    fields = {(balance.field, balance.token): balance for balance in valuation.balances}
+    assert fields["collaterals", EthereumTokenAddr.WETH].balance == Decimal("5.76374023609637773")
+    usdc_debt = fields["borrowred", EthereumTokenAddr.USDC]
+    assert usdc_debt.balance == Decimal("-24591.485098") and usdc_debt.value < 0
+    assert valuation.nav == sum(balance.value for balance in valuation.balances)